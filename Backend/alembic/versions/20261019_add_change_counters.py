@@ -0,0 +1,30 @@
+"""add change_counters table
+
+Revision ID: 20261019_add_change_counters
+Revises: 20261019_add_lead_search_index
+Create Date: 2026-10-19 00:10:00
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261019_add_change_counters'
+down_revision = '20261019_add_lead_search_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    counters = op.create_table(
+        'change_counters',
+        sa.Column('name', sa.String(length=64), primary_key=True),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+    )
+    # Writers only ever UPDATE this row (see src/db/change_tracking.py)
+    op.bulk_insert(counters, [{'name': 'leads', 'version': 0, 'updated_at': datetime.utcnow()}])
+
+
+def downgrade():
+    op.drop_table('change_counters')
@@ -0,0 +1,68 @@
+"""add leads.dedupe_key natural key for upserts
+
+Revision ID: 20261019_add_lead_dedupe_key
+Revises: 20261019_add_change_counters
+Create Date: 2026-10-19 00:20:00
+"""
+import hashlib
+import re
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261019_add_lead_dedupe_key'
+down_revision = '20261019_add_change_counters'
+branch_labels = None
+depends_on = None
+
+BATCH = 1000
+
+
+# Snapshot of natural_key() in src/db/repositories/lead_repository.py at this
+# revision; existing rows have no provider id, so only the name/phone/city hash
+def _normalize_text(value):
+    value = unicodedata.normalize("NFKC", str(value or "")).casefold()
+    return " ".join(re.sub(r"[^\w]+", " ", value).split())
+
+
+def natural_key(data):
+    name = _normalize_text(data.get("company_name"))
+    if not name:
+        return None
+    phone = re.sub(r"\D", "", str(data.get("phone") or ""))
+    city = _normalize_text(data.get("city"))
+    digest = hashlib.sha1(f"{name}|{phone}|{city}".encode("utf-8")).hexdigest()
+    return f"n:{digest}"
+
+
+def upgrade():
+    op.add_column('leads', sa.Column('dedupe_key', sa.String(length=255), nullable=True))
+    # Backfill from name/phone/city, one page of ids at a time. Existing
+    # duplicates keep a NULL key (the oldest row gets it), so the unique index
+    # can be created; clean them up separately if needed.
+    conn = op.get_bind()
+    seen = set()
+    last_id = 0
+    while True:
+        rows = conn.execute(sa.text("SELECT id, company_name, phone, city FROM leads WHERE id > :last_id "
+                                    "ORDER BY id LIMIT :n"), {"last_id": last_id, "n": BATCH}).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        updates = []
+        for row in rows:
+            key = natural_key({"company_name": row.company_name, "phone": row.phone, "city": row.city})
+            if key is None or key in seen:
+                continue
+            seen.add(key)
+            updates.append({"id": row.id, "k": key})
+        if updates:
+            conn.execute(sa.text("UPDATE leads SET dedupe_key = :k WHERE id = :id"), updates)
+    op.create_index('ix_leads_dedupe_key', 'leads', ['dedupe_key'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_leads_dedupe_key', table_name='leads')
+    op.drop_column('leads', 'dedupe_key')
@@ -0,0 +1,50 @@
+"""add lead search index (pg_trgm / FTS5)
+
+Revision ID: 20261019_add_lead_search_index
+Revises: 20250911_add_template_tables
+Create Date: 2026-10-19 00:00:00
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20261019_add_lead_search_index'
+down_revision = '20250911_add_template_tables'
+branch_labels = None
+depends_on = None
+
+# Keep in sync with SEARCH_DOCUMENT_SQL in src/db/search.py; the planner only
+# uses the index when the query expression matches it exactly.
+SEARCH_DOCUMENT_SQL = (
+    "(coalesce(company_name, '') || ' ' || coalesce(city, '') || ' ' || "
+    "coalesce(industry, '') || ' ' || coalesce(email, '') || ' ' || coalesce(phone, ''))"
+)
+COLS = "company_name, city, industry, email, phone"
+NEW_COLS = "new.company_name, new.city, new.industry, new.email, new.phone"
+OLD_COLS = "old.company_name, old.city, old.industry, old.email, old.phone"
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute(f"CREATE INDEX IF NOT EXISTS ix_leads_search_trgm ON leads USING gin ({SEARCH_DOCUMENT_SQL} gin_trgm_ops)")
+    elif dialect == 'sqlite':
+        op.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS leads_fts USING fts5({COLS}, content='leads', content_rowid='id', tokenize='trigram')")
+        op.execute(f"CREATE TRIGGER IF NOT EXISTS leads_fts_ai AFTER INSERT ON leads BEGIN INSERT INTO leads_fts(rowid, {COLS}) VALUES (new.id, {NEW_COLS}); END")
+        op.execute(f"CREATE TRIGGER IF NOT EXISTS leads_fts_ad AFTER DELETE ON leads BEGIN INSERT INTO leads_fts(leads_fts, rowid, {COLS}) VALUES ('delete', old.id, {OLD_COLS}); END")
+        op.execute(
+            f"CREATE TRIGGER IF NOT EXISTS leads_fts_au AFTER UPDATE OF {COLS} ON leads BEGIN "
+            f"INSERT INTO leads_fts(leads_fts, rowid, {COLS}) VALUES ('delete', old.id, {OLD_COLS}); "
+            f"INSERT INTO leads_fts(rowid, {COLS}) VALUES (new.id, {NEW_COLS}); END"
+        )
+        op.execute("INSERT INTO leads_fts(leads_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_leads_search_trgm")
+    elif dialect == 'sqlite':
+        for trg in ('leads_fts_ai', 'leads_fts_ad', 'leads_fts_au'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trg}")
+        op.execute("DROP TABLE IF EXISTS leads_fts")
@@ -0,0 +1,60 @@
+"""add leads.website_class and secondary indexes
+
+Revision ID: 20261019_add_lead_secondary_indexes
+Revises: 20261019_add_lead_dedupe_key
+Create Date: 2026-10-19 00:30:00
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20261019_add_lead_secondary_indexes'
+down_revision = '20261019_add_lead_dedupe_key'
+branch_labels = None
+depends_on = None
+
+# Snapshot of WEBSITE_CLASS_SQL in src/db/website_class.py at this revision
+SOCIAL_DOMAINS = (
+    "facebook.com", "instagram.com", "twitter.com", "x.com", "tiktok.com",
+    "google.com", "g.page", "linktr.ee", "linktree.com", "wa.me", "web.whatsapp.com",
+    "yelp.com", "tripadvisor.com", "booking.com",
+)
+LIGHT_SITE_DOMAINS = ("wixsite.com", "jimdosite.com", "google.site", "sites.google.com", "webnode.page")
+HOST = "('.' || replace(replace(lower(trim(website)), 'https://', ''), 'http://', '') || '/')"
+WEBSITE_CLASS_SQL = (
+    "CASE WHEN website IS NULL OR trim(website) = '' THEN 'N'"
+    " WHEN " + " OR ".join(f"{HOST} LIKE '%.{d}/%'" for d in SOCIAL_DOMAINS) + " THEN 'N'"
+    " WHEN " + " OR ".join(f"{HOST} LIKE '%.{d}/%'" for d in LIGHT_SITE_DOMAINS) + " THEN 'L'"
+    " ELSE 'Y' END"
+)
+
+INDEXES = (
+    ('ix_leads_website_class_id', ['website_class', 'id']),
+    ('ix_leads_city_id', ['city', 'id']),
+    ('ix_leads_industry_id', ['industry', 'id']),
+)
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    # Postgres computes the column once per write (STORED); SQLite can only
+    # add VIRTUAL generated columns to an existing table, and indexes them
+    # just the same.
+    storage = 'STORED' if dialect == 'postgresql' else 'VIRTUAL'
+    if dialect == 'postgresql':
+        # this revision id is longer than alembic_version's VARCHAR(32); it is
+        # written after upgrade() returns, in the same transaction
+        op.alter_column('alembic_version', 'version_num', type_=sa.String(64),
+                        existing_type=sa.String(32), existing_nullable=False)
+    op.execute(
+        f"ALTER TABLE leads ADD COLUMN website_class VARCHAR(1) "
+        f"GENERATED ALWAYS AS ({WEBSITE_CLASS_SQL}) {storage}"
+    )
+    for name, cols in INDEXES:
+        op.create_index(name, 'leads', cols)
+
+
+def downgrade():
+    for name, _ in reversed(INDEXES):
+        op.drop_index(name, table_name='leads')
+    op.drop_column('leads', 'website_class')
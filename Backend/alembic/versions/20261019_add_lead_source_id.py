@@ -0,0 +1,79 @@
+"""add leads.source_id, key provider leads by name/phone/city
+
+Revision ID: 20261019_add_lead_source_id
+Revises: 20261019_website_class_host_only
+Create Date: 2026-10-19 03:00:00
+"""
+import hashlib
+import re
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261019_add_lead_source_id'
+down_revision = '20261019_website_class_host_only'
+branch_labels = None
+depends_on = None
+
+BATCH = 1000
+
+
+# Snapshot of natural_key() in src/db/repositories/lead_repository.py at this revision
+def _normalize_text(value):
+    value = unicodedata.normalize("NFKC", str(value or "")).casefold()
+    return " ".join(re.sub(r"[^\w]+", " ", value).split())
+
+
+def natural_key(data):
+    name = _normalize_text(data.get("company_name"))
+    if not name:
+        return None
+    phone = re.sub(r"\D", "", str(data.get("phone") or ""))
+    city = _normalize_text(data.get("city"))
+    digest = hashlib.sha1(f"{name}|{phone}|{city}".encode("utf-8")).hexdigest()
+    return f"n:{digest}"
+
+
+def upgrade():
+    op.add_column('leads', sa.Column('source_id', sa.String(length=255), nullable=True))
+    op.create_index('ix_leads_source_id', 'leads', ['source_id'])
+    # Rows keyed by a provider id ("places:...", "osm:...") move the id to
+    # source_id and take their natural key. Where that key is taken (the lead
+    # was stored before and collected again) the older row gets the source_id
+    # and the newer one keeps a NULL key, as duplicates did in the dedupe_key
+    # backfill.
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        rows = conn.execute(sa.text(
+            "SELECT id, company_name, phone, city, dedupe_key FROM leads WHERE id > :last_id "
+            "AND dedupe_key IS NOT NULL AND dedupe_key NOT LIKE 'n:%' ORDER BY id LIMIT :n"
+        ), {"last_id": last_id, "n": BATCH}).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        keys = {row.id: natural_key({"company_name": row.company_name, "phone": row.phone, "city": row.city})
+                for row in rows}
+        taken = {k for (k,) in conn.execute(
+            sa.text("SELECT dedupe_key FROM leads WHERE dedupe_key IN :keys").bindparams(
+                sa.bindparam("keys", expanding=True)),
+            {"keys": [k for k in keys.values() if k]},
+        )} if any(keys.values()) else set()
+        for row in rows:
+            key = keys[row.id]
+            if key is not None and key in taken:
+                conn.execute(sa.text("UPDATE leads SET source_id = COALESCE(source_id, :s) WHERE dedupe_key = :k"),
+                             {"s": row.dedupe_key, "k": key})
+                key = None
+            conn.execute(sa.text("UPDATE leads SET source_id = :s, dedupe_key = :k WHERE id = :id"),
+                         {"s": row.dedupe_key, "k": key, "id": row.id})
+            if key is not None:
+                taken.add(key)
+
+
+def downgrade():
+    # the natural keys stay; the previous code accepts them as they are
+    op.drop_index('ix_leads_source_id', table_name='leads')
+    op.execute("ALTER TABLE leads DROP COLUMN source_id")
@@ -0,0 +1,142 @@
+"""move rendered scripts into the deduplicated `scripts` table
+
+Revision ID: 20261019_add_script_store
+Revises: 20261019_add_lead_secondary_indexes
+Create Date: 2026-10-19 01:00:00
+"""
+import hashlib
+import os
+import zlib
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261019_add_script_store'
+down_revision = '20261019_add_lead_secondary_indexes'
+branch_labels = None
+depends_on = None
+
+BATCH = 1000
+
+# Snapshot of the codec in src/db/script_store.py at this revision
+COMPRESS_MIN_BYTES = 64
+ZDICT_MAX = 32 * 1024
+
+
+def script_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def encode_script(text):
+    """(encoding, content) of a text stored without template: deflated if that is smaller."""
+    raw = text.encode("utf-8")
+    compress = os.getenv("SCRIPT_COMPRESSION", "zlib").strip().lower() not in {"none", "off", "0", "false", "no"}
+    if compress and len(raw) >= COMPRESS_MIN_BYTES:
+        data = zlib.compress(raw, 9)
+        if len(data) < len(raw):
+            return "zlib", data
+    return "plain", raw
+
+
+def decode_script(encoding, content, template=None):
+    if encoding == "plain":
+        return bytes(content).decode("utf-8")
+    if encoding == "zlib":
+        return zlib.decompress(content).decode("utf-8")
+    if encoding == "zlib-dict":
+        if template is None:
+            raise ValueError("zlib-dict script without its template")
+        d = zlib.decompressobj(15, zdict=template.encode("utf-8")[-ZDICT_MAX:])
+        return (d.decompress(bytes(content)) + d.flush()).decode("utf-8")
+    raise ValueError(f"unknown script encoding {encoding!r}")
+
+
+def _keyset(conn, sql):
+    last_id = 0
+    while True:
+        rows = conn.execute(sa.text(sql), {"last_id": last_id, "n": BATCH}).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
+def upgrade():
+    op.create_table(
+        'scripts',
+        sa.Column('hash', sa.String(length=64), primary_key=True),
+        sa.Column('encoding', sa.String(length=16), nullable=False),
+        sa.Column('content', sa.LargeBinary(), nullable=False),
+        sa.Column('dict_hash', sa.String(length=64), nullable=True),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+    )
+    op.add_column('leads', sa.Column('email_script_hash', sa.String(length=64), nullable=True))
+    op.add_column('leads', sa.Column('phone_script_hash', sa.String(length=64), nullable=True))
+
+    # Existing texts were rendered from templates we no longer know, so they
+    # are deflated on their own; newly generated scripts use their template.
+    conn = op.get_bind()
+    stored = set()
+    now = datetime.utcnow()
+    for rows in _keyset(conn, "SELECT id, email_script, phone_script FROM leads WHERE id > :last_id "
+                              "AND (email_script IS NOT NULL OR phone_script IS NOT NULL) ORDER BY id LIMIT :n"):
+        scripts, updates = [], []
+        for row in rows:
+            hashes = {}
+            for kind in ("email", "phone"):
+                text = getattr(row, f"{kind}_script")
+                if not text:
+                    hashes[kind] = None
+                    continue
+                digest = hashes[kind] = script_hash(text)
+                if digest not in stored:
+                    stored.add(digest)
+                    encoding, content = encode_script(text)
+                    scripts.append({"hash": digest, "encoding": encoding, "content": content,
+                                    "size": len(text.encode("utf-8")), "created_at": now})
+            updates.append({"id": row.id, "e": hashes["email"], "p": hashes["phone"]})
+        if scripts:
+            conn.execute(sa.text("INSERT INTO scripts (hash, encoding, content, size, created_at) "
+                                 "VALUES (:hash, :encoding, :content, :size, :created_at)"), scripts)
+        conn.execute(sa.text("UPDATE leads SET email_script_hash = :e, phone_script_hash = :p WHERE id = :id"),
+                     updates)
+
+    op.create_index('ix_leads_email_script_hash', 'leads', ['email_script_hash'])
+    op.create_index('ix_leads_phone_script_hash', 'leads', ['phone_script_hash'])
+    # plain ALTER TABLE (SQLite >= 3.35) rather than a batch rebuild, which
+    # would drop the search triggers and the generated website_class column
+    op.execute("ALTER TABLE leads DROP COLUMN email_script")
+    op.execute("ALTER TABLE leads DROP COLUMN phone_script")
+
+
+def downgrade():
+    op.add_column('leads', sa.Column('email_script', sa.Text(), nullable=True))
+    op.add_column('leads', sa.Column('phone_script', sa.Text(), nullable=True))
+    conn = op.get_bind()
+    texts = {}
+
+    def text_of(digest):
+        if digest is None:
+            return None
+        if digest not in texts:
+            row = conn.execute(sa.text("SELECT encoding, content, dict_hash FROM scripts WHERE hash = :h"),
+                               {"h": digest}).first()
+            texts[digest] = None if row is None else \
+                decode_script(row.encoding, row.content, text_of(row.dict_hash))
+        return texts[digest]
+
+    for rows in _keyset(conn, "SELECT id, email_script_hash, phone_script_hash FROM leads WHERE id > :last_id "
+                              "AND (email_script_hash IS NOT NULL OR phone_script_hash IS NOT NULL) "
+                              "ORDER BY id LIMIT :n"):
+        conn.execute(sa.text("UPDATE leads SET email_script = :e, phone_script = :p WHERE id = :id"), [
+            {"id": r.id, "e": text_of(r.email_script_hash), "p": text_of(r.phone_script_hash)} for r in rows
+        ])
+
+    op.drop_index('ix_leads_phone_script_hash', table_name='leads')
+    op.drop_index('ix_leads_email_script_hash', table_name='leads')
+    op.execute("ALTER TABLE leads DROP COLUMN phone_script_hash")
+    op.execute("ALTER TABLE leads DROP COLUMN email_script_hash")
+    op.drop_table('scripts')
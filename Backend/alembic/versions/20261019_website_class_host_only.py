@@ -0,0 +1,64 @@
+"""match leads.website_class on the URL host only
+
+Revision ID: 20261019_website_class_host_only
+Revises: 20261019_add_script_store
+Create Date: 2026-10-19 02:00:00
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20261019_website_class_host_only'
+down_revision = '20261019_add_script_store'
+branch_labels = None
+depends_on = None
+
+# Snapshot of website_class_sql() in src/db/website_class.py at this revision
+SOCIAL_DOMAINS = (
+    "facebook.com", "instagram.com", "twitter.com", "x.com", "tiktok.com",
+    "google.com", "g.page", "linktr.ee", "linktree.com", "wa.me", "web.whatsapp.com",
+    "yelp.com", "tripadvisor.com", "booking.com",
+)
+LIGHT_SITE_DOMAINS = ("wixsite.com", "jimdosite.com", "google.site", "sites.google.com", "webnode.page")
+
+
+def _case(host, pattern):
+    return (
+        "CASE WHEN website IS NULL OR trim(website) = '' THEN 'N'"
+        " WHEN " + " OR ".join(f"{host} LIKE '{pattern % d}'" for d in SOCIAL_DOMAINS) + " THEN 'N'"
+        " WHEN " + " OR ".join(f"{host} LIKE '{pattern % d}'" for d in LIGHT_SITE_DOMAINS) + " THEN 'L'"
+        " ELSE 'Y' END"
+    )
+
+
+def _host_only_sql(dialect):
+    # url without scheme, cut at the first '/', '?', '#' or ':'
+    rest = "replace(replace(lower(trim(website)), 'https://', ''), 'http://', '')"
+    cut = f"(replace(replace(replace({rest}, '?', '/'), '#', '/'), ':', '/') || '/')"
+    pos = f"instr({cut}, '/')" if dialect == 'sqlite' else f"position('/' in {cut})"
+    return _case(f"('.' || substr({cut}, 1, {pos} - 1))", "%%.%s")
+
+
+# the expression of 20261019_add_lead_secondary_indexes
+_PREVIOUS_SQL = _case("('.' || replace(replace(lower(trim(website)), 'https://', ''), 'http://', '') || '/')", "%%.%s/%%")
+
+
+def _rebuild(expression):
+    dialect = op.get_bind().dialect.name
+    # see 20261019_add_lead_secondary_indexes for STORED vs VIRTUAL
+    storage = 'STORED' if dialect == 'postgresql' else 'VIRTUAL'
+    op.drop_index('ix_leads_website_class_id', table_name='leads')
+    # plain ALTER TABLE, a batch rebuild would drop the search triggers
+    op.execute("ALTER TABLE leads DROP COLUMN website_class")
+    op.execute(
+        f"ALTER TABLE leads ADD COLUMN website_class VARCHAR(1) "
+        f"GENERATED ALWAYS AS ({expression(dialect)}) {storage}"
+    )
+    op.create_index('ix_leads_website_class_id', 'leads', ['website_class', 'id'])
+
+
+def upgrade():
+    _rebuild(_host_only_sql)
+
+
+def downgrade():
+    _rebuild(lambda dialect: _PREVIOUS_SQL)
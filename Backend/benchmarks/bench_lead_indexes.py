@@ -0,0 +1,132 @@
+"""Query plans and timings of the hot lead queries without and with the secondary indexes.
+
+Usage (from Backend/):
+    python -m benchmarks.bench_lead_indexes [rows]
+    BENCH_DATABASE_URL=postgresql+psycopg2://... python -m benchmarks.bench_lead_indexes 200000
+
+Builds a throwaway `leads` table (a temporary SQLite file unless
+BENCH_DATABASE_URL is set; that database's `leads` table is dropped and
+recreated, so never point it at real data), then for each query prints the
+plan and the median runtime before and after creating the indexes of
+migration 20261019_add_lead_secondary_indexes. "Before" uses the former
+website predicate (IS NULL / = '' / ILIKE '%facebook%').
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import create_engine, func, insert, select, text  # noqa: E402
+
+from src.db.models.lead import Lead  # noqa: E402
+
+CITIES = ["Köln", "Bonn", "Düsseldorf", "Aachen", "Essen", "Dortmund", "Münster", "Bielefeld"]
+INDUSTRIES = ["Friseur", "Bäckerei", "Klempner", "Elektriker", "Café", "Restaurant", "Tischler"]
+WEBSITES = [None, "", "https://www.facebook.com/{i}", "https://instagram.com/{i}",
+            "https://shop{i}.wixsite.com/home", "https://www.firma{i}.de", "https://firma{i}.com"]
+
+LEGACY_NO_WEBSITE = (Lead.website == None) | (Lead.website == "") | (Lead.website.ilike('%facebook%'))  # noqa: E711
+NO_WEBSITE = Lead.website_class == "N"
+
+
+def _queries(no_website):
+    return {
+        "filter count": select(func.count()).select_from(Lead).where(no_website),
+        "to contact, first page": select(Lead.id, Lead.company_name).where(no_website).order_by(Lead.id.desc()).limit(50),
+        "city page": select(Lead.id, Lead.company_name).where(Lead.city == "Aachen").order_by(Lead.id.desc()).limit(50),
+        "industry count": select(func.count()).select_from(Lead).where(Lead.industry == "Tischler"),
+    }
+
+
+def _fill(engine, rows: int) -> None:
+    rnd = random.Random(7)
+    batch = []
+    with engine.begin() as conn:
+        for i in range(rows):
+            batch.append({
+                "company_name": f"Firma {i}",
+                "website": (rnd.choice(WEBSITES) or "").format(i=i) or None,
+                "city": rnd.choice(CITIES),
+                "industry": rnd.choice(INDUSTRIES),
+            })
+            if len(batch) == 5000:
+                conn.execute(insert(Lead), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(Lead), batch)
+
+
+def _plan(conn, stmt) -> str:
+    sql = str(stmt.compile(conn.engine, compile_kwargs={"literal_binds": True}))
+    if conn.dialect.name == "sqlite":
+        return "; ".join(r[-1] for r in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}"))
+    return " | ".join(r[0].strip() for r in conn.exec_driver_sql(f"EXPLAIN {sql}"))
+
+
+def _median_ms(conn, stmt, repeat: int = 7) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(stmt).all()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def _report(engine, label: str, no_website) -> dict:
+    results = {}
+    with engine.connect() as conn:
+        for name, stmt in _queries(no_website).items():
+            results[name] = _median_ms(conn, stmt)
+            print(f"  [{label}] {name:<24} {results[name]:8.2f} ms   {_plan(conn, stmt)}")
+    return results
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    url = os.getenv("BENCH_DATABASE_URL")
+    tmp = None
+    if not url:
+        tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+        url = f"sqlite:///{tmp.name}"
+    engine = create_engine(url)
+    table = Lead.__table__
+    indexes = list(table.indexes)
+    try:
+        table.drop(engine, checkfirst=True)
+        # create the table without its secondary indexes first
+        table.indexes = set()
+        table.create(engine)
+        table.indexes = set(indexes)
+        print(f"{engine.dialect.name}: {rows} leads")
+        _fill(engine, rows)
+        with engine.begin() as conn:
+            conn.exec_driver_sql("ANALYZE")
+
+        print("before (primary key only):")
+        before = _report(engine, "before", LEGACY_NO_WEBSITE)
+        for index in indexes:
+            index.create(engine, checkfirst=True)
+        with engine.begin() as conn:
+            conn.exec_driver_sql("ANALYZE")
+        print("after (website_class / city / industry indexes):")
+        after = _report(engine, "after", NO_WEBSITE)
+
+        print("speedup:")
+        for name in before:
+            print(f"  {name:<24} {before[name] / max(after[name], 1e-6):6.1f}x")
+    finally:
+        table.indexes = set(indexes)
+        table.drop(engine, checkfirst=True)
+        engine.dispose()
+        if tmp is not None:
+            tmp.close()
+            os.unlink(tmp.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""SQLite with its default settings vs the tuned profile of src/db/sqlite_tuning.py.
+
+Usage (from Backend/):
+    python -m benchmarks.bench_sqlite_profile [seconds]
+
+For each profile, on a fresh temporary database file:
+  - small commits: single-lead inserts, one commit each (API-style writes)
+  - mixed load: a background job upserting batches of leads, a second writer
+    committing single leads, and reader threads paging through the leads
+    table like GET /leads, all at once for `seconds` (default 5)
+Prints throughput, reader latency percentiles and lock errors, then the
+tuned/default ratios.
+"""
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import create_engine, func, insert, select  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from src.db.models.lead import Lead  # noqa: E402
+from src.db.sqlite_tuning import apply_sqlite_profile  # noqa: E402
+
+READERS = 4
+SMALL_COMMITS = 500
+JOB_BATCH = 500
+SEED_ROWS = 20_000
+
+
+def _engine(path: str, profile: str):
+    eng = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    apply_sqlite_profile(eng, profile)
+    Lead.__table__.create(eng)
+    with eng.begin() as conn:
+        conn.execute(insert(Lead), [{"company_name": f"Seed {i}", "city": "Köln"} for i in range(SEED_ROWS)])
+    return eng
+
+
+def _small_commits(eng) -> float:
+    start = time.perf_counter()
+    for i in range(SMALL_COMMITS):
+        with Session(eng) as session:
+            session.add(Lead(company_name=f"Single {i}", city="Bonn"))
+            session.commit()
+    return SMALL_COMMITS / (time.perf_counter() - start)
+
+
+def _mixed(eng, seconds: float) -> dict:
+    stop = threading.Event()
+    latencies: list[float] = []
+    counts = {"job_rows": 0, "api_writes": 0, "reads": 0, "locked": 0}
+    counts_lock = threading.Lock()
+
+    def count(key, n=1):
+        with counts_lock:
+            counts[key] += n
+
+    def job():
+        n = 0
+        while not stop.is_set():
+            rows = [{"company_name": f"Job {n}-{i}", "city": "Aachen"} for i in range(JOB_BATCH)]
+            n += 1
+            try:
+                with Session(eng) as session:
+                    session.execute(insert(Lead), rows)
+                    session.commit()
+                count("job_rows", len(rows))
+            except OperationalError:
+                count("locked")
+
+    def api_writer():
+        n = 0
+        while not stop.is_set():
+            n += 1
+            try:
+                with Session(eng) as session:
+                    session.add(Lead(company_name=f"Api {n}", city="Essen"))
+                    session.commit()
+                count("api_writes")
+            except OperationalError:
+                count("locked")
+
+    def reader():
+        page = select(Lead.id, Lead.company_name, Lead.city).order_by(Lead.id.desc()).limit(50)
+        total = select(func.count()).select_from(Lead)
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                with Session(eng) as session:
+                    session.execute(page).all()
+                    session.execute(total).scalar()
+            except OperationalError:
+                count("locked")
+                continue
+            with counts_lock:
+                latencies.append((time.perf_counter() - start) * 1000)
+                counts["reads"] += 1
+
+    threads = [threading.Thread(target=job), threading.Thread(target=api_writer)]
+    threads += [threading.Thread(target=reader) for _ in range(READERS)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else float("nan")  # noqa: E731
+    return {
+        "job rows/s": counts["job_rows"] / seconds,
+        "api writes/s": counts["api_writes"] / seconds,
+        "reads/s": counts["reads"] / seconds,
+        "read p50 ms": statistics.median(latencies) if latencies else float("nan"),
+        "read p95 ms": pct(0.95),
+        "read max ms": latencies[-1] if latencies else float("nan"),
+        "lock errors": counts["locked"],
+    }
+
+
+def _run(profile: str, seconds: float) -> dict:
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    os.unlink(path)
+    eng = _engine(path, profile)
+    try:
+        results = {"small commits/s": _small_commits(eng)}
+        results.update(_mixed(eng, seconds))
+    finally:
+        eng.dispose()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.unlink(path + suffix)
+    for name, value in results.items():
+        print(f"  [{profile}] {name:<16} {value:10.1f}")
+    return results
+
+
+def main() -> None:
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    print(f"sqlite: {SEED_ROWS} seed leads, {READERS} readers, {seconds:g}s mixed load")
+    default = _run("default", seconds)
+    tuned = _run("tuned", seconds)
+    print("tuned / default:")
+    for name in default:
+        if name == "lock errors":
+            print(f"  {name:<16} {default[name]:.0f} -> {tuned[name]:.0f}")
+        else:
+            print(f"  {name:<16} {tuned[name] / max(default[name], 1e-6):6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+from fastapi import HTTPException
+
+# Admission control for expensive endpoints.
+#
+# Each group (e.g. "generation") admits at most `concurrency` requests at a
+# time. Up to `queue` more wait on the event loop, which costs no worker
+# thread, so cheap endpoints keep their thread pool. Anything beyond that,
+# or a request that waited longer than `queue_timeout`, is shed with
+# 429 Too Many Requests and a Retry-After estimate.
+#
+# A slot is held until release() is called, which may happen on any thread:
+# background runs release it when the run finishes, not when the 202 is sent.
+#
+# Limits per group come from ADMISSION_<GROUP>_CONCURRENCY,
+# ADMISSION_<GROUP>_QUEUE and ADMISSION_QUEUE_TIMEOUT (seconds).
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class Overloaded(HTTPException):
+    def __init__(self, group: str, retry_after: int, reason: str):
+        super().__init__(
+            status_code=429,
+            detail={"error": "too_many_requests", "group": group, "reason": reason},
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+class Ticket:
+    """One admitted request. release() is idempotent and thread-safe."""
+
+    def __init__(self, limiter: "AdmissionLimiter"):
+        self._limiter = limiter
+        self._released = False
+        self._lock = threading.Lock()
+        self.admitted_at = time.monotonic()
+
+    def release(self) -> None:
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._limiter._release(time.monotonic() - self.admitted_at)
+
+
+class _Waiter:
+    __slots__ = ("loop", "future", "granted")
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.future = loop.create_future()
+        self.granted = False
+
+    def wake(self) -> None:
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class AdmissionLimiter:
+    def __init__(self, name: str, concurrency: int, queue: int, queue_timeout: float):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.queue = max(0, queue)
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+        # moving average of how long a slot is held, for Retry-After
+        self.avg_hold_seconds = 0.0
+        self._waiters: deque = deque()
+        self._lock = threading.Lock()
+
+    def retry_after(self) -> int:
+        with self._lock:
+            waiting = len(self._waiters)
+            avg = self.avg_hold_seconds
+        estimate = avg * (1 + waiting / self.concurrency) if avg else 1.0
+        return max(1, min(3600, math.ceil(estimate)))
+
+    def _reject(self, reason: str) -> Overloaded:
+        with self._lock:
+            self.rejected += 1
+        return Overloaded(self.name, self.retry_after(), reason)
+
+    async def acquire(self) -> Ticket:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.active < self.concurrency and not self._waiters:
+                self.active += 1
+                self.admitted += 1
+                return Ticket(self)
+            if len(self._waiters) >= self.queue:
+                waiter = None
+            else:
+                waiter = _Waiter(loop)
+                self._waiters.append(waiter)
+        if waiter is None:
+            raise self._reject("queue_full")
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._lock:
+                granted = waiter.granted
+                if not granted:
+                    self._waiters.remove(waiter)
+            if granted:
+                # the slot was handed over while we gave up; pass it on
+                Ticket(self).release()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise self._reject("queue_timeout")
+        with self._lock:
+            self.admitted += 1
+        return Ticket(self)
+
+    def _release(self, held_seconds: float) -> None:
+        with self._lock:
+            self.avg_hold_seconds = held_seconds if not self.avg_hold_seconds \
+                else 0.8 * self.avg_hold_seconds + 0.2 * held_seconds
+            if self._waiters:
+                # hand the slot to the next waiter; `active` stays the same
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                waiter.loop.call_soon_threadsafe(waiter.wake)
+                return
+            self.active -= 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "concurrency": self.concurrency,
+                "queue": self.queue,
+                "queue_timeout": self.queue_timeout,
+                "active": self.active,
+                "waiting": len(self._waiters),
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "avg_hold_seconds": round(self.avg_hold_seconds, 3),
+            }
+
+
+# group -> (default concurrency, default queue)
+DEFAULT_LIMITS = {
+    # /leads/generate and /leads/generate-offers: paid provider calls, python-docx
+    "generation": (1, 4),
+    "scripts": (1, 2),
+    "export": (2, 4),
+    "import": (1, 2),
+}
+
+_limiters: dict[str, AdmissionLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter(group: str) -> AdmissionLimiter:
+    with _limiters_lock:
+        lim = _limiters.get(group)
+        if lim is None:
+            concurrency, queue = DEFAULT_LIMITS.get(group, (2, 4))
+            env = group.upper()
+            lim = AdmissionLimiter(
+                group,
+                concurrency=_env_int(f"ADMISSION_{env}_CONCURRENCY", concurrency),
+                queue=_env_int(f"ADMISSION_{env}_QUEUE", queue),
+                queue_timeout=_env_float("ADMISSION_QUEUE_TIMEOUT", 30.0),
+            )
+            _limiters[group] = lim
+        return lim
+
+
+async def admit(group: str) -> Ticket:
+    return await limiter(group).acquire()
+
+
+def snapshot() -> dict:
+    with _limiters_lock:
+        items = list(_limiters.items())
+    return {name: lim.snapshot() for name, lim in items}
@@ -1,7 +1,10 @@
 import os
 from typing import List, Optional
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field, root_validator
 try:
     from pydantic import ConfigDict  # pydantic v2
@@ -12,46 +15,137 @@ import shutil
 import logging
 from sqlalchemy import text
 from sqlalchemy import inspect
+from sqlalchemy import or_, and_, update
 from datetime import datetime
 import re
 import unicodedata
 import traceback
-
-# track import errors for diagnostics
-pipeline_import_error: str | None = None
-filter_pipeline_import_error: str | None = None
+import importlib
+import base64
+import hmac
+import csv
+import io
+import json
+import tempfile
+import zipfile
+import time
+import threading
+import hashlib
 
 # Support both local and Docker imports
 try:
-    from src.db.engine import SessionLocal, engine
+    from src.db.engine import SessionLocal, get_engine, engine_ready, on_engine_ready, warm_pool, pool_stats, DB_POOL_WARMUP
+    from src.db.async_engine import run_read, dispose_async_engine, async_engine_stats
+    from src.db import read_routing
+    from src.db.script_store import prune_scripts, script_hash, set_script, store_texts
     from src.db.models.lead import Lead, Base, ColdEmailTemplate, ColdPhoneCallTemplate, OfferSheetTemplate
-    from src.db.repositories.lead_repository import LeadRepository
+    from src.db.repositories.lead_repository import LeadRepository, no_website_filter
+    from src.db.change_tracking import cached_lead_total, read_leads_version
+    from src.db.search import apply_search, ensure_search_index
+    from src.db.template_cache import template_registry
+    from src.db.lead_import import LeadImporter, detect_format, iter_csv, iter_xlsx, iter_leads
+    from src.api.progress import runs as progress_runs, sse_stream, RunIdInUse, SingleFlight, wait_finished
+    from src import metrics
+    from src.api import profiling
+    from src.templating import render as render_template
+    from src.api.fastjson import FastJSONResponse
+    from src.api import admission
 except Exception:
-    from Backend.src.db.engine import SessionLocal, engine  # type: ignore
+    from Backend.src.db.engine import SessionLocal, get_engine, engine_ready, on_engine_ready, warm_pool, pool_stats, DB_POOL_WARMUP  # type: ignore
+    from Backend.src.db.async_engine import run_read, dispose_async_engine, async_engine_stats  # type: ignore
+    from Backend.src.db import read_routing  # type: ignore
+    from Backend.src.db.script_store import prune_scripts, script_hash, set_script, store_texts  # type: ignore
     from Backend.src.db.models.lead import Lead, Base, ColdEmailTemplate, ColdPhoneCallTemplate, OfferSheetTemplate  # type: ignore
-    from Backend.src.db.repositories.lead_repository import LeadRepository  # type: ignore
+    from Backend.src.db.repositories.lead_repository import LeadRepository, no_website_filter  # type: ignore
+    from Backend.src.db.change_tracking import cached_lead_total, read_leads_version  # type: ignore
+    from Backend.src.db.search import apply_search, ensure_search_index  # type: ignore
+    from Backend.src.db.template_cache import template_registry  # type: ignore
+    from Backend.src.db.lead_import import LeadImporter, detect_format, iter_csv, iter_xlsx, iter_leads  # type: ignore
+    from Backend.src.api.progress import runs as progress_runs, sse_stream, RunIdInUse, SingleFlight, wait_finished  # type: ignore
+    from Backend.src import metrics  # type: ignore
+    from Backend.src.api import profiling  # type: ignore
+    from Backend.src.templating import render as render_template  # type: ignore
+    from Backend.src.api.fastjson import FastJSONResponse  # type: ignore
+    from Backend.src.api import admission  # type: ignore
+
+
+class _LazyModule:
+    """Import a pipeline module on first attribute access.
+
+    The pipelines pull in pandas, python-docx, tldextract and requests; loading
+    them lazily keeps cold starts of cheap endpoints fast. The proxy is falsy
+    when the module cannot be imported (the old `pipeline = None` behaviour),
+    and attribute assignment is forwarded to the real module.
+    """
+
+    def __init__(self, *candidates: str):
+        object.__setattr__(self, "_candidates", candidates)
+        object.__setattr__(self, "_module", None)
+        object.__setattr__(self, "_import_error", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def _load(self):
+        if self._module is not None or self._import_error is not None:
+            return self._module
+        with self._lock:
+            if self._module is None and self._import_error is None:
+                errors = []
+                for name in self._candidates:
+                    try:
+                        object.__setattr__(self, "_module", importlib.import_module(name))
+                        break
+                    except Exception as e:
+                        errors.append(str(e) or "unknown error")
+                else:
+                    # track import errors for diagnostics
+                    object.__setattr__(self, "_import_error", "\n".join(errors) + "\n" + traceback.format_exc())
+        return self._module
+
+    @property
+    def import_error(self) -> str | None:
+        self._load()
+        return self._import_error
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __bool__(self) -> bool:
+        return self._load() is not None
+
+    def __getattr__(self, name):
+        module = self._load()
+        if module is None:
+            raise AttributeError(f"pipeline unavailable: {name}")
+        return getattr(module, name)
+
+    def __setattr__(self, name, value):
+        module = self._load()
+        if module is None:
+            raise AttributeError(f"pipeline unavailable: {name}")
+        setattr(module, name, value)
 
-# Import pipeline helpers
-try:
-    # prefer package-style import when running from src/ layout
-    from src.pipelines import lead_auto_pipeline_de as pipeline
-except Exception as e:
-    try:
-        # fallback when running from repository root where Backend/ is top-level
-        from Backend.src import lead_auto_pipeline_de as pipeline  # type: ignore
-    except Exception as e2:
-        pipeline = None  # type: ignore
-        pipeline_import_error = (str(e2) or str(e) or "unknown error") + "\n" + traceback.format_exc()
 
+# Import pipeline helpers
+# prefer package-style import when running from src/ layout, fall back to
+# the repository root layout where Backend/ is top-level
+pipeline = _LazyModule("src.pipelines.lead_auto_pipeline_de", "Backend.src.lead_auto_pipeline_de")
 # New: optional filter pipeline to auto-generate offers for low-website-quality leads
-try:
-    from src.pipelines import lead_filter_pipeline as filter_pipeline
-except Exception as e:
+filter_pipeline = _LazyModule("src.pipelines.lead_filter_pipeline", "Backend.src.lead_filter_pipeline")
+
+
+def _init_schema(eng) -> None:
+    # Ensure tables exist
     try:
-        from Backend.src import lead_filter_pipeline as filter_pipeline  # type: ignore
-    except Exception as e2:
-        filter_pipeline = None  # type: ignore
-        filter_pipeline_import_error = (str(e2) or str(e) or "unknown error") + "\n" + traceback.format_exc()
+        Base.metadata.create_all(eng)
+    except Exception:
+        pass
+    # Search index for /leads?q= (FTS5 shadow table on SQLite, pg_trgm on Postgres)
+    ensure_search_index(eng)
+
+
+# Runs once, when the first request that needs the database resolves the engine
+on_engine_ready(_init_schema)
 
 app = FastAPI(title="Website Service API")
 
@@ -84,6 +178,73 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        metrics.http_request_duration.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=str(status),
+        )
+
+
+@app.middleware("http")
+async def route_reads(request: Request, call_next):
+    """Replica or primary for this request's reads; see src/db/read_routing.py."""
+    token = read_routing.begin_request(request.cookies.get(read_routing.COOKIE_NAME))
+    route = read_routing.current()
+    try:
+        response = await call_next(request)
+    finally:
+        read_routing.end_request(token)
+    read_routing.apply_cookie(response, route, request.method)
+    return response
+
+
+def _profiling_authorized(request: Request) -> bool:
+    token = profiling.profiling_token()
+    if not token:
+        return False
+    # header only: a token in the query string would be written to access logs
+    supplied = request.headers.get("x-profile-token") or ""
+    return hmac.compare_digest(supplied.encode("utf-8"), token.encode("utf-8"))
+
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    """Opt-in per-request profiler; see src/api/profiling.py for the protocol."""
+    mode = (request.headers.get("x-profile") or request.query_params.get("__profile") or "").strip().lower()
+    if not mode or not profiling.profiling_token():
+        return await call_next(request)
+    if mode not in profiling.PROFILE_MODES or not _profiling_authorized(request):
+        return JSONResponse(status_code=403, content={"detail": "profiling not allowed"})
+    profiler = profiling.make_profiler(mode)
+    try:
+        profiler.start()
+    except profiling.ProfilerBusy as e:
+        return JSONResponse(status_code=409, content={"detail": f"profiler busy: {e}"})
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        artifact = profiler.stop()
+        profile_id = profiling.profiles.save(
+            mode, request.method, request.url.path, time.perf_counter() - start, status, artifact
+        )
+    response.headers["X-Profile-Id"] = profile_id
+    return response
+
+
 # Helper: parse truthy values from strings/bools
 def _is_truthy(val) -> bool:
     if isinstance(val, bool):
@@ -103,6 +264,13 @@ def _env_truthy(name: str, default: bool = False) -> bool:
     return _is_truthy(val)
 
 
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
 # Mapping from client outreach keys to env variable names used by filter pipeline
 OUTREACH_ENV_MAP: dict[str, str] = {
     "yourName": "YOUR_NAME",
@@ -197,13 +365,35 @@ class GenerateLeadsIn(BaseModel):
         return values
 
 
+class GenerateScriptsIn(BaseModel):
+    # Defaults to TEMPLATE_LANG like the per-slug endpoint
+    template_lang: str | None = Field(None, alias="templateLang")
+    # Restrict to these lead ids and/or to leads matching a search term (as GET /leads?q=)
+    ids: list[int] | None = None
+    q: str | None = None
+    # Only fill leads that have no scripts yet
+    only_missing: bool = Field(False, alias="onlyMissing")
+    batch_size: int = Field(500, alias="batchSize", ge=1, le=5000)
+
+    if ConfigDict is not None:  # type: ignore[name-defined]
+        model_config = ConfigDict(populate_by_name=True)  # type: ignore[misc]
+
+
 @app.on_event("startup")
 async def on_startup():
-    # Ensure tables exist
-    try:
-        Base.metadata.create_all(engine)
-    except Exception:
-        pass
+    # Schema setup runs lazily with the engine (see _init_schema); opt in to
+    # connecting eagerly for long-running servers.
+    if _env_truthy("DB_EAGER_CONNECT", False):
+        await run_in_threadpool(get_engine)
+    # DB_POOL_WARMUP=N opens N pooled connections in the background, so the
+    # first requests after a deploy don't each pay for a fresh connection.
+    if DB_POOL_WARMUP > 0:
+        threading.Thread(target=warm_pool, name="db-pool-warmup", daemon=True).start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await dispose_async_engine()
 
 
 @app.get("/healthz")
@@ -211,31 +401,170 @@ async def healthz():
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus text exposition of request, provider, DB and pipeline stage metrics."""
+    return PlainTextResponse(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
+# ---------------- Conditional GET (ETags) ---------------- #
+
+def _make_etag(*parts) -> str:
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()[:32]
+    return f'W/"{digest}"'
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # weak comparison: ignore W/ prefixes on both sides
+    wanted = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        c = candidate.strip()
+        if c.startswith("W/"):
+            c = c[2:]
+        if c == wanted:
+            return True
+    return False
+
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+def _set_etag(response: Response, etag: str) -> None:
+    response.headers["ETag"] = etag
+    # let browsers keep the body but revalidate on every use
+    response.headers["Cache-Control"] = "no-cache"
+
+
+def _encode_cursor(last_id: int, rank: Optional[float] = None) -> str:
+    raw = f"id:{int(last_id)}" if rank is None else f"rank:{float(rank)!r}:id:{int(last_id)}"
+    return base64.urlsafe_b64encode(raw.encode("ascii")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[int, Optional[float]]:
+    """Return (after_id, after_rank) from an opaque cursor; rank is set for ranked search pages."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("ascii")
+        parts = raw.split(":")
+        if len(parts) == 2 and parts[0] == "id":
+            return int(parts[1]), None
+        if len(parts) == 4 and parts[0] == "rank" and parts[2] == "id":
+            return int(parts[3]), float(parts[1])
+        raise ValueError(raw)
+    except Exception:
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+
+# Every Lead column, in table order: the same fields the ORM path serializes
+LEAD_LIST_COLUMNS = tuple(getattr(Lead, c.key) for c in Lead.__table__.columns)
+LEAD_LIST_FIELDS = tuple(c.key for c in Lead.__table__.columns)
+
+
 @app.get("/leads")
-async def list_leads(page: int = 1, page_size: int = 250, q: Optional[str] = None):
-    """List leads with optional text filter and pagination. Returns { items, total }."""
+async def list_leads(
+    request: Request,
+    response: Response,
+    page: int = 1,
+    page_size: int = 250,
+    q: Optional[str] = None,
+    after_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fast: Optional[bool] = None,
+    city: Optional[str] = None,
+    industry: Optional[str] = None,
+):
+    """List leads with optional text filter and pagination. Returns { items, total, next_cursor }.
+
+    Two pagination modes:
+      - page/page_size (offset based, kept for existing clients)
+      - cursor or after_id (keyset), constant cost for deep pages
+    `city` and `industry` filter on exact values (indexed together with id).
+    Without `q` rows are ordered by `id desc`. With `q` the indexed search
+    (src/db/search.py) ranks matches by relevance; its cursors carry the rank.
+    `total` is cached per search term and invalidated when leads are written.
+    The ETag comes from the leads change counter, so a matching If-None-Match
+    is answered with 304 before any lead query runs.
+    With `fast=true` (or LEADS_FAST_JSON=1) rows are selected as plain column
+    tuples and encoded directly, skipping ORM hydration and jsonable_encoder.
+    The JSON is the same either way.
+    Queries run on the async engine when DB_ASYNC=1 (see src/db/async_engine.py).
+    """
+    use_fast = _env_truthy("LEADS_FAST_JSON", False) if fast is None else bool(fast)
     # enforce sane bounds
     page = max(1, int(page))
     page_size = max(1, min(1000, int(page_size)))
     offset = (page - 1) * page_size
+    after_rank: Optional[float] = None
+    if cursor:
+        after_id, after_rank = _decode_cursor(cursor)
 
     try:
-        with SessionLocal() as session:
-            query = session.query(Lead)
+        def _page(session):
+            version = read_leads_version(session)
+            etag = None
+            if version is not None:
+                etag = _make_etag("leads", version, page, page_size, q or "", after_id, cursor or "",
+                                  city or "", industry or "")
+                if _etag_matches(request, etag):
+                    return _not_modified(etag)
+            query = session.query(*LEAD_LIST_COLUMNS) if use_fast else session.query(Lead)
+            if city:
+                query = query.filter(Lead.city == city)
+            if industry:
+                query = query.filter(Lead.industry == industry)
+            rank_expr = None
             if q:
-                term = f"%{q}%"
-                # search across common text fields
-                query = query.filter(
-                    (Lead.company_name.ilike(term)) |
-                    (Lead.city.ilike(term)) |
-                    (Lead.industry.ilike(term)) |
-                    (Lead.email.ilike(term)) |
-                    (Lead.phone.ilike(term))
-                )
-            total = query.count()
-            rows = query.order_by(Lead.id.desc()).offset(offset).limit(page_size).all()
-            items = [r for r in rows]
-            return {"items": items, "total": total}
+                query, rank_expr = apply_search(query, q, session.get_bind())
+            # replica and primary may differ by the replication lag, so cache their totals apart
+            total = cached_lead_total(q, query.count, filters=(city or "", industry or "",
+                                                               session.info.get("read_target", "")))
+            # an explicit after_id pages by id, even for search results
+            if rank_expr is not None and after_id is not None and after_rank is None:
+                rank_expr = None
+            if rank_expr is not None:
+                query = query.add_columns(rank_expr.label("search_rank"))
+                query = query.order_by(rank_expr.desc(), Lead.id.desc())
+                if after_id is not None:
+                    query = query.filter(or_(
+                        rank_expr < after_rank,
+                        and_(rank_expr == after_rank, Lead.id < int(after_id)),
+                    ))
+            else:
+                query = query.order_by(Lead.id.desc())
+                if after_id is not None:
+                    query = query.filter(Lead.id < int(after_id))
+            if after_id is None:
+                query = query.offset(offset)
+            # fetch one extra row to know whether another page exists
+            rows = query.limit(page_size + 1).all()
+            has_more = len(rows) > page_size
+            rows = rows[:page_size]
+            last_rank = rows[-1][-1] if rows and rank_expr is not None else None
+            if use_fast:
+                n = len(LEAD_LIST_FIELDS)
+                items = [dict(zip(LEAD_LIST_FIELDS, r[:n])) for r in rows]
+                last_id = items[-1]["id"] if items else None
+            else:
+                items = [r[0] for r in rows] if rank_expr is not None else list(rows)
+                last_id = items[-1].id if items else None
+            next_cursor = _encode_cursor(last_id, last_rank) if has_more and items else None
+            body = {"items": items, "total": total, "next_cursor": next_cursor}
+            if use_fast:
+                fast_response = FastJSONResponse(body)
+                if etag is not None:
+                    _set_etag(fast_response, etag)
+                return fast_response
+            if etag is not None:
+                _set_etag(response, etag)
+            return body
+
+        return await run_read(_page)
     except Exception as e:
         # Log full traceback for server logs and return a generic 500 to the client
         try:
@@ -245,9 +574,162 @@ async def list_leads(page: int = 1, page_size: int = 250, q: Optional[str] = Non
         raise HTTPException(status_code=500, detail="internal server error")
 
 
+EXPORT_COLUMNS = (
+    "id", "company_name", "website", "email", "phone", "city",
+    "industry", "contact", "interested", "created_at",
+)
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+EXPORT_BATCH_SIZE = 1000
+
+
+def _export_rows(q: Optional[str], city: Optional[str] = None, industry: Optional[str] = None):
+    """Yield export rows as tuples straight from a server-side cursor (on the read replica if configured)."""
+    with read_routing.session_for(read_routing.read_target()) as session:
+        query = session.query(*(getattr(Lead, c) for c in EXPORT_COLUMNS))
+        if city:
+            query = query.filter(Lead.city == city)
+        if industry:
+            query = query.filter(Lead.industry == industry)
+        if q:
+            query, _ = apply_search(query, q, session.get_bind())
+        query = query.order_by(Lead.id.desc()).execution_options(yield_per=EXPORT_BATCH_SIZE)
+        for row in query:
+            yield tuple(row)
+
+
+def _export_value(v):
+    if isinstance(v, datetime):
+        return v.isoformat()
+    return v
+
+
+def _export_csv(rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_COLUMNS)
+    for i, row in enumerate(rows, 1):
+        writer.writerow(["" if v is None else _export_value(v) for v in row])
+        if i % EXPORT_BATCH_SIZE == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def _export_ndjson(rows):
+    chunk = []
+    for row in rows:
+        chunk.append(json.dumps({c: _export_value(v) for c, v in zip(EXPORT_COLUMNS, row)}, ensure_ascii=False))
+        if len(chunk) >= EXPORT_BATCH_SIZE:
+            yield "\n".join(chunk) + "\n"
+            chunk = []
+    if chunk:
+        yield "\n".join(chunk) + "\n"
+
+
+def _export_xlsx(rows):
+    # write-only workbooks spill rows to temp files, so memory stays flat; the
+    # zip container can only be produced once all rows are written
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Leads")
+    ws.append(list(EXPORT_COLUMNS))
+    for row in rows:
+        ws.append([_export_value(v) for v in row])
+    with tempfile.TemporaryFile() as fh:
+        wb.save(fh)
+        fh.seek(0)
+        while True:
+            block = fh.read(64 * 1024)
+            if not block:
+                break
+            yield block
+
+
+@app.get("/leads/export")
+async def export_leads(format: str = "csv", q: Optional[str] = None,
+                       city: Optional[str] = None, industry: Optional[str] = None):
+    """Stream all leads matching `q`, `city` and `industry` (same filters as GET /leads) as CSV, NDJSON or XLSX."""
+    fmt = (format or "").strip().lower()
+    if fmt not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"unsupported format; use one of {', '.join(EXPORT_MEDIA_TYPES)}")
+    writer = {"csv": _export_csv, "ndjson": _export_ndjson, "xlsx": _export_xlsx}[fmt]
+    ticket = await admission.admit("export")
+    # the slot is held while the body streams; released when the stream ends
+    # or, should it never start, after the response
+    return StreamingResponse(
+        _released_after(writer(_export_rows(q, city, industry)), ticket),
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="leads.{fmt}"'},
+        background=BackgroundTask(ticket.release),
+    )
+
+
+def _released_after(chunks, ticket):
+    try:
+        yield from chunks
+    finally:
+        ticket.release()
+
+
+# Uploads up to this size stay in memory, larger ones spill to a temp file
+IMPORT_SPOOL_BYTES = 8 * 1024 * 1024
+
+
+@app.post("/leads/import")
+async def import_leads(request: Request, response: Response, format: Optional[str] = None,
+                       filename: Optional[str] = None, background: bool = False):
+    """Bulk-load leads from a CSV or XLSX file sent as the request body.
+
+    e.g. `curl --data-binary @leads.xlsx "/leads/import?filename=leads.xlsx"`.
+    German and English headers are recognized (Firmenname/Company,
+    Webseite/Website, Telefon/Phone, ...). Leads are upserted on their natural
+    key, so re-importing a file updates rows instead of duplicating them.
+    Progress is reported like /leads/generate (X-Run-Id, `background=true`).
+    """
+    ctype = request.headers.get("content-type")
+    if (ctype or "").lower().startswith("multipart/"):
+        raise HTTPException(status_code=415, detail="send the file as the raw request body, not as a form upload")
+    ticket = await admission.admit("import")
+    try:
+        spool = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES)
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+        fmt = (format or "").strip().lower() or detect_format(ctype, filename, spool.read(4))
+        spool.seek(0)
+        if fmt not in ("csv", "xlsx"):
+            spool.close()
+            raise HTTPException(status_code=400, detail="unsupported file; pass format=csv or format=xlsx")
+    except BaseException:
+        ticket.release()
+        raise
+    run = _start_run("import", request, ticket)
+    return await _execute_run(run, response, background, lambda: _import_leads_sync(spool, fmt, run.emit), ticket)
+
+
+def _import_leads_sync(spool, fmt: str, progress=None) -> dict:
+    columns: dict = {}
+    try:
+        rows = iter_xlsx(spool) if fmt == "xlsx" else iter_csv(spool)
+        with metrics.stage_timer("import", fmt), SessionLocal() as session:
+            stats = LeadImporter(session, progress=progress).load(iter_leads(rows, columns))
+            session.commit()
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="not a valid xlsx file")
+    finally:
+        spool.close()
+    return {"format": fmt, "columns": columns, **stats}
+
+
 # Debug endpoint to test database connectivity and engine type. Use carefully in private deployments.
 @app.get("/debug/db")
 async def debug_db():
+    engine = get_engine()
     info = {"engine_present": bool(engine)}
     try:
         # Detect if using SQLite (file path) vs Postgres
@@ -283,12 +765,44 @@ async def debug_db():
             logging.getLogger("uvicorn.error").exception("Error in /debug/db: %s", e)
         except Exception:
             pass
+    # Pool usage (checked out, overflow, waits) for sizing DB_POOL_SIZE / DB_MAX_OVERFLOW
+    info["pool"] = pool_stats()
+    info["async_engine"] = async_engine_stats()
+    info["read_replica"] = read_routing.stats()
     return info
 
 
+@app.get("/debug/admission")
+async def debug_admission():
+    """Per-group concurrency limits, slots in use, queue length and shed counts."""
+    return admission.snapshot()
+
+
+@app.get("/debug/profiles")
+async def list_profiles(request: Request):
+    if not _profiling_authorized(request):
+        raise HTTPException(status_code=404, detail="not found")
+    return {"items": profiling.profiles.list()}
+
+
+@app.get("/debug/profiles/{profile_id}")
+async def get_profile(profile_id: str, request: Request):
+    """Return a stored profile: collapsed stacks (flamegraph input) or a pstats report."""
+    if not _profiling_authorized(request):
+        raise HTTPException(status_code=404, detail="not found")
+    item = profiling.profiles.get(profile_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="profile not found")
+    return PlainTextResponse(
+        item["artifact"],
+        headers={"X-Profile-Format": item["format"], "X-Profile-Path": item["path"]},
+    )
+
+
 # Debug helper: create missing tables (safe to call in private deployments)
 @app.post("/debug/create_tables")
 async def debug_create_tables():
+    engine = get_engine()
     try:
         Base.metadata.create_all(engine)
         try:
@@ -305,13 +819,25 @@ async def debug_create_tables():
 
 
 @app.get("/leads/{lead_id}", response_model=LeadOut)
-async def get_lead(lead_id: int):
-    with SessionLocal() as session:
+async def get_lead(lead_id: int, request: Request, response: Response):
+    def _get(session):
+        version = read_leads_version(session)
+        etag = _make_etag("lead", version, lead_id) if version is not None else None
+        if etag is not None and _etag_matches(request, etag):
+            # a concrete tag was only issued while the lead existed at this
+            # version; "*" matches any lead id, so check that it exists
+            if (request.headers.get("if-none-match") or "").strip() != "*" or \
+                    session.query(Lead.id).filter(Lead.id == lead_id).first() is not None:
+                return _not_modified(etag)
         row = session.query(Lead).filter(Lead.id == lead_id).first()
         if not row:
             raise HTTPException(status_code=404, detail="lead not found")
+        if etag is not None:
+            _set_etag(response, etag)
         return row
 
+    return await run_read(_get)
+
 
 @app.patch("/leads/{lead_id}/interested")
 async def update_interested(lead_id: int, payload: dict):
@@ -338,7 +864,7 @@ def _get_offers_root() -> Path:
     # On Vercel, the filesystem is read-only except for /tmp
     if os.getenv("VERCEL") == "1" or os.getenv("VERCEL", "").lower() in {"true", "yes"}:
         return Path("/tmp/offer-sheets")
-    if filter_pipeline is not None:
+    if filter_pipeline:
         return Path(getattr(filter_pipeline, "DEFAULT_OUTPUT_DIR", "Backend/offer-sheets"))
     return Path("Backend/offer-sheets")
 
@@ -348,64 +874,69 @@ def _run_auto_filter_offers(overwrite: bool = False) -> dict:
     if not filter_pipeline:
         return {"filtered": 0, "offers_generated": 0}
     try:
-        # Load all leads from DB
-        df = filter_pipeline.load_from_db()
-        if df.empty:
-            return {"filtered": 0, "offers_generated": 0}
-        website_col = filter_pipeline.find_website_column(df)
-        company_col = filter_pipeline.guess_company_column(df)
-        filtered = filter_pipeline.filter_rows(df, website_col)
-        if filtered.empty:
-            return {"filtered": 0, "offers_generated": 0}
-        # Ensure output dir exists (shared volume)
+        # The offer filter runs in SQL and matching leads arrive in chunks
         output_root = _get_offers_root()
-        filter_pipeline.ensure_dir(output_root)
         template_path = Path(getattr(filter_pipeline, "DEFAULT_TEMPLATE", "templates/docx/Angebot-Webseitenservice.docx"))
+        filtered = 0
         generated = 0
-        for _, row in filtered.iterrows():
-            try:
-                filter_pipeline.generate_offer(
-                    row=row,
-                    template_path=template_path,
-                    company_col=company_col,
-                    output_root=output_root,
-                    overwrite=overwrite,
-                )
-                generated += 1
-            except Exception:
-                # continue on individual row errors
-                pass
-        return {"filtered": int(len(filtered)), "offers_generated": int(generated)}
+        for chunk in filter_pipeline.iter_from_db(needs_offer=True):
+            if not filtered:
+                # Ensure output dir exists (shared volume)
+                filter_pipeline.ensure_dir(output_root)
+            filtered += len(chunk)
+            company_col = filter_pipeline.guess_company_column(chunk)
+            for _, row in chunk.iterrows():
+                try:
+                    filter_pipeline.generate_offer(
+                        row=row,
+                        template_path=template_path,
+                        company_col=company_col,
+                        output_root=output_root,
+                        overwrite=overwrite,
+                    )
+                    generated += 1
+                except Exception:
+                    # continue on individual row errors
+                    pass
+        return {"filtered": int(filtered), "offers_generated": int(generated)}
     except Exception:
         return {"filtered": 0, "offers_generated": 0}
 
 
 # New: generate offers for ALL current leads (not filtered)
-def _run_generate_offers_for_all(overwrite: bool = False) -> dict:
+def _run_generate_offers_for_all(overwrite: bool = False, progress=None) -> dict:
     if not filter_pipeline:
         return {"total": 0, "offers_generated": 0}
     try:
-        df = filter_pipeline.load_from_db()
-        if df.empty:
+        # Leads are read in chunks (OFFER_DB_CHUNK_SIZE), so memory does not grow with the table
+        total = filter_pipeline.count_from_db()
+        if progress is not None:
+            progress("offers_started", total=int(total))
+        if not total:
             return {"total": 0, "offers_generated": 0}
-        company_col = filter_pipeline.guess_company_column(df)
         output_root = _get_offers_root()
         filter_pipeline.ensure_dir(output_root)
         template_path = Path(getattr(filter_pipeline, "DEFAULT_TEMPLATE", "templates/docx/Angebot-Webseitenservice.docx"))
+        seen = 0
         generated = 0
-        for _, row in df.iterrows():
-            try:
-                filter_pipeline.generate_offer(
-                    row=row,
-                    template_path=template_path,
-                    company_col=company_col,
-                    output_root=output_root,
-                    overwrite=overwrite,
-                )
-                generated += 1
-            except Exception:
-                pass
-        return {"total": int(len(df)), "offers_generated": int(generated)}
+        for chunk in filter_pipeline.iter_from_db():
+            company_col = filter_pipeline.guess_company_column(chunk)
+            seen += len(chunk)
+            for _, row in chunk.iterrows():
+                try:
+                    filter_pipeline.generate_offer(
+                        row=row,
+                        template_path=template_path,
+                        company_col=company_col,
+                        output_root=output_root,
+                        overwrite=overwrite,
+                    )
+                    generated += 1
+                except Exception:
+                    pass
+                if progress is not None:
+                    progress("offer_generated", done=int(generated), total=int(total))
+        return {"total": int(seen), "offers_generated": int(generated)}
     except Exception:
         return {"total": 0, "offers_generated": 0}
 
@@ -438,16 +969,20 @@ async def generate_assets_for_slug(slug: str):
             phone_rendered = _render_template(getattr(phone_tpl, 'content', '') or '', mapping)
             # Persist if new or empty
             changed = False
-            if email_rendered and email_rendered != (target_lead.email_script or ''):
-                target_lead.email_script = email_rendered
+            replaced = {target_lead.email_script_hash, target_lead.phone_script_hash}
+            # compared by hash, so the stored texts are never loaded
+            if email_rendered and script_hash(email_rendered) != target_lead.email_script_hash:
+                set_script(target_lead, "email_script_hash", email_rendered, getattr(email_tpl, 'content', None))
                 changed = True
-            if phone_rendered and phone_rendered != (target_lead.phone_script or ''):
-                target_lead.phone_script = phone_rendered
+            if phone_rendered and script_hash(phone_rendered) != target_lead.phone_script_hash:
+                set_script(target_lead, "phone_script_hash", phone_rendered, getattr(phone_tpl, 'content', None))
                 changed = True
             if changed:
                 from datetime import datetime as _dt
                 target_lead.scripts_generated_at = _dt.utcnow()
                 session.add(target_lead)
+                # the texts the lead pointed to may now be unused
+                prune_scripts(session, replaced)
                 session.commit()
                 persisted = True
             email_len = len(email_rendered)
@@ -460,40 +995,144 @@ async def generate_assets_for_slug(slug: str):
         # Fallback to legacy pipeline if available
         if filter_pipeline:
             try:
-                df = filter_pipeline.load_from_db()
-                if not df.empty:
-                    company_col = filter_pipeline.guess_company_column(df)
-                    target_row = None
-                    for _, row in df.iterrows():
+                target_row = None
+                company_col = None
+                # scan chunk by chunk and stop at the first match
+                for chunk in filter_pipeline.iter_from_db():
+                    company_col = filter_pipeline.guess_company_column(chunk)
+                    for _, row in chunk.iterrows():
                         comp = str(row.get(company_col, ''))
                         if filter_pipeline.slugify(comp) == slug:
                             target_row = row
                             break
                     if target_row is not None:
-                        output_root = _get_offers_root()
-                        filter_pipeline.ensure_dir(output_root)
-                        template_path = Path(getattr(filter_pipeline, 'DEFAULT_TEMPLATE', 'templates/docx/Angebot-Webseitenservice.docx'))
-                        filter_pipeline.generate_offer(
-                            row=target_row,
-                            template_path=template_path,
-                            company_col=company_col,
-                            output_root=output_root,
-                            overwrite=False,
-                        )
+                        break
+                if target_row is not None:
+                    output_root = _get_offers_root()
+                    filter_pipeline.ensure_dir(output_root)
+                    template_path = Path(getattr(filter_pipeline, 'DEFAULT_TEMPLATE', 'templates/docx/Angebot-Webseitenservice.docx'))
+                    filter_pipeline.generate_offer(
+                        row=target_row,
+                        template_path=template_path,
+                        company_col=company_col,
+                        output_root=output_root,
+                        overwrite=False,
+                    )
             except Exception:
                 pass
     return {"ok": True, "persisted": persisted, "email_len": email_len, "phone_len": phone_len}
 
 
+# Columns needed to render and compare scripts; full Lead objects are not loaded
+_SCRIPT_SOURCE_COLUMNS = (
+    Lead.id, Lead.company_name, Lead.contact, Lead.city, Lead.industry,
+    Lead.phone, Lead.email, Lead.website, Lead.email_script_hash, Lead.phone_script_hash,
+)
+
+
+@app.post("/leads/generate-scripts")
+async def generate_scripts(payload: GenerateScriptsIn, request: Request, response: Response, background: bool = False):
+    """Render and persist cold email / phone scripts for all (or the filtered) leads in one pass.
+
+    Templates are loaded once, leads are streamed in batches and changed
+    scripts are written with one bulk UPDATE per batch; the texts go to the
+    deduplicated script store (src/db/script_store.py) first. Runs report progress
+    like /leads/generate (X-Run-Id, `background=true`, /runs/{run_id}/events).
+    """
+    ticket = await admission.admit("scripts")
+    run = _start_run("generate-scripts", request, ticket)
+    return await _execute_run(run, response, background, lambda: _generate_scripts_sync(payload, run.emit), ticket)
+
+
+def _generate_scripts_sync(payload: GenerateScriptsIn, progress=None) -> dict:
+    lang = (payload.template_lang or os.getenv('TEMPLATE_LANG') or os.getenv('LANG') or 'en').strip().lower()
+    batch_size = payload.batch_size
+    stats = {"lang": lang, "processed": 0, "updated": 0, "unchanged": 0, "batches": 0}
+    with SessionLocal() as session:
+        email_tpl = _fetch_template(session, ColdEmailTemplate, lang)
+        phone_tpl = _fetch_template(session, ColdPhoneCallTemplate, lang)
+        email_raw = getattr(email_tpl, 'content', '') or ''
+        phone_raw = getattr(phone_tpl, 'content', '') or ''
+        if not email_raw and not phone_raw:
+            return {**stats, "error": "no_templates"}
+
+        query = session.query(*_SCRIPT_SOURCE_COLUMNS).filter(Lead.company_name != None)  # noqa: E711
+        if payload.ids:
+            query = query.filter(Lead.id.in_(payload.ids))
+        if payload.q and payload.q.strip():
+            query, _ = apply_search(query, payload.q.strip(), session.get_bind())
+        if payload.only_missing:
+            query = query.filter(or_(Lead.email_script_hash == None, Lead.phone_script_hash == None))  # noqa: E711
+
+        # Leads are read in id pages and every batch is committed on its own:
+        # no cursor stays open across writes, the write lock (SQLite) and row
+        # locks (Postgres) are held for one batch, and a failure keeps the
+        # batches written before it.
+        last_id = 0
+        while True:
+            rows = query.filter(Lead.id > last_id).order_by(Lead.id).limit(batch_size).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            pending: list[dict] = []
+            email_texts: dict[str, str] = {}
+            phone_texts: dict[str, str] = {}
+            # hashes the batch re-points leads away from, pruned once it is written
+            replaced: set = set()
+            now = datetime.utcnow()
+            for row in rows:
+                stats["processed"] += 1
+                mapping = _build_placeholder_mapping_for_lead(row)
+                values = {}
+                # Same rule as /leads/{slug}/generate-assets: persist non-empty, changed scripts
+                email_rendered = _render_template(email_raw, mapping)
+                email_digest = script_hash(email_rendered) if email_rendered else None
+                if email_digest and email_digest != row.email_script_hash:
+                    values["email_script_hash"] = email_digest
+                    email_texts[email_digest] = email_rendered
+                    replaced.add(row.email_script_hash)
+                phone_rendered = _render_template(phone_raw, mapping)
+                phone_digest = script_hash(phone_rendered) if phone_rendered else None
+                if phone_digest and phone_digest != row.phone_script_hash:
+                    values["phone_script_hash"] = phone_digest
+                    phone_texts[phone_digest] = phone_rendered
+                    replaced.add(row.phone_script_hash)
+                if values:
+                    values["id"] = row.id
+                    values["scripts_generated_at"] = now
+                    pending.append(values)
+                else:
+                    stats["unchanged"] += 1
+            if pending:
+                # new texts first (deflated against their template), then the
+                # ORM bulk UPDATE of the hashes by primary key: one executemany per batch
+                store_texts(session, email_texts, email_raw)
+                store_texts(session, phone_texts, phone_raw)
+                session.execute(update(Lead), pending)
+                prune_scripts(session, replaced)
+                stats["updated"] += len(pending)
+            session.commit()
+            stats["batches"] += 1
+            if progress is not None:
+                progress("scripts_batch", processed=stats["processed"], updated=stats["updated"])
+            if len(rows) < batch_size:
+                break
+    return stats
+
+
 # New: helper to run filter only (no generation)
-def _run_filter_only() -> dict:
-    # Keep leads with no website, empty website, or facebook URLs; remove the rest.
+def _run_filter_only(progress=None) -> dict:
+    # Keep leads with no website or only a social media page; remove the rest.
     try:
         with SessionLocal() as session:
-            keep_cond = (Lead.website == None) | (Lead.website == "") | (Lead.website.ilike('%facebook%'))  # noqa: E711
+            keep_cond = no_website_filter(session.get_bind())
             kept = session.query(Lead).filter(keep_cond).count()
             removed = session.query(Lead).filter(~keep_cond).delete(synchronize_session=False)
+            if removed:
+                prune_scripts(session)
             session.commit()
+            if progress is not None:
+                progress("filtered", kept=int(kept), removed=int(removed))
             return {"filtered": int(kept), "removed": int(removed)}
     except Exception:
         try:
@@ -505,14 +1144,26 @@ def _run_filter_only() -> dict:
 
 @app.post("/leads/filter")
 async def filter_leads():
-    """Filters current leads and prunes DB by removing those with a proper website (non-empty and not Facebook)."""
+    """Filters current leads and prunes DB by removing those with a proper website (non-empty and not a social media page)."""
     return _run_filter_only()
 
 
 @app.post("/leads/generate-offers")
-async def generate_offers():
-    """Generates offers (DOCX + cold email/phone scripts + HTML summary) for ALL current leads."""
-    return _run_generate_offers_for_all(overwrite=False)
+async def generate_offers(request: Request, response: Response, background: bool = False):
+    """Generates offers (DOCX + cold email/phone scripts + HTML summary) for ALL current leads.
+
+    Progress is published under the run id (X-Run-Id header); with
+    `background=true` the call returns 202 at once and the result arrives
+    through /runs/{run_id}/events.
+    """
+    ticket = await admission.admit("generation")
+    run = _start_run("generate-offers", request, ticket)
+    return await _execute_run(run, response, background, lambda: _generate_offers_sync(run.emit), ticket)
+
+
+def _generate_offers_sync(progress) -> dict:
+    with _generation_lock:
+        return _run_generate_offers_for_all(overwrite=False, progress=progress)
 
 
 @app.delete("/leads")
@@ -522,6 +1173,7 @@ async def clear_leads():
     with SessionLocal() as session:
         try:
             deleted = session.query(Lead).delete()
+            prune_scripts(session)
             session.commit()
         except Exception:
             session.rollback()
@@ -538,7 +1190,151 @@ async def clear_leads():
 
 
 @app.post("/leads/generate")
-async def generate_leads(payload: GenerateLeadsIn, request: Request):
+async def generate_leads(payload: GenerateLeadsIn, request: Request, response: Response, background: bool = False):
+    """Collect, store and optionally filter leads.
+
+    The run executes in a worker thread and reports per-stage progress under
+    its run id (X-Run-Id header, client-supplied or generated; a supplied id
+    whose run is still unfinished gets 409); see
+    GET /runs/{run_id}/events. With `background=true` the call returns 202
+    immediately instead of waiting for the result.
+    """
+    # Respect either camelCase `autoFilter` (preferred) or legacy `auto_filter`
+    auto_val = getattr(payload, "autoFilter", None)
+    # Fall back to raw body if needed
+    if auto_val is None:
+        try:
+            raw_body = await request.json()
+            auto_val = raw_body.get("autoFilter", raw_body.get("auto_filter"))
+        except Exception:
+            pass
+    # Identical requests share one run (single flight); see _generate_flight_key
+    key = _generate_flight_key(payload, auto_val)
+    use_cache = "no-cache" not in (request.headers.get("cache-control") or "").lower()
+    # Attaching to a shared run costs nothing, so only a new leader is admitted
+    run, shared = _generate_flights.peek(key, use_cache=use_cache)
+    if run is None:
+        ticket = await admission.admit("generation")
+        run, shared = _generate_flights.join_or_start(
+            key, lambda: _start_run("generate", request, ticket), use_cache=use_cache,
+        )
+        if shared is None:
+            return await _execute_run(
+                run, response, background, lambda: _generate_leads_sync(payload, auto_val, run.emit), ticket,
+            )
+        # an identical request became leader while this one was queued
+        ticket.release()
+    logging.getLogger("uvicorn.error").info("Coalesced /leads/generate onto run %s (%s)", run.id, shared)
+    headers = {"X-Run-Id": run.id, "X-Coalesced": shared}
+    if background:
+        return JSONResponse(
+            status_code=202,
+            content={"run_id": run.id, "status": run.status, "events_url": f"/runs/{run.id}/events"},
+            headers=headers,
+        )
+    await wait_finished(run)
+    response.headers.update(headers)
+    if run.status != "done":
+        raise HTTPException(status_code=500, detail="internal server error")
+    return run.result
+
+
+def _start_run(kind: str, request: Request, ticket=None):
+    """Start a progress run under the client's X-Run-Id (if any); 409 while that id's run is unfinished."""
+    try:
+        return progress_runs.start(kind, request.headers.get("x-run-id"))
+    except RunIdInUse as e:
+        if ticket is not None:
+            ticket.release()
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+async def _execute_run(run, response: Response, background: bool, work, ticket=None):
+    """Run `work` off the event loop, recording its outcome on `run`.
+
+    An admission `ticket` is released once the work has finished, also for
+    background runs.
+    """
+    def _target():
+        try:
+            result = work()
+        except Exception as e:
+            run.finish(error=str(e) or e.__class__.__name__)
+            raise
+        finally:
+            if ticket is not None:
+                ticket.release()
+        run.finish(result=result)
+        return result
+
+    if background:
+        def _background():
+            try:
+                _target()
+            except Exception:
+                logging.getLogger("uvicorn.error").exception("Background run %s failed", run.id)
+        try:
+            threading.Thread(target=_background, name=f"run-{run.id}", daemon=True).start()
+        except Exception:
+            if ticket is not None:
+                ticket.release()
+            run.finish(error="could not start run")
+            raise
+        return JSONResponse(
+            status_code=202,
+            content={"run_id": run.id, "status": run.status, "events_url": f"/runs/{run.id}/events"},
+            headers={"X-Run-Id": run.id},
+        )
+    response.headers["X-Run-Id"] = run.id
+    return await run_in_threadpool(_target)
+
+
+# Generation runs mutate pipeline module globals and os.environ for their
+# duration, so at most one may execute at a time in this process.
+_generation_lock = threading.Lock()
+
+
+# Single flight for /leads/generate. GENERATE_RESULT_CACHE_SECONDS > 0 also
+# answers identical requests from the last successful run for that long.
+_generate_flights = SingleFlight(result_ttl=_env_float("GENERATE_RESULT_CACHE_SECONDS", 0.0))
+
+
+def _generate_flight_key(payload: GenerateLeadsIn, auto_val) -> str:
+    """Normalized identity of a generation request.
+
+    Keywords are order- and case-insensitive. Omitted city/country/provider
+    values stay "default" in the key rather than being resolved here, because
+    a running generation temporarily overrides the pipeline globals. Options
+    that change what a run does (auto filter, template language, outreach
+    values) are part of the key, so a request never receives the result of a
+    different kind of run.
+    """
+    if isinstance(payload.keywords, list):
+        keywords = [s for s in payload.keywords if s]
+    else:
+        keywords = (payload.keywords or os.getenv("KEYWORDS", "")).split(",")
+
+    def _norm(value):
+        return unicodedata.normalize("NFC", str(value)).strip().casefold() if value else None
+
+    ident = {
+        "keywords": sorted({_norm(k) for k in keywords if _norm(k)}),
+        "city": _norm(payload.city),
+        "country": _norm(payload.country_code),
+        "providers": [payload.use_places, payload.use_overpass],
+        "auto_filter": _is_truthy(auto_val) or (auto_val is None and _env_truthy("AUTO_FILTER", False)),
+        "template_lang": _norm(payload.template_lang),
+        "outreach": sorted((payload.outreach or {}).items()),
+    }
+    return hashlib.sha1(json.dumps(ident, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _generate_leads_sync(payload: GenerateLeadsIn, auto_val, progress) -> dict:
+    with _generation_lock:
+        return _generate_leads_locked(payload, auto_val, progress)
+
+
+def _generate_leads_locked(payload: GenerateLeadsIn, auto_val, progress) -> dict:
     # Resolve input/defaults
     if isinstance(payload.keywords, list):
         keywords = [s.strip() for s in payload.keywords if s and s.strip()]
@@ -582,14 +1378,19 @@ async def generate_leads(payload: GenerateLeadsIn, request: Request):
         all_rows = []
         if use_places:
             for kw in keywords:
-                all_rows.extend(pipeline.collect_places_for_keyword(kw))
+                progress("keyword_started", keyword=kw, provider="places")
+                with metrics.stage_timer("collect", "places"):
+                    all_rows.extend(pipeline.collect_places_for_keyword(kw, progress=progress))
         if use_overpass:
             for kw in keywords:
                 tags = pipeline.OSM_TAGS.get(kw, [])
                 if not tags:
                     continue
+                progress("keyword_started", keyword=kw, provider="overpass")
                 try:
-                    results = pipeline.overpass_query_bbox(city, country_code, tags)
+                    with metrics.stage_timer("collect", "overpass"):
+                        results = pipeline.overpass_query_bbox(city, country_code, tags)
+                    progress("overpass_fetched", keyword=kw, found=len(results or []))
                     if results:
                         all_rows.extend(results)
                 except Exception as e:
@@ -602,9 +1403,12 @@ async def generate_leads(payload: GenerateLeadsIn, request: Request):
                         pass
 
         # Dedupe & score
-        all_rows = pipeline.dedupe(all_rows)
-        for r in all_rows:
-            r["Score"] = pipeline.score_row(r)
+        collected = len(all_rows)
+        with metrics.stage_timer("collect", "dedupe_score"):
+            all_rows = pipeline.dedupe(all_rows)
+            for r in all_rows:
+                r["Score"] = pipeline.score_row(r)
+        progress("collected", found=collected, unique=len(all_rows))
 
         # Map to DB schema
         prepared: list[dict] = []
@@ -617,26 +1421,21 @@ async def generate_leads(payload: GenerateLeadsIn, request: Request):
                 "city": r.get("Stadt") or city,
                 "industry": r.get("Kategorie") or None,
                 "contact": r.get("Ansprechpartner") or None,
+                "source_id": r.get("QuelleID") or None,
             })
 
-        # Insert
-        inserted = 0
-        with SessionLocal() as session:
+        # Upsert by natural key; leads seen before are updated, not duplicated
+        inserted = updated = 0
+        with metrics.stage_timer("collect", "insert"), SessionLocal() as session:
             repo = LeadRepository(session)
             if prepared:
                 inserted = repo.upsert_many(prepared)
+                updated = repo.updated
+                session.commit()
+        progress("inserted", inserted=inserted, updated=updated)
 
         # Optionally run filtering pipeline and generate offers
         filter_summary = None
-        # Respect either camelCase `autoFilter` (preferred) or legacy `auto_filter`
-        auto_val = getattr(payload, "autoFilter", None)
-        # Fall back to raw body if needed
-        if auto_val is None:
-            try:
-                raw_body = await request.json()
-                auto_val = raw_body.get("autoFilter", raw_body.get("auto_filter"))
-            except Exception:
-                pass
         should_auto_filter = _is_truthy(auto_val) or (auto_val is None and _env_truthy("AUTO_FILTER", False))
         try:
             logging.getLogger("uvicorn.error").info("autoFilter resolved=%s (payload=%s)", should_auto_filter, auto_val)
@@ -644,12 +1443,13 @@ async def generate_leads(payload: GenerateLeadsIn, request: Request):
             pass
         if should_auto_filter:
             # Always prune DB first so only low-website-quality leads remain
-            print("AUTOMATICALLY FILTERING " + str(len(all_rows)) + " LEADS")
-            simple = _run_filter_only()
+            logging.getLogger("uvicorn.error").info("Automatically filtering %d leads", len(all_rows))
+            with metrics.stage_timer("collect", "auto_filter"):
+                simple = _run_filter_only(progress=progress)
             offers_generated = 0
             if filter_pipeline:
                 # Then generate offers for all remaining leads
-                offer_res = _run_generate_offers_for_all(overwrite=False)
+                offer_res = _run_generate_offers_for_all(overwrite=False, progress=progress)
                 try:
                     offers_generated = int(offer_res.get("offers_generated", 0)) if isinstance(offer_res, dict) else 0
                 except Exception:
@@ -663,6 +1463,7 @@ async def generate_leads(payload: GenerateLeadsIn, request: Request):
 
         resp = {
             "inserted": inserted,
+            "updated": updated,
             "found": len(all_rows),
             "keywords": keywords,
             "city": city,
@@ -692,9 +1493,73 @@ async def generate_leads(payload: GenerateLeadsIn, request: Request):
             pass
 
 
+@app.get("/runs/{run_id}")
+async def get_run(run_id: str):
+    """Snapshot of a generation run: status, progress events and, once finished, its result."""
+    run = progress_runs.get(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="run not found")
+    if run.finished_at is not None:
+        # the run's writes committed after the request that started it; keep
+        # the client on the primary until the replica has caught up with them
+        read_routing.note_write(run.finished_at)
+    return run.snapshot()
+
+
+@app.get("/runs/{run_id}/events")
+async def stream_run_events(run_id: str, request: Request):
+    """Server-Sent Events stream of a run's progress, ending with a `done` event carrying the result."""
+    run = progress_runs.get(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="run not found")
+    last_event_id = None
+    try:
+        raw = request.headers.get("last-event-id")
+        last_event_id = int(raw) if raw is not None else None
+    except ValueError:
+        last_event_id = None
+    return StreamingResponse(
+        sse_stream(run, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+_ASSET_SUMMARY_FILES = ("metadata.json", "cold_email.md", "cold_phone_call.md")
+
+
+async def _assets_state_etag(slug: str, target: Path) -> Optional[str]:
+    try:
+        version = await run_read(read_leads_version)
+    except Exception:
+        version = None
+    if version is None:
+        return None
+    stats = []
+    for name in _ASSET_SUMMARY_FILES:
+        try:
+            st = (target / name).stat()
+            stats.append(f"{name}:{st.st_mtime_ns}:{st.st_size}")
+        except OSError:
+            stats.append(f"{name}:-")
+    return _make_etag("assets", version, slug, *stats)
+
+
+def _db_scripts_for_slug(session, slug: str):
+    """(email_script, phone_script, scripts_generated_at) of the lead whose company slugifies to `slug`."""
+    candidates = session.query(Lead).filter(Lead.company_name != None).all()
+    for l in candidates:
+        try:
+            if filter_pipeline and filter_pipeline.slugify(l.company_name) == slug:
+                return (l.email_script or "", l.phone_script or "", getattr(l, 'scripts_generated_at', None))
+        except Exception:
+            continue
+    return "", "", None
+
+
 # New: serve a summary of generated assets for a given slug. If missing, try to generate once.
 @app.get("/assets/{slug}/summary")
-async def get_assets_summary(slug: str):
+async def get_assets_summary(slug: str, request: Request, response: Response):
     root = _get_offers_root()
     # Try lowercase dir first, then scan for case-insensitive match
     target = root / slug.lower()
@@ -719,22 +1584,18 @@ async def get_assets_summary(slug: str):
         except Exception:
             return None
 
+    # The summary is derived from the leads table and the files in `target`, so
+    # the change counter plus file stats identify it without reading either.
+    etag = await _assets_state_etag(slug, target)
+    if etag is not None and _etag_matches(request, etag):
+        return _not_modified(etag)
+
     # First: attempt to fetch scripts from DB (preferred for serverless envs)
     db_email = ""
     db_phone = ""
     db_ts = None
     try:
-        with SessionLocal() as session:
-            candidates = session.query(Lead).filter(Lead.company_name != None).all()
-            for l in candidates:
-                try:
-                    if filter_pipeline and filter_pipeline.slugify(l.company_name) == slug:
-                        db_email = (l.email_script or "") if hasattr(l, 'email_script') else ""
-                        db_phone = (l.phone_script or "") if hasattr(l, 'phone_script') else ""
-                        db_ts = getattr(l, 'scripts_generated_at', None)
-                        break
-                except Exception:
-                    continue
+        db_email, db_phone, db_ts = await run_read(_db_scripts_for_slug, slug)
     except Exception:
         pass
 
@@ -751,21 +1612,13 @@ async def get_assets_summary(slug: str):
         # Try to generate once
         try:
             await generate_assets_for_slug(slug)  # type: ignore
+            # read back what was just written from the primary
+            read_routing.note_write()
             meta = _read_json(target / "metadata.json")
 
             # after generation we re-check DB first, then files
             try:
-                with SessionLocal() as session:
-                    candidates = session.query(Lead).filter(Lead.company_name != None).all()
-                    for l in candidates:
-                        try:
-                            if filter_pipeline and filter_pipeline.slugify(l.company_name) == slug:
-                                db_email = (l.email_script or "") if hasattr(l, 'email_script') else ""
-                                db_phone = (l.phone_script or "") if hasattr(l, 'phone_script') else ""
-                                db_ts = getattr(l, 'scripts_generated_at', None)
-                                break
-                        except Exception:
-                            continue
+                db_email, db_phone, db_ts = await run_read(_db_scripts_for_slug, slug)
             except Exception:
                 pass
 
@@ -775,7 +1628,11 @@ async def get_assets_summary(slug: str):
             phone_script = db_phone or file_phone or phone_script
         except Exception:
             pass
+        # generation changed the state the ETag was computed from
+        etag = await _assets_state_etag(slug, target)
 
+    if etag is not None:
+        _set_etag(response, etag)
     return {
         "ok": bool(meta is not None or email_script or phone_script),
         "meta": meta,
@@ -793,22 +1650,22 @@ async def debug_filter_pipeline():
         "pipeline_present": bool(pipeline),
     }
     try:
-        if filter_pipeline is not None:
+        if filter_pipeline:
             info["filter_pipeline_default_output_dir"] = getattr(filter_pipeline, "DEFAULT_OUTPUT_DIR", None)
             info["filter_pipeline_default_template"] = getattr(filter_pipeline, "DEFAULT_TEMPLATE", None)
     except Exception:
         pass
     try:
         # Include a short probe of importability: attempt to access slugify if present
-        if filter_pipeline is not None and hasattr(filter_pipeline, "slugify"):
+        if filter_pipeline and hasattr(filter_pipeline, "slugify"):
             info["has_slugify"] = True
         else:
             info["has_slugify"] = False
     except Exception:
         info["has_slugify"] = False
     # Add captured import errors for debugging
-    info["pipeline_import_error"] = pipeline_import_error
-    info["filter_pipeline_import_error"] = filter_pipeline_import_error
+    info["pipeline_import_error"] = pipeline.import_error
+    info["filter_pipeline_import_error"] = filter_pipeline.import_error
     return info
 
 
@@ -831,20 +1688,8 @@ def _slugify_local(text: str) -> str:
     text = _re.sub(r"^-+|-+$", "", text)
     return (text or 'company').lower()
 
-_DEF_PLACEHOLDER_STYLES = (
-    lambda k: f"{{{{{k}}}}}",
-    lambda k: f"{{{k}}}",
-    lambda k: f"[{k}]",
-)
-
-def _register_placeholder(mapping: dict, key: str, value: str | None):
-    if value is None:
-        value = ''
-    for style in _DEF_PLACEHOLDER_STYLES:
-        mapping[style(key)] = value
-
-
 def _build_placeholder_mapping_for_lead(lead: Lead) -> dict:
+    """Placeholder values by name; each matches as {{Name}}, {Name} and [Name]."""
     mapping: dict[str, str] = {}
     company = lead.company_name or ''
     contact = getattr(lead, 'contact', '') or ''
@@ -902,32 +1747,24 @@ def _build_placeholder_mapping_for_lead(lead: Lead) -> dict:
         'Role': role_default,
     }
     for k, v in alias_values.items():
-        _register_placeholder(mapping, k, v)
+        mapping[k] = v or ''
     # Date convenience
     from datetime import datetime as _dt
     today = _dt.utcnow().strftime('%d.%m.%Y')
     for d in ('DATE', 'Date'):  # multiple styles
-        _register_placeholder(mapping, d, today)
+        mapping[d] = today
     return mapping
 
 
 def _render_template(raw: str, mapping: dict) -> str:
     if not raw:
         return ''
-    # simple multi-pass replace (order not critical due to distinct tokens)
-    for placeholder, value in mapping.items():
-        if placeholder in raw:
-            raw = raw.replace(placeholder, value)
-    # strip leftover unmatched tokens
-    import re as _re
-    raw = _re.sub(r"\{\{[^}]+\}\}|\{[^}]+\}|\[[^\]]+\]", "", raw)
-    return raw.strip()
+    # single pass over the compiled template; tokens resolve by name, unknown ones are stripped
+    return render_template(raw, lambda token, name: mapping.get(name)).strip()
 
 
 def _fetch_template(session, model, lang: str, fallback: str = 'en'):
-    obj = session.query(model).filter(model.language == lang).first()
-    if not obj and fallback and fallback != lang:
-        obj = session.query(model).filter(model.language == fallback).first()
-    return obj
+    # Served from the in-process template cache; see src/db/template_cache.py
+    return template_registry.get(session, model, lang, fallback)
 
 
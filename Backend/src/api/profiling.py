@@ -0,0 +1,176 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Optional
+
+# On-demand profiling of single API requests.
+#
+# Disabled unless PROFILING_TOKEN is set. A request opts in with
+#   X-Profile: sample | cprofile     (or ?__profile=sample|cprofile)
+# plus the token in the X-Profile-Token header (never in the URL, which ends
+# up in access and proxy logs).
+#
+# "sample" runs a wall-clock sampling profiler over all threads, so work the
+# request hands to the thread pool is included (as is anything else running
+# at the same time). It yields collapsed stacks ("a;b;c 12" per line), the
+# input format of flamegraph.pl / speedscope. "cprofile" runs the
+# deterministic profiler on the event-loop thread and yields a pstats report;
+# it sees every coroutine the loop runs meanwhile, and only one can run at a
+# time (a second request gets 409 instead of replacing the first profiler).
+# Artifacts are kept in memory (and under PROFILES_DIR when set) and are
+# retrievable by the id returned in the X-Profile-Id response header.
+
+PROFILE_MODES = ("sample", "cprofile")
+MAX_PROFILES = 50
+try:
+    SAMPLE_INTERVAL = float(os.getenv("PROFILING_SAMPLE_INTERVAL", "0.005"))
+except ValueError:
+    SAMPLE_INTERVAL = 0.005
+
+# leaf functions of threads that are parked, not working
+_IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+}
+
+
+def profiling_token() -> str:
+    return os.getenv("PROFILING_TOKEN", "").strip()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{Path(code.co_filename).name}:{code.co_name}"
+
+
+class SamplingProfiler:
+    """Samples the stacks of every other thread at a fixed interval."""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = max(0.001, interval)
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.is_set():
+            for t in threading.enumerate():
+                names[t.ident] = t.name
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                if (Path(frame.f_code.co_filename).name, frame.f_code.co_name) in _IDLE_LEAVES:
+                    continue
+                parts = []
+                f = frame
+                while f is not None:
+                    parts.append(_frame_label(f))
+                    f = f.f_back
+                parts.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(parts))] += 1
+            self.samples += 1
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> str:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class ProfilerBusy(Exception):
+    """The event-loop thread is already being profiled."""
+
+
+# cProfile has one active profiler per thread; requests share the loop thread
+_cprofile_lock = threading.Lock()
+
+
+class DeterministicProfiler:
+    def __init__(self):
+        self._profile = cProfile.Profile()
+
+    def start(self):
+        if not _cprofile_lock.acquire(blocking=False):
+            raise ProfilerBusy("a cprofile run is in progress")
+        try:
+            self._profile.enable()
+        except ValueError as e:
+            # Python 3.12+: another profiler is active on this thread
+            _cprofile_lock.release()
+            raise ProfilerBusy(str(e)) from e
+
+    def stop(self) -> str:
+        try:
+            self._profile.disable()
+        finally:
+            _cprofile_lock.release()
+        out = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=out)
+        stats.sort_stats("cumulative").print_stats(80)
+        return out.getvalue()
+
+
+def make_profiler(mode: str):
+    return DeterministicProfiler() if mode == "cprofile" else SamplingProfiler()
+
+
+class ProfileStore:
+    def __init__(self, max_profiles: int = MAX_PROFILES):
+        self.max_profiles = max_profiles
+        self._items: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def save(self, mode: str, method: str, path: str, duration: float, status: int, artifact: str) -> str:
+        pid = uuid.uuid4().hex
+        item = {
+            "id": pid,
+            "mode": mode,
+            "format": "pstats" if mode == "cprofile" else "collapsed",
+            "method": method,
+            "path": path,
+            "status": status,
+            "duration_ms": int(duration * 1000),
+            "created_at": time.time(),
+            "artifact": artifact,
+        }
+        with self._lock:
+            self._items[pid] = item
+            while len(self._items) > self.max_profiles:
+                self._items.popitem(last=False)
+        out_dir = os.getenv("PROFILES_DIR", "").strip()
+        if out_dir:
+            try:
+                Path(out_dir).mkdir(parents=True, exist_ok=True)
+                suffix = "pstats.txt" if mode == "cprofile" else "collapsed.txt"
+                (Path(out_dir) / f"{pid}.{suffix}").write_text(artifact, encoding="utf-8")
+            except Exception:
+                pass
+        return pid
+
+    def get(self, pid: str) -> Optional[dict]:
+        with self._lock:
+            return self._items.get(pid)
+
+    def list(self) -> list[dict]:
+        with self._lock:
+            return [{k: v for k, v in item.items() if k != "artifact"} for item in reversed(self._items.values())]
+
+
+profiles = ProfileStore()
@@ -0,0 +1,192 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Optional
+
+# Progress tracking for long generation runs (/leads/generate, /leads/generate-offers).
+# Runs execute in worker threads and append events; HTTP handlers read them as a
+# JSON snapshot or as a Server-Sent Events stream. Runs live in process memory,
+# so a stream must be opened against the worker that started the run.
+
+MAX_RUNS = 200
+MAX_EVENTS_PER_RUN = 5000
+_POLL_INTERVAL = 0.25
+
+
+class ProgressRun:
+    def __init__(self, run_id: str, kind: str):
+        self.id = run_id
+        self.kind = kind
+        self.status = "pending"  # pending -> running -> done | error
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.events: list[dict] = []
+        self.dropped_events = 0
+        self._lock = threading.Lock()
+
+    def emit(self, stage: str, **data) -> None:
+        """Record a progress event; safe to call from any thread."""
+        with self._lock:
+            if self.status == "pending":
+                self.status = "running"
+            if len(self.events) >= MAX_EVENTS_PER_RUN:
+                self.dropped_events += 1
+                return
+            self.events.append({
+                "seq": len(self.events),
+                "stage": stage,
+                "elapsed_ms": int((time.time() - self.started_at) * 1000),
+                **data,
+            })
+
+    def finish(self, result: Any = None, error: Optional[str] = None) -> None:
+        with self._lock:
+            self.result = result
+            self.error = error
+            self.status = "error" if error else "done"
+            self.finished_at = time.time()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "error")
+
+    def events_since(self, seq: int) -> list[dict]:
+        with self._lock:
+            return list(self.events[seq:])
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "run_id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "events": list(self.events),
+                "dropped_events": self.dropped_events,
+                "result": self.result,
+                "error": self.error,
+            }
+
+
+class RunIdInUse(Exception):
+    """A client-supplied run id belongs to a run that has not finished yet."""
+
+
+class RunRegistry:
+    def __init__(self, max_runs: int = MAX_RUNS):
+        self.max_runs = max_runs
+        self._runs: "OrderedDict[str, ProgressRun]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, kind: str, run_id: Optional[str] = None) -> ProgressRun:
+        """Register a new run; a supplied `run_id` may reuse the id of a finished run only (else RunIdInUse)."""
+        rid = (run_id or "").strip()[:64] or uuid.uuid4().hex
+        run = ProgressRun(rid, kind)
+        with self._lock:
+            existing = self._runs.get(rid)
+            if existing is not None and not existing.finished:
+                raise RunIdInUse(f"run {rid} is still {existing.status}")
+            self._runs[rid] = run
+            self._runs.move_to_end(rid)
+            # forget the oldest finished runs first
+            while len(self._runs) > self.max_runs:
+                victim = next((k for k, r in self._runs.items() if r.finished), None)
+                if victim is None:
+                    break
+                self._runs.pop(victim, None)
+        return run
+
+    def get(self, run_id: str) -> Optional[ProgressRun]:
+        with self._lock:
+            return self._runs.get(run_id)
+
+
+runs = RunRegistry()
+
+
+def _sse(event: str, data: dict, event_id: Optional[int] = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append("data: " + json.dumps(data, ensure_ascii=False, default=str))
+    return "\n".join(lines) + "\n\n"
+
+
+async def sse_stream(run: ProgressRun, last_event_id: Optional[int] = None,
+                     heartbeat_seconds: float = 15.0) -> AsyncIterator[str]:
+    """Replay events after `last_event_id`, follow the run and end with a `done` event."""
+    seq = 0 if last_event_id is None else last_event_id + 1
+    idle = 0.0
+    while True:
+        pending = run.events_since(seq)
+        for ev in pending:
+            yield _sse("progress", ev, ev["seq"])
+        seq += len(pending)
+        if run.finished and not run.events_since(seq):
+            snap = run.snapshot()
+            yield _sse("done", {"status": snap["status"], "result": snap["result"], "error": snap["error"]})
+            return
+        if pending:
+            idle = 0.0
+        elif idle >= heartbeat_seconds:
+            # comment line keeps proxies from closing an idle stream
+            yield ": keep-alive\n\n"
+            idle = 0.0
+        await asyncio.sleep(_POLL_INTERVAL)
+        idle += _POLL_INTERVAL
+
+
+class SingleFlight:
+    """Coalesces identical runs: one leader executes, concurrent callers attach to its run.
+
+    With `result_ttl` > 0 a successful run also answers identical requests for
+    that many seconds after it finished. Keys are compared in-process only.
+    """
+
+    def __init__(self, result_ttl: float = 0.0):
+        self.result_ttl = result_ttl
+        self._runs: dict = {}
+        self._lock = threading.Lock()
+
+    def _reusable(self, run: ProgressRun, now: float, use_cache: bool) -> Optional[str]:
+        if not run.finished:
+            return "attached"
+        if use_cache and self.result_ttl > 0 and run.status == "done" \
+                and run.finished_at is not None and now - run.finished_at < self.result_ttl:
+            return "cached"
+        return None
+
+    def peek(self, key, use_cache: bool = True) -> tuple[Optional[ProgressRun], Optional[str]]:
+        """The run an identical request would share right now, without starting one."""
+        with self._lock:
+            existing = self._runs.get(key)
+            how = self._reusable(existing, time.time(), use_cache) if existing is not None else None
+            return (existing, how) if how is not None else (None, None)
+
+    def join_or_start(self, key, start, use_cache: bool = True) -> tuple[ProgressRun, Optional[str]]:
+        """Return (run, None) for a new leader run or (run, "attached" | "cached") for a shared one."""
+        now = time.time()
+        with self._lock:
+            for k in [k for k, r in self._runs.items() if self._reusable(r, now, True) is None]:
+                self._runs.pop(k, None)
+            existing = self._runs.get(key)
+            if existing is not None:
+                how = self._reusable(existing, now, use_cache)
+                if how is not None:
+                    return existing, how
+            run = start()
+            self._runs[key] = run
+            return run, None
+
+
+async def wait_finished(run: ProgressRun, poll_interval: float = 0.1) -> ProgressRun:
+    while not run.finished:
+        await asyncio.sleep(poll_interval)
+    return run
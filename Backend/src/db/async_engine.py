@@ -0,0 +1,141 @@
+import logging
+import os
+import threading
+from typing import Callable, Optional
+
+from sqlalchemy.engine import make_url
+
+from .engine import (
+    DB_CONNECT_TIMEOUT,
+    DB_MAX_OVERFLOW,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_STATEMENT_TIMEOUT_MS,
+    get_engine,
+    get_read_engine,
+)
+from .read_routing import PRIMARY, REPLICA, read_target, session_for
+from .sqlite_tuning import apply_sqlite_profile
+
+# Optional async engine for read endpoints.
+#
+# DB_ASYNC=1 creates a second engine on the same database as `get_engine()`
+# (so it follows the SQLite fallback) with an async driver: asyncpg for
+# Postgres, aiosqlite for SQLite. Both are optional dependencies, as is
+# greenlet, which SQLAlchemy's asyncio layer needs. If any is missing the
+# async engine stays off and reads use SessionLocal as before.
+#
+# Endpoints call run_read(fn, ...), where fn(session, ...) is ordinary sync ORM
+# code. On the async engine it runs through AsyncSession.run_sync(): the
+# query code is shared, but each round trip awaits the driver on the event
+# loop instead of blocking it. run_read() also picks primary or replica (see
+# src/db/read_routing.py); each has its own async engine.
+
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+# read target -> async engine / reason it is unavailable
+_async_engines: dict = {}
+_async_errors: dict[str, str] = {}
+_async_lock = threading.Lock()
+
+
+def async_enabled() -> bool:
+    return os.getenv("DB_ASYNC", "").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def async_url(url):
+    """The URL of `url`'s database with the async driver of its dialect."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    driver = ASYNC_DRIVERS.get(backend)
+    if driver is None:
+        raise ValueError(f"no async driver for {backend}")
+    # asyncpg takes ssl in connect_args, not libpq's sslmode
+    query = {k: v for k, v in url.query.items() if k != "sslmode"}
+    return url.set(drivername=f"{backend}+{driver}", query=query)
+
+
+def _create_async_engine(sync_engine):
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = async_url(sync_engine.url)
+    kwargs = {}
+    if url.get_backend_name() == "postgresql":
+        # same settings as the sync pool (see _postgres_engine_kwargs)
+        connect_args = {"ssl": "require"}
+        if DB_CONNECT_TIMEOUT and DB_CONNECT_TIMEOUT > 0:
+            connect_args["timeout"] = DB_CONNECT_TIMEOUT
+        if DB_STATEMENT_TIMEOUT_MS:
+            connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+        kwargs = {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_recycle": DB_POOL_RECYCLE,
+            "connect_args": connect_args,
+        }
+    eng = create_async_engine(url, pool_pre_ping=True, **kwargs)
+    apply_sqlite_profile(eng.sync_engine)
+    try:
+        from ..metrics import instrument_engine
+        instrument_engine(eng.sync_engine)
+    except Exception as e:
+        logging.debug("DB metrics disabled for the async engine: %s", e)
+    return eng
+
+
+def get_async_engine(target: str = PRIMARY):
+    """The async engine for `target`, or None when DB_ASYNC is off or its driver is unavailable."""
+    eng = _async_engines.get(target)
+    if eng is not None or target in _async_errors or not async_enabled():
+        return eng
+    with _async_lock:
+        if target not in _async_engines and target not in _async_errors:
+            sync_engine = get_read_engine() if target == REPLICA else get_engine()
+            if sync_engine is None:
+                return None
+            try:
+                _async_engines[target] = _create_async_engine(sync_engine)
+            except Exception as e:
+                _async_errors[target] = str(e) or type(e).__name__
+                logging.warning("DB_ASYNC is set but the async engine is unavailable, using sync sessions: %s", e)
+    return _async_engines.get(target)
+
+
+async def run_read(fn: Callable, *args, **kwargs):
+    """Run `fn(session, *args, **kwargs)` on the routed database, on the async engine if enabled.
+
+    session.info["read_target"] says which database the session reads from.
+    """
+    target = read_target()
+    eng = get_async_engine(target)
+    if eng is None:
+        with session_for(target) as session:
+            return fn(session, *args, **kwargs)
+    from sqlalchemy.ext.asyncio import AsyncSession
+    async with AsyncSession(eng, info={"read_target": target}) as session:
+        return await session.run_sync(fn, *args, **kwargs)
+
+
+async def dispose_async_engine() -> None:
+    engines = list(_async_engines.values())
+    _async_engines.clear()
+    for eng in engines:
+        await eng.dispose()
+
+
+def async_engine_stats() -> dict:
+    """State of the async engines, for /debug/db. Does not create them."""
+    eng = _async_engines.get(PRIMARY)
+    stats = {"enabled": async_enabled(), "ready": eng is not None}
+    if eng is not None:
+        stats["driver"] = eng.url.drivername
+        pool = eng.sync_engine.pool
+        if hasattr(pool, "checkedout"):
+            stats["checked_out"] = pool.checkedout()
+    if REPLICA in _async_engines:
+        stats["replica_ready"] = True
+    if PRIMARY in _async_errors:
+        stats["error"] = _async_errors[PRIMARY]
+    return stats
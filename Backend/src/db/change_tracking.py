@@ -0,0 +1,194 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Optional
+from sqlalchemy import event, inspect, update
+from sqlalchemy.orm import Session
+
+from .models.lead import Lead, ChangeCounter
+
+# Change counters for the `leads` table. Any committed ORM write that touches
+# Lead (add/update/delete on flush, or bulk query.update()/delete()) bumps:
+#   - an in-process version, used to invalidate cached totals without
+#     re-running queries (each worker has its own, hence the short TTL), and
+#   - the persisted `change_counters` row, incremented inside the writing
+#     transaction so every worker sees the same value. ETags are built from it.
+
+_lock = threading.Lock()
+_leads_version = 0
+
+_SESSION_FLAG = "leads_changed"
+LEADS_COUNTER = "leads"
+
+# engine url -> the change_counters table exists (cached for good)
+_counter_ready: dict[str, bool] = {}
+# engine url -> time.monotonic() of the last check that did not find it; it is
+# looked up again after COUNTER_RECHECK_SECONDS, so a migration that creates
+# the table later is picked up without a restart
+_counter_missing: dict[str, float] = {}
+COUNTER_RECHECK_SECONDS = 5.0
+
+
+def leads_version() -> int:
+    return _leads_version
+
+
+def bump_leads_version() -> int:
+    global _leads_version
+    with _lock:
+        _leads_version += 1
+        return _leads_version
+
+
+def _touches_lead(objects) -> bool:
+    return any(isinstance(o, Lead) for o in objects)
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_flush(session, flush_context):
+    if _touches_lead(session.new) or _touches_lead(session.dirty) or _touches_lead(session.deleted):
+        session.info[_SESSION_FLAG] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_bulk(orm_execute_state):
+    # Query.delete()/update() and ORM-enabled update()/delete() bypass the flush
+    if not (orm_execute_state.is_delete or orm_execute_state.is_update or orm_execute_state.is_insert):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ is Lead:
+        orm_execute_state.session.info[_SESSION_FLAG] = True
+
+
+def mark_leads_changed(session) -> None:
+    """Flag a write the hooks above cannot see (raw DBAPI, e.g. COPY) so commit bumps the version."""
+    session.info[_SESSION_FLAG] = True
+
+
+def _counter_table_ready(bind) -> bool:
+    key = str(bind.url) if hasattr(bind, "url") else str(bind)
+    if _counter_ready.get(key):
+        return True
+    checked = _counter_missing.get(key)
+    now = time.monotonic()
+    if checked is not None and now - checked < COUNTER_RECHECK_SECONDS:
+        return False
+    try:
+        ready = inspect(bind).has_table(ChangeCounter.__tablename__)
+    except Exception:
+        ready = False
+    if ready:
+        _counter_ready[key] = True
+        _counter_missing.pop(key, None)
+    else:
+        _counter_missing[key] = now
+    return ready
+
+
+@event.listens_for(Session, "before_commit")
+def _persist_version(session):
+    changed = session.info.get(_SESSION_FLAG) or _touches_lead(session.new) \
+        or _touches_lead(session.dirty) or _touches_lead(session.deleted)
+    if not changed:
+        return
+    session.info[_SESSION_FLAG] = True
+    try:
+        bind = session.get_bind()
+    except Exception:
+        return
+    if not _counter_table_ready(bind):
+        return
+    # The row is seeded when the table is created, so this never inserts and
+    # concurrent writers only serialize on one short row update before commit.
+    session.execute(
+        update(ChangeCounter)
+        .where(ChangeCounter.name == LEADS_COUNTER)
+        .values(version=ChangeCounter.version + 1, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+
+@event.listens_for(ChangeCounter.__table__, "after_create")
+def _seed_counters(target, connection, **kw):
+    connection.execute(target.insert().values(name=LEADS_COUNTER, version=0, updated_at=datetime.utcnow()))
+    _counter_ready[str(connection.engine.url)] = True
+    _counter_missing.pop(str(connection.engine.url), None)
+
+
+@event.listens_for(ChangeCounter.__table__, "before_drop")
+def _forget_counters(target, connection, **kw):
+    _counter_ready.pop(str(connection.engine.url), None)
+
+
+def read_leads_version(session) -> Optional[int]:
+    """Committed leads version shared by all workers, or None if the counter table is missing."""
+    try:
+        if not _counter_table_ready(session.get_bind()):
+            return None
+        value = (
+            session.query(ChangeCounter.version)
+            .filter(ChangeCounter.name == LEADS_COUNTER)
+            .scalar()
+        )
+        return int(value) if value is not None else None
+    except Exception as e:
+        logging.debug("Could not read leads change counter: %s", e)
+        return None
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_on_commit(session):
+    if session.info.pop(_SESSION_FLAG, False):
+        bump_leads_version()
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_on_rollback(session):
+    session.info.pop(_SESSION_FLAG, None)
+
+
+class VersionedCache:
+    """Small keyed cache whose entries are valid for one leads_version() and a TTL."""
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 256):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: dict = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute: Callable[[], int]):
+        version = leads_version()
+        now = time.monotonic()
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None and hit[0] == version and now - hit[1] < self.ttl_seconds:
+                return hit[2]
+        value = compute()
+        with self._lock:
+            if len(self._entries) >= self.max_entries and key not in self._entries:
+                # drop the oldest entry; dicts preserve insertion order
+                self._entries.pop(next(iter(self._entries)), None)
+            self._entries[key] = (version, now, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+# Totals shown by GET /leads, keyed by normalized search term
+lead_totals_cache = VersionedCache(ttl_seconds=_env_float("LEADS_TOTAL_CACHE_TTL", 30.0))
+
+
+def cached_lead_total(q: Optional[str], compute: Callable[[], int], filters: tuple = ()) -> int:
+    key = ((q or "").strip().lower(),) + tuple(filters)
+    return lead_totals_cache.get_or_compute(key, compute)
@@ -1,9 +1,16 @@
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import threading
+import time
+from typing import Callable
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
 import logging
 import urllib.parse
 
+from .sqlite_tuning import apply_sqlite_profile, sqlite_stats
+
 DB_HOST = os.getenv("DB_HOST", "db")
 DB_PORT = os.getenv("DB_PORT", "5432")
 DB_NAME = os.getenv("DB_NAME", "website_service")
@@ -14,48 +21,307 @@ DATABASE_URL = os.getenv(
     "DATABASE_URL",
     f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 )
+# Optional read replica for read-only endpoints (see src/db/read_routing.py)
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL", "").strip()
+
+def _prepare_db_url(url: str) -> str:
+    """Ensure the URL uses psycopg2 driver and has sslmode for Postgres providers like Neon."""
+    if not url:
+        return url
+    u = url.strip()
+    # Normalize short postgres scheme to include psycopg2 driver
+    if u.startswith("postgres://"):
+        u = u.replace("postgres://", "postgresql+psycopg2://", 1)
+    elif u.startswith("postgresql://") and "+psycopg2" not in u:
+        u = u.replace("postgresql://", "postgresql+psycopg2://", 1)
+    # If Postgres URL has no sslmode, append sslmode=require (Neon requires SSL)
+    parsed = urllib.parse.urlparse(u)
+    if parsed.scheme and parsed.scheme.startswith("postgres") and "sslmode=" not in u:
+        if "?" in u:
+            u = u + "&sslmode=require"
+        else:
+            u = u + "?sslmode=require"
+    return u
+
+
+# The engine is resolved on first use rather than at import time, so importing
+# the API (e.g. for /healthz on a serverless cold start) never waits on the
+# database. `from src.db.engine import engine` still works and resolves it.
+_engine = None
+_engine_lock = threading.Lock()
+_init_callbacks: list[Callable] = []
+
+
+def _env_int(name: str, default):
+    raw = os.getenv(name, "").strip()
+    if not raw:
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        logging.warning("Ignoring invalid %s=%r", name, raw)
+        return default
+
+
+# Pool settings for the primary (Postgres) database. Each uvicorn worker has
+# its own pool, so the server-side connection budget is
+#   workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW).
+DB_POOL_SIZE = _env_int("DB_POOL_SIZE", 5)
+DB_MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", 10)
+DB_POOL_TIMEOUT = _env_int("DB_POOL_TIMEOUT", 30)  # seconds to wait for a free connection
+DB_POOL_RECYCLE = _env_int("DB_POOL_RECYCLE", 1800)  # seconds; -1 disables
+DB_CONNECT_TIMEOUT = _env_int("DB_CONNECT_TIMEOUT", 5)  # seconds per connection attempt
+DB_STATEMENT_TIMEOUT_MS = _env_int("DB_STATEMENT_TIMEOUT_MS", None)  # unset: server default
+DB_POOL_WARMUP = _env_int("DB_POOL_WARMUP", 0)  # connections to open at startup
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that counts checkouts which had to wait for a free connection."""
+
+    def __init__(self, *args, **kw):
+        super().__init__(*args, **kw)
+        self._stats_lock = threading.Lock()
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        # Same condition QueuePool uses to block: no idle connection and no overflow left
+        saturated = self._max_overflow > -1 and self._overflow >= self._max_overflow and self._pool.empty()
+        if not saturated:
+            return super()._do_get()
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            with self._stats_lock:
+                self.waits += 1
+                self.wait_seconds += time.perf_counter() - start
 
-# Try to use the configured database (usually Postgres). If it is not reachable
-# fall back to a lightweight local SQLite DB so the API can still start in
-# development environments where Postgres isn't running.
-engine = None
-try:
-    def _prepare_db_url(url: str) -> str:
-        """Ensure the URL uses psycopg2 driver and has sslmode for Postgres providers like Neon."""
-        if not url:
-            return url
-        u = url.strip()
-        # Normalize short postgres scheme to include psycopg2 driver
-        if u.startswith("postgres://"):
-            u = u.replace("postgres://", "postgresql+psycopg2://", 1)
-        elif u.startswith("postgresql://") and "+psycopg2" not in u:
-            u = u.replace("postgresql://", "postgresql+psycopg2://", 1)
-        # If Postgres URL has no sslmode, append sslmode=require (Neon requires SSL)
-        parsed = urllib.parse.urlparse(u)
-        if parsed.scheme and parsed.scheme.startswith("postgres") and "sslmode=" not in u:
-            if "?" in u:
-                u = u + "&sslmode=require"
-            else:
-                u = u + "?sslmode=require"
-        return u
-
-    final_url = _prepare_db_url(DATABASE_URL)
+
+def _postgres_engine_kwargs(url: str) -> dict:
     # For Postgres/Neon explicitly pass sslmode in connect_args to help some environments
-    connect_args = {}
-    if final_url and final_url.startswith("postgres"):
-        connect_args = {"sslmode": "require"}
-
-    engine = create_engine(final_url, pool_pre_ping=True, connect_args=connect_args)
-    # attempt a quick connection to validate reachability
-    with engine.connect() as conn:  # type: ignore
-        pass
-    logging.info("Connected to primary database")
-except Exception as e:
-    logging.warning("Could not connect to primary DATABASE_URL (%s). Falling back to SQLite. Error: %s", DATABASE_URL, e)
-    # On Vercel, writeable path is /tmp
-    default_sqlite = "sqlite:////tmp/dev.db" if os.getenv("VERCEL") else "sqlite:///./dev.db"
-    SQLITE_URL = os.getenv("SQLITE_URL", default_sqlite)
-    # For SQLite we pass connect_args to allow usage from multiple threads (if needed)
-    engine = create_engine(SQLITE_URL, connect_args={"check_same_thread": False})
-
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    connect_args = {"sslmode": "require"}
+    if DB_CONNECT_TIMEOUT and DB_CONNECT_TIMEOUT > 0:
+        # bounds the startup probe too, so an unreachable server can't hang the first request
+        connect_args["connect_timeout"] = DB_CONNECT_TIMEOUT
+    if DB_STATEMENT_TIMEOUT_MS:
+        connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "connect_args": connect_args,
+    }
+
+
+def _create_engine():
+    # Try to use the configured database (usually Postgres). If it is not reachable
+    # fall back to a lightweight local SQLite DB so the API can still start in
+    # development environments where Postgres isn't running.
+    # DB_FALLBACK_SQLITE=0 turns the fallback off, so production fails loudly instead.
+    try:
+        final_url = _prepare_db_url(DATABASE_URL)
+        kwargs = {}
+        if final_url and final_url.startswith("postgres"):
+            kwargs = _postgres_engine_kwargs(final_url)
+
+        eng = create_engine(final_url, pool_pre_ping=True, **kwargs)
+        apply_sqlite_profile(eng)
+        # attempt a quick connection to validate reachability
+        with eng.connect() as conn:  # type: ignore
+            pass
+        logging.info("Connected to primary database")
+    except Exception as e:
+        if os.getenv("DB_FALLBACK_SQLITE", "1").strip().lower() in {"0", "false", "no", "off"}:
+            raise
+        logging.warning("Could not connect to primary DATABASE_URL (%s). Falling back to SQLite. Error: %s", DATABASE_URL, e)
+        # On Vercel, writeable path is /tmp
+        default_sqlite = "sqlite:////tmp/dev.db" if os.getenv("VERCEL") else "sqlite:///./dev.db"
+        SQLITE_URL = os.getenv("SQLITE_URL", default_sqlite)
+        # For SQLite we pass connect_args to allow usage from multiple threads (if needed)
+        eng = create_engine(SQLITE_URL, connect_args={"check_same_thread": False})
+        # WAL, synchronous=NORMAL, busy_timeout, ... and the in-process write lock
+        apply_sqlite_profile(eng)
+        eng._fell_back_to_sqlite = True
+
+    _track_connects(eng)
+    # Statement timings for GET /metrics
+    try:
+        from ..metrics import instrument_engine
+        instrument_engine(eng)
+    except Exception as e:
+        logging.debug("DB metrics disabled: %s", e)
+    return eng
+
+
+def _track_connects(eng) -> None:
+    eng._pool_connects = 0
+
+    @event.listens_for(eng, "connect")
+    def _on_connect(dbapi_conn, conn_record):
+        eng._pool_connects += 1
+
+
+def get_engine():
+    """Return the process-wide engine, probing the database on the first call."""
+    global _engine
+    if _engine is not None:
+        return _engine
+    with _engine_lock:
+        if _engine is None:
+            eng = _create_engine()
+            for cb in list(_init_callbacks):
+                try:
+                    cb(eng)
+                except Exception as e:
+                    logging.warning("Engine init hook %r failed: %s", cb, e)
+            _engine = eng
+    return _engine
+
+
+def engine_ready() -> bool:
+    return _engine is not None
+
+
+def on_engine_ready(callback: Callable) -> None:
+    """Run `callback(engine)` once the engine exists (immediately if it already does)."""
+    if _engine is not None:
+        callback(_engine)
+    else:
+        _init_callbacks.append(callback)
+
+
+def __getattr__(name: str):
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class _LazyBindSession(Session):
+    def __init__(self, bind=None, **kw):
+        super().__init__(bind=bind if bind is not None else get_engine(), **kw)
+
+
+SessionLocal = sessionmaker(class_=_LazyBindSession, autocommit=False, autoflush=False)
+
+
+# The replica engine is resolved lazily like the primary one. If it cannot be
+# reached, reads stay on the primary and the connection is retried after
+# READ_REPLICA_RETRY_SECONDS.
+_read_engine = None
+_read_engine_failed_at: float | None = None
+READ_REPLICA_RETRY_SECONDS = _env_int("READ_REPLICA_RETRY_SECONDS", 30)
+
+
+def _create_read_engine():
+    url = _prepare_db_url(DATABASE_READ_URL)
+    kwargs = _postgres_engine_kwargs(url) if url.startswith("postgres") else {}
+    if url.startswith("sqlite"):
+        kwargs["connect_args"] = {"check_same_thread": False}
+    eng = create_engine(url, pool_pre_ping=True, **kwargs)
+    apply_sqlite_profile(eng)
+    try:
+        with eng.connect():
+            pass
+    except Exception:
+        eng.dispose()
+        raise
+    _track_connects(eng)
+    try:
+        from ..metrics import instrument_engine
+        instrument_engine(eng)
+    except Exception as e:
+        logging.debug("DB metrics disabled for the read replica: %s", e)
+    logging.info("Connected to read replica")
+    return eng
+
+
+def get_read_engine():
+    """The read replica engine, or None when DATABASE_READ_URL is unset or unreachable."""
+    global _read_engine, _read_engine_failed_at
+    if _read_engine is not None or not DATABASE_READ_URL:
+        return _read_engine
+    if _read_engine_failed_at is not None and time.monotonic() - _read_engine_failed_at < READ_REPLICA_RETRY_SECONDS:
+        return None
+    with _engine_lock:
+        if _read_engine is None:
+            try:
+                _read_engine = _create_read_engine()
+                _read_engine_failed_at = None
+            except Exception as e:
+                _read_engine_failed_at = time.monotonic()
+                logging.warning("Read replica DATABASE_READ_URL unavailable, reading from the primary: %s", e)
+    return _read_engine
+
+
+class _ReadBindSession(Session):
+    def __init__(self, bind=None, **kw):
+        super().__init__(bind=bind if bind is not None else (get_read_engine() or get_engine()), **kw)
+
+
+# Sessions on the replica (or the primary without one); for reads only
+ReadSessionLocal = sessionmaker(class_=_ReadBindSession, autocommit=False, autoflush=False)
+
+
+def warm_pool(connections: int | None = None) -> int:
+    """Open `connections` pooled connections at once and return them to the pool.
+
+    Meant to run in the background at startup so the first requests don't pay
+    for TCP/TLS setup. Returns how many connections were opened.
+    """
+    eng = get_engine()
+    n = DB_POOL_WARMUP if connections is None else connections
+    pool = eng.pool
+    if hasattr(pool, "size"):
+        n = min(n, pool.size())
+    held = []
+    try:
+        for _ in range(max(0, n)):
+            held.append(eng.connect())
+    except Exception as e:
+        logging.warning("Pool warmup stopped after %d connections: %s", len(held), e)
+    finally:
+        for conn in held:
+            conn.close()
+    return len(held)
+
+
+def pool_stats() -> dict:
+    """Usage of the connection pool, for /debug/db. Does not resolve the engine."""
+    if _engine is None:
+        return {"engine_ready": False}
+    pool = _engine.pool
+    stats = {
+        "engine_ready": True,
+        "pool_class": type(pool).__name__,
+        "fell_back_to_sqlite": bool(getattr(_engine, "_fell_back_to_sqlite", False)),
+        "connects": getattr(_engine, "_pool_connects", None),
+    }
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            # negative while the pool is not yet full, see QueuePool.overflow()
+            "overflow": pool.overflow(),
+            "max_overflow": pool._max_overflow,
+            "timeout": pool.timeout(),
+            "recycle": pool._recycle,
+        })
+    if isinstance(pool, InstrumentedQueuePool):
+        with pool._stats_lock:
+            stats.update({
+                "waits": pool.waits,
+                "wait_seconds_total": round(pool.wait_seconds, 6),
+                "timeouts": pool.timeouts,
+            })
+    if _engine.dialect.name == "sqlite":
+        stats["sqlite"] = sqlite_stats(_engine)
+    return stats
@@ -0,0 +1,252 @@
+import csv
+import io
+import logging
+from itertools import islice
+from typing import Callable, Iterable, Iterator, Optional
+
+from .change_tracking import mark_leads_changed
+from .repositories.lead_repository import LeadRepository, lead_columns, natural_key
+
+# Bulk import of lead files (CSV / XLSX) into `leads`.
+#
+# Rows are read lazily (csv.reader, openpyxl read-only mode) and loaded in
+# chunks, so memory use does not grow with the file. Headers are matched the
+# way the filter pipeline finds its columns (find_website_column,
+# guess_company_column), extended by the collector's German export headers.
+#
+# Loading:
+#   - Postgres: each chunk is COPYed into a temporary staging table, then one
+#     INSERT ... SELECT ... GROUP BY ... ON CONFLICT (dedupe_key) merges
+#     everything into `leads`.
+#   - otherwise: LeadRepository.upsert_many() per chunk.
+# Both upsert on the natural key, so importing a file twice adds no rows, and
+# merge duplicates field by field: the last non-empty value of each column
+# wins, and an empty one never overwrites a stored value.
+# The whole file is loaded in the session's transaction; the caller commits.
+
+IMPORT_CHUNK_SIZE = 5000
+
+# field -> header candidates, compared case-insensitively, in priority order
+HEADER_CANDIDATES = {
+    "company_name": ("company", "firma", "unternehmen", "name", "company name", "firmenname", "company_name"),
+    "website": ("website", "webseite", "url"),
+    "email": ("email", "e-mail", "e_mail", "mail"),
+    "phone": ("phone", "telefon", "telephone", "tel", "telefonnummer", "phone number"),
+    "city": ("city", "stadt", "ort"),
+    "industry": ("industry", "kategorie", "branche", "category"),
+    "contact": ("contact", "ansprechpartner", "kontakt", "contact person"),
+    "source_id": ("quelleid", "source_id", "source id"),
+}
+
+STAGE_TABLE = "leads_import_stage"
+STAGE_FIELDS = ("company_name", "website", "email", "phone", "city", "industry", "contact", "source_id")
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def map_headers(header: Iterable) -> dict[str, int]:
+    """Column index per lead field for a header row."""
+    names = [str(h).strip() if h is not None else "" for h in header]
+    lower = {}
+    for i, name in enumerate(names):
+        lower.setdefault(name.lower(), i)
+    mapping: dict[str, int] = {}
+    for field, candidates in HEADER_CANDIDATES.items():
+        for cand in candidates:
+            if cand in lower:
+                mapping[field] = lower[cand]
+                break
+    taken = set(mapping.values())
+    if "website" not in mapping:
+        # same heuristic as find_website_column
+        for i, name in enumerate(names):
+            if i not in taken and ("web" in name.lower() or "site" in name.lower()):
+                mapping["website"] = i
+                taken.add(i)
+                break
+    if "company_name" not in mapping:
+        # guess_company_column falls back to the first column
+        for i, name in enumerate(names):
+            if i not in taken and name:
+                mapping["company_name"] = i
+                break
+    return mapping
+
+
+def detect_format(content_type: Optional[str], filename: Optional[str], head: bytes) -> Optional[str]:
+    ctype = (content_type or "").split(";")[0].strip().lower()
+    name = (filename or "").lower()
+    if ctype == XLSX_MEDIA_TYPE or name.endswith((".xlsx", ".xlsm")) or head.startswith(b"PK\x03\x04"):
+        return "xlsx"
+    if ctype in ("text/csv", "application/csv", "text/plain") or name.endswith((".csv", ".txt")):
+        return "csv"
+    return None
+
+
+def iter_csv(fh) -> Iterator[list]:
+    """Rows of a binary CSV file; delimiter (, ; tab |) is sniffed from the start."""
+    text = io.TextIOWrapper(fh, encoding="utf-8-sig", errors="replace", newline="")
+    sample = text.read(64 * 1024)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel
+    text.seek(0)
+    try:
+        yield from csv.reader(text, dialect)
+    finally:
+        # leave the underlying file open for the caller
+        text.detach()
+
+
+def iter_xlsx(fh) -> Iterator[tuple]:
+    from openpyxl import load_workbook
+    wb = load_workbook(fh, read_only=True, data_only=True)
+    try:
+        yield from wb.active.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def _cell(row, index: Optional[int]):
+    if index is None or index >= len(row):
+        return None
+    value = row[index]
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        # spreadsheet numbers such as phone numbers or postcodes
+        value = int(value)
+    value = str(value).strip()
+    return value or None
+
+
+def iter_leads(rows: Iterator, mapping_out: Optional[dict] = None) -> Iterator[dict]:
+    """Lead dicts from raw rows; the first row is the header. Rows without a company name are skipped."""
+    header = next(rows, None)
+    if header is None:
+        return
+    mapping = map_headers(header)
+    if mapping_out is not None:
+        mapping_out.update({f: str(header[i]) for f, i in mapping.items()})
+    for row in rows:
+        lead = {field: _cell(row, i) for field, i in mapping.items()}
+        if lead.get("company_name"):
+            yield lead
+        elif any(v is not None for v in row):
+            yield {}
+
+
+def _chunks(items: Iterator, size: int) -> Iterator[list]:
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class LeadImporter:
+    def __init__(self, session, chunk_size: int = IMPORT_CHUNK_SIZE,
+                 progress: Optional[Callable[..., None]] = None):
+        self.session = session
+        self.chunk_size = max(1, chunk_size)
+        self.progress = progress or (lambda *a, **kw: None)
+        self.stats = {"rows": 0, "skipped": 0, "inserted": 0, "updated": 0, "batches": 0, "method": None}
+
+    def load(self, leads: Iterator[dict]) -> dict:
+        """Upsert `leads` in the session's transaction (the caller commits); returns the stats."""
+        bind = self.session.get_bind()
+        use_copy = bind.dialect.name == "postgresql" and "dedupe_key" in lead_columns(bind)
+        if use_copy:
+            try:
+                self._load_copy(leads)
+                return self.stats
+            except _CopyUnsupported:
+                logging.getLogger("uvicorn.error").info("COPY not available for this driver; importing with upserts")
+        self._load_upsert(leads)
+        return self.stats
+
+    def _valid(self, chunk: list[dict]) -> list[dict]:
+        valid = [lead for lead in chunk if lead]
+        self.stats["rows"] += len(chunk)
+        self.stats["skipped"] += len(chunk) - len(valid)
+        self.stats["batches"] += 1
+        return valid
+
+    def _load_upsert(self, leads: Iterator[dict]) -> None:
+        self.stats["method"] = "upsert"
+        repo = LeadRepository(self.session)
+        for chunk in _chunks(leads, self.chunk_size):
+            valid = self._valid(chunk)
+            if valid:
+                repo.upsert_many(valid)
+                self.stats["inserted"] += repo.inserted
+                self.stats["updated"] += repo.updated
+            self.progress("import_batch", batch=self.stats["batches"], rows=self.stats["rows"])
+
+    def _load_copy(self, leads: Iterator[dict]) -> None:
+        raw = self.session.connection().connection.dbapi_connection
+        cur = raw.cursor()
+        if not hasattr(cur, "copy_expert"):  # psycopg2 only
+            cur.close()
+            raise _CopyUnsupported()
+        self.stats["method"] = "copy"
+        columns = ("seq", "dedupe_key") + STAGE_FIELDS
+        try:
+            cur.execute(
+                f"CREATE TEMP TABLE {STAGE_TABLE} (seq bigint, dedupe_key varchar(255), "
+                + ", ".join(f"{c} varchar" for c in STAGE_FIELDS)
+                + ") ON COMMIT DROP"
+            )
+            copy_sql = f"COPY {STAGE_TABLE} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+            seq = 0
+            for chunk in _chunks(leads, self.chunk_size):
+                buf = io.StringIO()
+                writer = csv.writer(buf)
+                for lead in self._valid(chunk):
+                    seq += 1
+                    # unquoted empty fields are NULL in COPY csv
+                    writer.writerow([seq, natural_key(lead)] + [lead.get(c) for c in STAGE_FIELDS])
+                buf.seek(0)
+                cur.copy_expert(copy_sql, buf)
+                self.progress("import_batch", batch=self.stats["batches"], rows=self.stats["rows"])
+            self.progress("import_merge", rows=seq)
+            cur.execute(_merge_sql())
+            inserted, total = cur.fetchone()
+        finally:
+            cur.close()
+        self.stats["inserted"] = int(inserted or 0)
+        self.stats["updated"] = int(total or 0) - self.stats["inserted"]
+        mark_leads_changed(self.session)
+
+
+class _CopyUnsupported(Exception):
+    pass
+
+
+def _merge_sql() -> str:
+    cols = ", ".join(STAGE_FIELDS)
+    # per key, the last non-NULL value of each column, like LeadRepository._merge
+    latest = ", ".join(
+        f"(array_agg({c} ORDER BY seq DESC) FILTER (WHERE {c} IS NOT NULL))[1]" for c in STAGE_FIELDS
+    )
+    updates = ", ".join(f"{c} = COALESCE(EXCLUDED.{c}, leads.{c})" for c in STAGE_FIELDS)
+    # like LeadRepository._match_source_ids: a stored source_id, else the
+    # first key the file gives that source_id, else the natural key
+    key = (
+        "COALESCE((SELECT l.dedupe_key FROM leads l WHERE l.source_id = s.source_id"
+        " AND l.dedupe_key IS NOT NULL LIMIT 1),"
+        " CASE WHEN s.source_id IS NULL THEN s.dedupe_key"
+        " ELSE first_value(s.dedupe_key) OVER (PARTITION BY s.source_id ORDER BY s.seq) END)"
+    )
+    # xmax = 0 only for freshly inserted tuples, which tells inserts from updates
+    return (
+        "WITH merged AS ("
+        f" INSERT INTO leads (dedupe_key, {cols}, created_at)"
+        f" SELECT k, {latest}, (now() AT TIME ZONE 'utc')"
+        f" FROM (SELECT {key} AS k, s.* FROM {STAGE_TABLE} s WHERE s.dedupe_key IS NOT NULL) staged"
+        " GROUP BY k"
+        f" ON CONFLICT (dedupe_key) DO UPDATE SET {updates}"
+        " RETURNING (xmax = 0) AS inserted"
+        ") SELECT count(*) FILTER (WHERE inserted), count(*) FROM merged"
+    )
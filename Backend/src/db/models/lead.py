@@ -1,9 +1,42 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, UniqueConstraint
+from sqlalchemy import Column, Computed, Index, Integer, LargeBinary, String, DateTime, Boolean, Text, UniqueConstraint
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.sql.expression import ColumnElement
 from datetime import datetime
 
+from ..website_class import website_class_sql
+
 Base = declarative_base()
 
+
+class WebsiteClassExpr(ColumnElement):
+    """website_class_sql() of the `website` column, rendered for the compiling dialect."""
+
+    inherit_cache = True
+    type = String(1)
+
+
+@compiles(WebsiteClassExpr)
+def _compile_website_class(element, compiler, **kw):
+    # like text(): doubles the '%' of the LIKE patterns for pyformat drivers (psycopg2)
+    return compiler.post_process_text(f"({website_class_sql(dialect=compiler.dialect.name)})")
+
+
+def _script_property(kind: str):
+    # The text lives in `scripts`; the lead only holds its hash (see db/script_store.py)
+    attr = f"{kind}_script_hash"
+
+    def fget(self):
+        from ..script_store import script_text
+        return script_text(self, attr)
+
+    def fset(self, value):
+        from ..script_store import set_script
+        set_script(self, attr, value)
+
+    return property(fget, fset, doc=f"Rendered {kind} script, stored deduplicated by content hash.")
+
+
 class Lead(Base):
     __tablename__ = 'leads'
 
@@ -17,10 +50,27 @@ class Lead(Base):
     contact = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     interested = Column(Boolean, nullable=True)
-    # New: store generated outreach scripts directly in DB for serverless deployments
-    email_script = Column(Text, nullable=True)
-    phone_script = Column(Text, nullable=True)
+    # Generated outreach scripts, stored once per distinct text in `scripts`
+    email_script_hash = Column(String(64), nullable=True, index=True)
+    phone_script_hash = Column(String(64), nullable=True, index=True)
     scripts_generated_at = Column(DateTime, nullable=True)
+    # Natural key for upserts: hash of name/phone/city (see LeadRepository)
+    dedupe_key = Column(String(255), nullable=True, unique=True, index=True)
+    # Provider id (places:<place_id>, osm:<type>/<id>); a lead stored with it is
+    # matched by it first, so renames at the provider do not add rows
+    source_id = Column(String(255), nullable=True, index=True)
+    # 'N' / 'L' / 'Y' like classify_has_website; computed by the database (see db/website_class.py)
+    website_class = Column(String(1), Computed(WebsiteClassExpr(), persisted=True), nullable=True)
+
+    __table_args__ = (
+        # the website filter and per-city / per-industry lists, all paged by id
+        Index('ix_leads_website_class_id', 'website_class', 'id'),
+        Index('ix_leads_city_id', 'city', 'id'),
+        Index('ix_leads_industry_id', 'industry', 'id'),
+    )
+
+    email_script = _script_property("email")
+    phone_script = _script_property("phone")
 
     def __repr__(self):
         return (
@@ -55,3 +105,23 @@ class OfferSheetTemplate(Base):
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     __table_args__ = (UniqueConstraint('language', name='uq_offer_sheet_template_language'),)
+
+
+class Script(Base):
+    """A rendered outreach script, stored once per distinct text (see db/script_store.py)."""
+    __tablename__ = 'scripts'
+    hash = Column(String(64), primary_key=True)  # sha256 of the UTF-8 text
+    # 'plain', 'zlib', or 'zlib-dict' (deflated against the text of script `dict_hash`, its template)
+    encoding = Column(String(16), nullable=False)
+    content = Column(LargeBinary, nullable=False)
+    dict_hash = Column(String(64), nullable=True)
+    size = Column(Integer, nullable=False)  # bytes of the text before compression
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class ChangeCounter(Base):
+    """Per-table write counter, bumped in the same transaction as the write (see db/change_tracking.py)."""
+    __tablename__ = 'change_counters'
+    name = Column(String(64), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
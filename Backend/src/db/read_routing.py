@@ -0,0 +1,131 @@
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from . import engine as _engine_mod
+
+# Read-replica routing with read-your-writes.
+#
+# With DATABASE_READ_URL set, read-only endpoints (run_read() in
+# src/db/async_engine.py, the export) query the replica, except for a client
+# that wrote recently: a successful POST/PUT/PATCH/DELETE sets a cookie
+# holding "primary until <now + READ_YOUR_WRITES_SECONDS>", and while it is
+# valid that client's reads go to the primary. The cookie carries the
+# deadline itself, so it works across workers without shared state. Set the
+# window above the replica's usual lag.
+#
+# Routing is per request (a ContextVar set by the API middleware). Code
+# outside a request, such as background runs, always uses the primary.
+
+COOKIE_NAME = "lg_read_primary_until"
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+PRIMARY = "primary"
+REPLICA = "replica"
+
+
+def ryw_window() -> float:
+    try:
+        return max(0.0, float(os.getenv("READ_YOUR_WRITES_SECONDS", 5)))
+    except (TypeError, ValueError):
+        return 5.0
+
+
+def replica_configured() -> bool:
+    return bool(_engine_mod.DATABASE_READ_URL)
+
+
+class ReadRoute:
+    """Routing state of one request: until when it must read from the primary, and whether it wrote."""
+
+    __slots__ = ("primary_until", "wrote")
+
+    def __init__(self, primary_until: float = 0.0):
+        self.primary_until = primary_until
+        self.wrote = False
+
+    def use_primary(self) -> bool:
+        return time.time() < self.primary_until
+
+    def note_write(self, at: Optional[float] = None) -> None:
+        self.primary_until = max(self.primary_until, (at or time.time()) + ryw_window())
+        self.wrote = True
+
+
+_current: ContextVar[Optional[ReadRoute]] = ContextVar("read_route", default=None)
+
+_stats_lock = threading.Lock()
+_reads = {PRIMARY: 0, REPLICA: 0}
+
+
+def _parse_cookie(value: Optional[str]) -> float:
+    try:
+        return float(value) if value else 0.0
+    except ValueError:
+        return 0.0
+
+
+def begin_request(cookie_value: Optional[str] = None):
+    """Start routing for a request; returns the token for end_request()."""
+    return _current.set(ReadRoute(_parse_cookie(cookie_value)))
+
+
+def end_request(token) -> None:
+    _current.reset(token)
+
+
+def current() -> Optional[ReadRoute]:
+    return _current.get()
+
+
+def note_write(at: Optional[float] = None) -> None:
+    """Send this client's reads to the primary for the window after `at` (default: now)."""
+    route = _current.get()
+    if route is not None:
+        route.note_write(at)
+
+
+def read_target() -> str:
+    """REPLICA if this request may read from a reachable replica, else PRIMARY."""
+    route = _current.get()
+    target = PRIMARY
+    if route is not None and replica_configured() and not route.use_primary() \
+            and _engine_mod.get_read_engine() is not None:
+        target = REPLICA
+    with _stats_lock:
+        _reads[target] += 1
+    return target
+
+
+def session_for(target: str):
+    """A sync session for `target`, tagged with it in session.info["read_target"]."""
+    factory = _engine_mod.ReadSessionLocal if target == REPLICA else _engine_mod.SessionLocal
+    return factory(info={"read_target": target})
+
+
+def apply_cookie(response, route: Optional[ReadRoute], method: str) -> None:
+    """After a successful write, tell the client until when to read from the primary."""
+    if route is None or not replica_configured():
+        return
+    if method.upper() not in SAFE_METHODS and response.status_code < 400:
+        route.note_write()
+    if route.wrote and route.primary_until > time.time():
+        response.set_cookie(
+            COOKIE_NAME, f"{route.primary_until:.3f}",
+            max_age=max(1, int(route.primary_until - time.time() + 1)),
+            httponly=True, samesite="lax",
+        )
+
+
+def stats() -> dict:
+    """Replica state and routed read counts, for /debug/db."""
+    with _stats_lock:
+        reads = dict(_reads)
+    return {
+        "configured": replica_configured(),
+        "ready": _engine_mod._read_engine is not None,
+        "read_your_writes_seconds": ryw_window(),
+        "reads": reads,
+    }
@@ -1,34 +1,226 @@
-from typing import Iterable, List
+import hashlib
+import re
+import threading
+import unicodedata
+from datetime import datetime
+from typing import Iterable, List, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import inspect
+from sqlalchemy import func, insert, inspect, literal_column, select
 from ..models.lead import Lead
+from ..website_class import NEEDS_OFFER
+
+# Natural key of a lead, stored in `leads.dedupe_key` (unique): a hash of the
+# normalized company name, phone digits and city. A provider id (Google
+# place_id, OSM element) is stored in `source_id`: an incoming lead whose id is
+# already stored takes that row's key, otherwise it is matched by its natural
+# key. So leads stored before the collectors passed ids are found again, and
+# a lead renamed at the provider still updates its row.
+# upsert_many() writes batches with INSERT ... ON CONFLICT (dedupe_key) DO
+# UPDATE, so collecting the same leads again updates them instead of adding
+# duplicates. Updates only fill in values: a NULL from the new data never
+# overwrites a stored value, and columns the caller did not pass (interested,
+# scripts, created_at) keep what is stored.
+
+UPSERT_BATCH_SIZE = 1000
+# columns callers may set; the key, timestamps and generated columns are managed here
+WRITABLE_COLUMNS = frozenset(c.key for c in Lead.__table__.c if c.computed is None) \
+    - {"id", "dedupe_key", "created_at"}
+
+# engine url -> column names of the leads table
+_columns_cache: dict[str, frozenset] = {}
+_columns_lock = threading.Lock()
+
+
+def _normalize_text(value) -> str:
+    value = unicodedata.normalize("NFKC", str(value or "")).casefold()
+    return " ".join(re.sub(r"[^\w]+", " ", value).split())
+
+
+def natural_key(data: dict) -> Optional[str]:
+    name = _normalize_text(data.get("company_name"))
+    if not name:
+        return None
+    phone = re.sub(r"\D", "", str(data.get("phone") or ""))
+    city = _normalize_text(data.get("city"))
+    digest = hashlib.sha1(f"{name}|{phone}|{city}".encode("utf-8")).hexdigest()
+    return f"n:{digest}"
+
+
+def lead_columns(bind) -> frozenset:
+    """Column names of the `leads` table, reflected once per engine."""
+    key = str(bind.url) if hasattr(bind, "url") else str(bind)
+    cols = _columns_cache.get(key)
+    if cols is None:
+        try:
+            cols = frozenset(c["name"] for c in inspect(bind).get_columns("leads"))
+        except Exception:
+            return frozenset()
+        with _columns_lock:
+            _columns_cache[key] = cols
+    return cols
+
+
+def clear_column_cache() -> None:
+    with _columns_lock:
+        _columns_cache.clear()
+
+
+def no_website_filter(bind):
+    """Leads without an own website: no URL, or only a social / directory page.
+
+    Uses the indexed `website_class` column, or the same classification
+    inline on databases that have not been migrated yet.
+    """
+    return NEEDS_OFFER.sql(bind)
+
+
+def _merge(rows: Iterable[dict], cols: frozenset) -> list[dict]:
+    """Filter to known columns and collapse rows sharing a natural key.
+
+    Postgres rejects a statement that updates the same row twice, so
+    duplicates within the input are merged here (later non-empty values win).
+    """
+    writable = WRITABLE_COLUMNS & cols if cols else WRITABLE_COLUMNS
+    merged: dict = {}
+    keyless: list[dict] = []
+    for data in rows:
+        values = {k: (None if v == "" else v) for k, v in data.items() if k in writable}
+        values["company_name"] = data.get("company_name") or ""
+        key = natural_key(data)
+        if key is None:
+            keyless.append(values)
+            continue
+        if not cols or "dedupe_key" in cols:
+            values["dedupe_key"] = key
+        previous = merged.get(key)
+        if previous is None:
+            merged[key] = values
+        else:
+            previous.update({k: v for k, v in values.items() if v is not None})
+    return list(merged.values()) + keyless
+
+
+def _collapse(rows: list[dict]) -> list[dict]:
+    """Merge rows that ended up with the same dedupe_key (later non-empty values win)."""
+    merged: dict = {}
+    keyless: list[dict] = []
+    for values in rows:
+        key = values.get("dedupe_key")
+        if key is None:
+            keyless.append(values)
+            continue
+        previous = merged.get(key)
+        if previous is None:
+            merged[key] = values
+        else:
+            previous.update({k: v for k, v in values.items() if v is not None and k != "dedupe_key"})
+    return list(merged.values()) + keyless
+
+
+def _dialect_insert(dialect: str):
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        return sqlite_insert
+    return None
+
 
 class LeadRepository:
-    def __init__(self, session: Session):
+    def __init__(self, session: Session, batch_size: int = UPSERT_BATCH_SIZE):
         self.session = session
+        self.batch_size = max(1, batch_size)
+        self.inserted = 0
+        self.updated = 0
 
     def upsert_many(self, leads: Iterable[dict]) -> int:
-        count = 0
-        # Inspect DB columns for 'leads' table and only pass known keys to the model
-        try:
-            inspector = inspect(self.session.bind)
-            cols = {c['name'] for c in inspector.get_columns('leads')}
-        except Exception:
-            cols = set()
+        """Insert or update `leads` by natural key; returns the number of new rows.
+
+        Each batch is a single multi-row statement, so 10k leads take about
+        ten round trips. Counts of the last call are in `inserted` / `updated`.
+        Runs in the session's transaction; the caller commits.
+        """
+        bind = self.session.get_bind()
+        cols = lead_columns(bind)
+        rows = _merge(leads, cols)
+        self.inserted = self.updated = 0
+        if not rows:
+            return 0
+        if "source_id" in cols and "dedupe_key" in cols:
+            rows = self._match_source_ids(rows)
+        dialect_insert = _dialect_insert(bind.dialect.name)
+        if dialect_insert is None or "dedupe_key" not in cols:
+            # no ON CONFLICT support, or the natural-key migration has not run yet
+            self._insert_plain(rows)
+        else:
+            self._upsert(rows, dialect_insert)
+        return self.inserted
+
+    def _match_source_ids(self, rows: list[dict]) -> list[dict]:
+        """Give rows whose source_id is already stored (or repeated in `rows`) that row's dedupe_key."""
+        keys: dict[str, str] = {}
+        ids = list({r["source_id"] for r in rows if r.get("source_id") and r.get("dedupe_key")})
+        for start in range(0, len(ids), self.batch_size):
+            chunk = ids[start:start + self.batch_size]
+            keys.update(self.session.execute(
+                select(Lead.source_id, Lead.dedupe_key)
+                .where(Lead.source_id.in_(chunk), Lead.dedupe_key != None)  # noqa: E711
+            ).all())
+        for r in rows:
+            if r.get("source_id") and r.get("dedupe_key"):
+                r["dedupe_key"] = keys.setdefault(r["source_id"], r["dedupe_key"])
+        return _collapse(rows)
+
+    def _upsert(self, rows: list[dict], dialect_insert) -> None:
+        # statements target the mapped class so session hooks (change
+        # tracking, ETags) see them like any other ORM write
+        table = Lead.__table__
+        postgres = self.session.get_bind().dialect.name == "postgresql"
+        keyed = [r for r in rows if r.get("dedupe_key")]
+        for start in range(0, len(keyed), self.batch_size):
+            batch = keyed[start:start + self.batch_size]
+            now = datetime.utcnow()
+            names = sorted({k for r in batch for k in r})
+            values = [{**{k: r.get(k) for k in names}, "created_at": now} for r in batch]
+            stmt = dialect_insert(Lead).values(values)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.dedupe_key],
+                set_={
+                    c: func.coalesce(stmt.excluded[c], table.c[c])
+                    for c in names if c != "dedupe_key"
+                },
+            )
+            if postgres:
+                # xmax = 0 only for freshly inserted tuples (as in lead_import._merge_sql)
+                flags = self.session.execute(stmt.returning(literal_column("(xmax = 0)"))).scalars().all()
+                inserted = sum(1 for f in flags if f)
+            else:
+                # SQLite has no such marker: count the keys that already exist
+                existing = self.session.execute(
+                    select(func.count()).select_from(Lead).where(Lead.dedupe_key.in_([r["dedupe_key"] for r in batch]))
+                ).scalar() or 0
+                self.session.execute(stmt)
+                inserted = len(batch) - existing
+            self.inserted += inserted
+            self.updated += len(batch) - inserted
+        self._insert_plain([r for r in rows if not r.get("dedupe_key")])
 
-        for data in leads:
-            # Filter out any keys not present in the DB table to avoid insert errors
-            filtered = {k: v for k, v in data.items() if not cols or k in cols}
-            lead = Lead(**filtered)
-            self.session.add(lead)
-            count += 1
-        self.session.commit()
-        return count
+    def _insert_plain(self, rows: list[dict]) -> None:
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            names = sorted({k for r in batch for k in r})
+            now = datetime.utcnow()
+            self.session.execute(
+                insert(Lead),
+                [{**{k: r.get(k) for k in names}, "created_at": now} for r in batch],
+            )
+            self.inserted += len(batch)
 
     def list_to_contact(self) -> List[Lead]:
-        # Example: leads with no website or a facebook link
+        # Example: leads with no website or only a social media page
         return (
             self.session.query(Lead)
-            .filter((Lead.website == None) | (Lead.website.ilike('%facebook%')))  # noqa: E711
+            .filter(no_website_filter(self.session.get_bind()))
             .all()
         )
@@ -0,0 +1,292 @@
+import hashlib
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import delete, event, exists, inspect, insert, or_, select, text
+from sqlalchemy.orm import Session, aliased, object_session
+from sqlalchemy.orm.exc import DetachedInstanceError
+
+from .models.lead import Lead, Script
+from .sqlite_tuning import take_write_lock
+
+# Content-addressed storage for rendered outreach scripts.
+#
+# `scripts` holds each distinct text once, keyed by its sha256; leads only
+# reference it (email_script_hash / phone_script_hash), so listing queries no
+# longer read script payloads and identical scripts are stored once.
+#
+# A rendered script is mostly its template with a few fields substituted, so
+# when the template is known the text is deflated with the template as zlib
+# preset dictionary ('zlib-dict'; the template is stored as a script itself
+# and referenced by dict_hash). Then a stored script costs little more than
+# its substituted fields. Without a template, texts are deflated on their
+# own ('zlib') if that is smaller. SCRIPT_COMPRESSION=none stores plain text.
+#
+# Rows never change once written, so decoded texts can be cached in-process.
+#
+# There is no foreign key from leads to scripts, so pruning is serialized
+# against writers: a writer that finds a text already stored must not have it
+# pruned before its reference commits. store_texts() holds a shared lock from
+# its lookup until the transaction ends and prune_scripts() an exclusive one
+# (Postgres advisory locks; on SQLite this process's write lock, see
+# sqlite_tuning.py).
+
+PLAIN = "plain"
+ZLIB = "zlib"
+ZLIB_DICT = "zlib-dict"
+
+# zlib only uses the last 32 KiB of a preset dictionary
+_ZDICT_MAX = 32 * 1024
+_PENDING = "pending_scripts"
+_LOOKUP_BATCH = 500
+# pg_advisory_xact_lock key of the script store ("scripts" in ASCII)
+_STORE_LOCK_KEY = 0x73637269707473
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def compression_enabled() -> bool:
+    return os.getenv("SCRIPT_COMPRESSION", "zlib").strip().lower() not in {"none", "off", "0", "false", "no"}
+
+
+# texts shorter than this are stored as they are
+COMPRESS_MIN_BYTES = _env_int("SCRIPT_COMPRESS_MIN_BYTES", 64)
+
+
+def script_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _zdict(template: str) -> bytes:
+    return template.encode("utf-8")[-_ZDICT_MAX:]
+
+
+def encode_script(text: str, template: Optional[str] = None) -> tuple[str, bytes, Optional[str]]:
+    """(encoding, content, dict_hash) for storing `text`, optionally deflated against `template`."""
+    raw = text.encode("utf-8")
+    if not compression_enabled() or len(raw) < COMPRESS_MIN_BYTES:
+        return PLAIN, raw, None
+    best = (PLAIN, raw, None)
+    if template and template != text:
+        c = zlib.compressobj(9, zlib.DEFLATED, 15, 9, zlib.Z_DEFAULT_STRATEGY, zdict=_zdict(template))
+        data = c.compress(raw) + c.flush()
+        if len(data) < len(best[1]):
+            best = (ZLIB_DICT, data, script_hash(template))
+    data = zlib.compress(raw, 9)
+    if len(data) < len(best[1]):
+        best = (ZLIB, data, None)
+    return best
+
+
+def decode_script(encoding: str, content: bytes, template: Optional[str] = None) -> str:
+    if encoding == PLAIN:
+        return bytes(content).decode("utf-8")
+    if encoding == ZLIB:
+        return zlib.decompress(content).decode("utf-8")
+    if encoding == ZLIB_DICT:
+        if template is None:
+            raise ValueError("zlib-dict script without its template")
+        d = zlib.decompressobj(15, zdict=_zdict(template))
+        return (d.decompress(bytes(content)) + d.flush()).decode("utf-8")
+    raise ValueError(f"unknown script encoding {encoding!r}")
+
+
+class _TextCache:
+    """Small LRU of decoded texts by hash; mostly templates, which every read needs."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest: str) -> Optional[str]:
+        with self._lock:
+            text = self._entries.get(digest)
+            if text is not None:
+                self._entries.move_to_end(digest)
+            return text
+
+    def put(self, digest: str, text: str) -> None:
+        with self._lock:
+            self._entries[digest] = text
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+text_cache = _TextCache(_env_int("SCRIPT_CACHE_ENTRIES", 256))
+
+
+def _batches(items: list, size: int = _LOOKUP_BATCH):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def load_texts(session, hashes: Iterable[Optional[str]]) -> dict[str, str]:
+    """Texts for the given hashes (missing ones are left out), decoded and cached."""
+    out: dict[str, str] = {}
+    missing = []
+    for digest in {h for h in hashes if h}:
+        text = text_cache.get(digest)
+        if text is None:
+            missing.append(digest)
+        else:
+            out[digest] = text
+    rows = []
+    for chunk in _batches(missing):
+        rows.extend(session.execute(
+            select(Script.hash, Script.encoding, Script.content, Script.dict_hash).where(Script.hash.in_(chunk))
+        ).all())
+    templates = load_texts(session, [r.dict_hash for r in rows if r.dict_hash]) if rows else {}
+    for r in rows:
+        text = decode_script(r.encoding, r.content, templates.get(r.dict_hash) if r.dict_hash else None)
+        text_cache.put(r.hash, text)
+        out[r.hash] = text
+    return out
+
+
+def _insert_ignore(bind):
+    table = Script.__table__
+    if bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert(table).on_conflict_do_nothing(index_elements=["hash"])
+    if bind.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        return sqlite_insert(table).on_conflict_do_nothing(index_elements=["hash"])
+    return insert(table)
+
+
+def _lock_store(session, exclusive: bool) -> bool:
+    """Hold the script store lock until the session's transaction ends.
+
+    The exclusive (prune) lock is only tried on Postgres: a writer that stored
+    texts holds the shared lock, and waiting for another one there could
+    deadlock. Returns False if it is busy.
+    """
+    bind = session.get_bind()
+    if bind.dialect.name == "postgresql":
+        if exclusive:
+            return bool(session.execute(text("SELECT pg_try_advisory_xact_lock(:key)"),
+                                        {"key": _STORE_LOCK_KEY}).scalar())
+        session.execute(text("SELECT pg_advisory_xact_lock_shared(:key)"), {"key": _STORE_LOCK_KEY})
+        return True
+    take_write_lock(session)
+    return True
+
+
+def store_texts(session, texts: dict[str, str], template: Optional[str] = None) -> int:
+    """Insert the texts (hash -> text) not stored yet, deflated against `template`; returns rows inserted.
+
+    Runs in the session's transaction, so the rows commit with the leads that reference them.
+    """
+    if not texts:
+        return 0
+    _lock_store(session, exclusive=False)
+    existing = set()
+    for chunk in _batches(list(texts)):
+        existing.update(session.execute(select(Script.hash).where(Script.hash.in_(chunk))).scalars())
+    now = datetime.utcnow()
+    rows = []
+    for digest, text in texts.items():
+        if digest in existing:
+            continue
+        encoding, content, dict_hash = encode_script(text, template)
+        rows.append({"hash": digest, "encoding": encoding, "content": content, "dict_hash": dict_hash,
+                     "size": len(text.encode("utf-8")), "created_at": now})
+    if any(r["dict_hash"] for r in rows):
+        template_hash = script_hash(template)
+        if template_hash not in existing and template_hash not in texts and \
+                session.execute(select(Script.hash).where(Script.hash == template_hash)).first() is None:
+            # the template itself is deflated on its own, never against another script
+            encoding, content, _ = encode_script(template)
+            rows.append({"hash": template_hash, "encoding": encoding, "content": content, "dict_hash": None,
+                         "size": len(template.encode("utf-8")), "created_at": now})
+    if rows:
+        session.execute(_insert_ignore(session.get_bind()), rows)
+    return len(rows)
+
+
+def set_script(lead: Lead, attr: str, text: Optional[str], template: Optional[str] = None) -> None:
+    """Point `lead.<attr>` at `text`; the text is stored on the next flush."""
+    if not text:
+        setattr(lead, attr, None)
+        return
+    digest = script_hash(text)
+    inspect(lead).info.setdefault(_PENDING, {})[digest] = (text, template)
+    setattr(lead, attr, digest)
+
+
+def script_text(lead: Lead, attr: str) -> Optional[str]:
+    digest = getattr(lead, attr)
+    if not digest:
+        return None
+    pending = inspect(lead).info.get(_PENDING)
+    if pending and digest in pending:
+        return pending[digest][0]
+    text = text_cache.get(digest)
+    if text is not None:
+        return text
+    session = object_session(lead)
+    if session is None:
+        raise DetachedInstanceError(f"{lead!r} is not bound to a Session; cannot load {attr}")
+    return load_texts(session, [digest]).get(digest)
+
+
+@event.listens_for(Session, "before_flush")
+def _store_pending(session, flush_context, instances):
+    by_template: dict = {}
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Lead):
+            continue
+        pending = inspect(obj).info.pop(_PENDING, None)
+        for digest, (text, template) in (pending or {}).items():
+            by_template.setdefault(template, {})[digest] = text
+    for template, texts in by_template.items():
+        store_texts(session, texts, template)
+
+
+def prune_scripts(session, candidates: Optional[Iterable[Optional[str]]] = None) -> int:
+    """Delete scripts no lead references (templates are kept while a referenced script uses them).
+
+    With `candidates` (e.g. the hashes leads were just re-pointed from) only
+    those scripts and their templates are checked; otherwise the whole table.
+    Runs in the session's transaction, after flushing pending changes. While
+    another transaction is storing texts nothing is pruned (returns 0); the
+    next prune collects what is left.
+    """
+    other = aliased(Script)
+    used_by_lead = exists().where(or_(Lead.email_script_hash == Script.hash, Lead.phone_script_hash == Script.hash))
+    used_as_dict = exists().where(
+        other.dict_hash == Script.hash,
+        exists().where(or_(Lead.email_script_hash == other.hash, Lead.phone_script_hash == other.hash)),
+    )
+    stmt = delete(Script).where(~used_by_lead, ~used_as_dict).execution_options(synchronize_session=False)
+    session.flush()
+    hashes = None if candidates is None else {h for h in candidates if h}
+    if hashes is not None and not hashes:
+        return 0
+    if not _lock_store(session, exclusive=True):
+        return 0
+    if hashes is None:
+        return session.execute(stmt).rowcount or 0
+    for chunk in _batches(list(hashes)):
+        hashes.update(session.execute(
+            select(Script.dict_hash).where(Script.hash.in_(chunk), Script.dict_hash != None)  # noqa: E711
+        ).scalars())
+    removed = 0
+    for chunk in _batches(list(hashes)):
+        removed += session.execute(stmt.where(Script.hash.in_(chunk))).rowcount or 0
+    return removed
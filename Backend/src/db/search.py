@@ -0,0 +1,164 @@
+import logging
+from typing import Optional, Tuple
+from sqlalchemy import event, text, func, literal_column, or_, column, table
+from sqlalchemy.orm import Query
+
+from .models.lead import Lead
+
+# Indexed text search for the `q` filter of GET /leads.
+#
+# Postgres: a pg_trgm GIN index over one concatenated "search document"
+#   expression, so `document ILIKE '%term%'` is answered from the index and
+#   word_similarity() provides ranking. Postgres maintains it on every write.
+# SQLite:   an FTS5 shadow table (`leads_fts`, trigram tokenizer) backed by the
+#   leads table as external content and kept in sync by triggers.
+#
+# Both backends match case-insensitive substrings like the previous ILIKE
+# filter. Terms shorter than three characters cannot use trigrams and fall
+# back to the plain ILIKE predicates.
+
+SEARCH_COLUMNS = ("company_name", "city", "industry", "email", "phone")
+MIN_INDEXED_TERM = 3
+
+# Must stay byte-identical to the expression in the Postgres index definition
+SEARCH_DOCUMENT_SQL = "(" + " || ' ' || ".join(f"coalesce({c}, '')" for c in SEARCH_COLUMNS) + ")"
+
+PG_INDEX_NAME = "ix_leads_search_trgm"
+FTS_TABLE = "leads_fts"
+
+_cols = ", ".join(SEARCH_COLUMNS)
+_new_cols = ", ".join(f"new.{c}" for c in SEARCH_COLUMNS)
+_old_cols = ", ".join(f"old.{c}" for c in SEARCH_COLUMNS)
+
+SQLITE_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"{_cols}, content='leads', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON leads BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, {_cols}) VALUES (new.id, {_new_cols}); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON leads BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_cols}) VALUES ('delete', old.id, {_old_cols}); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF {_cols} ON leads BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_cols}) VALUES ('delete', old.id, {_old_cols}); "
+    f"INSERT INTO {FTS_TABLE}(rowid, {_cols}) VALUES (new.id, {_new_cols}); END",
+)
+
+POSTGRES_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX IF NOT EXISTS {PG_INDEX_NAME} ON leads USING gin ({SEARCH_DOCUMENT_SQL} gin_trgm_ops)",
+)
+
+# engine url -> backend name ("fts5", "trgm") or None when only ILIKE is available
+_backends: dict[str, Optional[str]] = {}
+
+
+def _create_sqlite_objects(conn) -> None:
+    exists = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :n"), {"n": FTS_TABLE}
+    ).first()
+    for stmt in SQLITE_DDL:
+        conn.exec_driver_sql(stmt)
+    if not exists:
+        # index rows that were present before the shadow table existed
+        conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def ensure_search_index(engine) -> Optional[str]:
+    """Create the search index for this engine if missing and return the active backend."""
+    if engine is None:
+        return None
+    key = str(engine.url)
+    dialect = engine.dialect.name
+    backend: Optional[str] = None
+    try:
+        with engine.begin() as conn:
+            if dialect == "sqlite":
+                _create_sqlite_objects(conn)
+                backend = "fts5"
+            elif dialect == "postgresql":
+                for stmt in POSTGRES_DDL:
+                    conn.exec_driver_sql(stmt)
+                backend = "trgm"
+    except Exception as e:
+        # a read-only replica cannot run the DDL but may have the index already
+        backend = _existing_backend(engine)
+        if backend is None:
+            logging.warning("Search index unavailable on %s, falling back to ILIKE: %s", dialect, e)
+    _backends[key] = backend
+    return backend
+
+
+def _existing_backend(engine) -> Optional[str]:
+    """The backend whose index exists on this engine's database, without creating anything."""
+    try:
+        with engine.connect() as conn:
+            if engine.dialect.name == "sqlite":
+                found = conn.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :n"), {"n": FTS_TABLE}
+                ).first()
+                return "fts5" if found else None
+            if engine.dialect.name == "postgresql":
+                found = conn.execute(
+                    text("SELECT 1 FROM pg_indexes WHERE indexname = :n"), {"n": PG_INDEX_NAME}
+                ).first()
+                return "trgm" if found else None
+    except Exception as e:
+        logging.debug("Could not look up the search index: %s", e)
+    return None
+
+
+def search_backend(engine) -> Optional[str]:
+    """Search backend of `engine`'s database; pass the bind of the session running the query."""
+    if engine is None:
+        return None
+    key = str(engine.url)
+    if key not in _backends:
+        return ensure_search_index(engine)
+    return _backends[key]
+
+
+@event.listens_for(Lead.__table__, "after_create")
+def _after_leads_create(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        try:
+            _create_sqlite_objects(connection)
+        except Exception as e:
+            logging.warning("Could not create %s: %s", FTS_TABLE, e)
+
+
+@event.listens_for(Lead.__table__, "before_drop")
+def _before_leads_drop(target, connection, **kw):
+    # the shadow table is not part of the metadata; drop it together with leads
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+        _backends.pop(str(connection.engine.url), None)
+
+
+def _ilike_filter(q: str):
+    term = f"%{q}%"
+    return or_(*(getattr(Lead, c).ilike(term) for c in SEARCH_COLUMNS))
+
+
+def _fts_phrase(q: str) -> str:
+    return '"' + q.replace('"', '""') + '"'
+
+
+def apply_search(query: Query, q: str, engine) -> Tuple[Query, Optional[object]]:
+    """Restrict `query` to leads matching `q`.
+
+    Returns the filtered query and a rank expression (higher is better), or
+    None when the active backend cannot rank this term.
+    """
+    term = (q or "").strip()
+    backend = search_backend(engine)
+    if len(term) < MIN_INDEXED_TERM or backend is None:
+        return query.filter(_ilike_filter(term)), None
+    if backend == "fts5":
+        fts = table(FTS_TABLE, column("rowid"), column("rank"))
+        query = query.join(fts, fts.c.rowid == Lead.id).filter(
+            text(f"{FTS_TABLE} MATCH :fts_q").bindparams(fts_q=_fts_phrase(term))
+        )
+        # FTS5 rank is bm25(), where lower means more relevant
+        return query, -fts.c.rank
+    document = literal_column(SEARCH_DOCUMENT_SQL)
+    query = query.filter(document.ilike(f"%{term}%"))
+    return query, func.word_similarity(term, document)
@@ -0,0 +1,181 @@
+import logging
+import os
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# SQLite profile for the fallback / serverless database.
+#
+# SQLITE_PROFILE=tuned (default) sets on every new connection:
+#   journal_mode=WAL      readers and the writer no longer block each other
+#   synchronous=NORMAL    fsync on checkpoints instead of every commit (safe with WAL)
+#   busy_timeout          wait for another process's lock instead of failing
+#   cache_size, mmap_size larger page cache, memory-mapped reads
+#   temp_store=MEMORY     sorts and temp indexes stay off disk
+# Each can be overridden with SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS,
+# SQLITE_BUSY_TIMEOUT_MS, SQLITE_CACHE_SIZE_KB and SQLITE_MMAP_SIZE_MB.
+# SQLITE_PROFILE=default leaves SQLite's own defaults alone.
+#
+# Write serialization: SQLite allows one writer at a time. Instead of letting
+# API requests and background jobs spin in SQLite's busy handler, sessions
+# of this process take a write lock when they start writing (first flush or
+# DML statement) and release it when their transaction ends. Writers queue
+# in the process; readers never take the lock. Other processes are still
+# covered by busy_timeout.
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def sqlite_profile() -> str:
+    return os.getenv("SQLITE_PROFILE", "tuned").strip().lower() or "tuned"
+
+
+def tuned_pragmas(in_memory: bool = False) -> dict:
+    pragmas = {
+        "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+        "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+        "busy_timeout": _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000),
+        # negative cache_size is in KiB
+        "cache_size": -abs(_env_int("SQLITE_CACHE_SIZE_KB", 64 * 1024)),
+        "mmap_size": _env_int("SQLITE_MMAP_SIZE_MB", 256) * 1024 * 1024,
+        "temp_store": "MEMORY",
+    }
+    if in_memory:
+        # neither applies to an in-memory database
+        pragmas.pop("journal_mode")
+        pragmas.pop("mmap_size")
+    return pragmas
+
+
+class WriteLock:
+    """Process-wide writer lock for one SQLite database, with wait statistics."""
+
+    def __init__(self, timeout: float):
+        # re-entrant: a thread may nest sessions that both write
+        self._lock = threading.RLock()
+        self.timeout = timeout
+        self._stats_lock = threading.Lock()
+        self.acquired = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+
+    def acquire(self) -> bool:
+        if self._lock.acquire(blocking=False):
+            with self._stats_lock:
+                self.acquired += 1
+            return True
+        start = time.perf_counter()
+        # on timeout, go ahead and leave it to SQLite's busy handler
+        ok = self._lock.acquire(timeout=self.timeout) if self.timeout > 0 else self._lock.acquire()
+        with self._stats_lock:
+            self.waits += 1
+            self.wait_seconds += time.perf_counter() - start
+            if ok:
+                self.acquired += 1
+            else:
+                self.timeouts += 1
+        return ok
+
+    def release(self) -> None:
+        try:
+            self._lock.release()
+        except RuntimeError:
+            # released from another thread than the one that took it
+            logging.debug("SQLite write lock released by a foreign thread")
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "acquired": self.acquired,
+                "waits": self.waits,
+                "wait_seconds_total": round(self.wait_seconds, 6),
+                "timeouts": self.timeouts,
+            }
+
+
+def apply_sqlite_profile(engine, profile: str | None = None) -> None:
+    """Install the connection pragmas and the write lock on a SQLite engine."""
+    if engine is None or engine.dialect.name != "sqlite":
+        return
+    profile = profile or sqlite_profile()
+    engine._sqlite_profile = profile
+    if profile == "default":
+        return
+    database = engine.url.database
+    in_memory = not database or database == ":memory:" or "mode=memory" in str(engine.url)
+    pragmas = tuned_pragmas(in_memory)
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_conn, conn_record):
+        cur = dbapi_conn.cursor()
+        try:
+            for name, value in pragmas.items():
+                cur.execute(f"PRAGMA {name}={value}")
+        finally:
+            cur.close()
+
+    engine._sqlite_pragmas = pragmas
+    engine._sqlite_write_lock = WriteLock(timeout=pragmas["busy_timeout"] / 1000.0)
+
+
+def sqlite_stats(engine) -> dict | None:
+    """Profile, effective pragmas and write lock counters, for /debug/db."""
+    if engine is None or engine.dialect.name != "sqlite":
+        return None
+    info = {"profile": getattr(engine, "_sqlite_profile", "default")}
+    try:
+        with engine.connect() as conn:
+            for name in ("journal_mode", "synchronous", "busy_timeout", "cache_size", "mmap_size"):
+                info[name] = conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+    except Exception as e:
+        info["error"] = str(e)
+    lock = getattr(engine, "_sqlite_write_lock", None)
+    if lock is not None:
+        info["write_lock"] = lock.stats()
+    return info
+
+
+_HOLDS_LOCK = "sqlite_write_lock"
+
+
+def _write_lock_for(session):
+    return getattr(session.bind, "_sqlite_write_lock", None)
+
+
+def take_write_lock(session) -> None:
+    """Take this process's write lock for `session` until its transaction ends (no-op without one).
+
+    Writers take it on their first flush or DML statement; call this to hold
+    it from an earlier read on, when the write depends on what was read.
+    """
+    if _HOLDS_LOCK in session.info:
+        return
+    lock = _write_lock_for(session)
+    if lock is not None and lock.acquire():
+        session.info[_HOLDS_LOCK] = lock
+
+
+@event.listens_for(Session, "before_flush")
+def _lock_before_flush(session, flush_context, instances):
+    take_write_lock(session)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _lock_before_dml(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        take_write_lock(orm_execute_state.session)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _unlock(session, transaction):
+    if transaction.parent is None:
+        lock = session.info.pop(_HOLDS_LOCK, None)
+        if lock is not None:
+            lock.release()
@@ -0,0 +1,145 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import NamedTuple, Optional
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from .models.lead import ColdEmailTemplate, ColdPhoneCallTemplate, OfferSheetTemplate
+
+# In-process cache of the DB templates (cold email / phone call / offer sheet).
+#
+# All languages of a template table are loaded with one query and kept until
+# the table changes. Changes are detected two ways:
+#   - commits through this process's sessions that touch a template row
+#     invalidate immediately, and
+#   - at most every TEMPLATE_CACHE_CHECK_SECONDS one cheap query compares
+#     count(*) and max(updated_at) per table, which catches edits made by
+#     other workers or directly in the database.
+# Between checks, lookups do no database I/O at all.
+
+TEMPLATE_MODELS = (ColdEmailTemplate, ColdPhoneCallTemplate, OfferSheetTemplate)
+
+_SESSION_FLAG = "templates_changed"
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class CachedTemplate(NamedTuple):
+    id: int
+    language: str
+    content: str
+    updated_at: Optional[datetime]
+
+    @property
+    def version(self) -> tuple:
+        """Changes whenever the row is edited; used as a key for derived caches."""
+        return (self.id, self.updated_at, len(self.content))
+
+
+class _TableState:
+    def __init__(self):
+        self.signature = None
+        self.checked_at = 0.0
+        self.by_language: dict[str, CachedTemplate] = {}
+        self.loaded = False
+
+
+class TemplateRegistry:
+    def __init__(self, check_interval: float):
+        self.check_interval = check_interval
+        self._tables: dict[type, _TableState] = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def _signature(self, session, model):
+        row = session.query(func.count(model.id), func.max(model.updated_at)).one()
+        return (int(row[0] or 0), row[1])
+
+    def _load(self, session, model, state: _TableState, signature) -> None:
+        by_language: dict[str, CachedTemplate] = {}
+        # first row per language wins, like the previous .first() lookups
+        for obj in session.query(model).order_by(model.id).all():
+            lang = (obj.language or "").strip().lower()
+            if lang and lang not in by_language:
+                by_language[lang] = CachedTemplate(obj.id, lang, obj.content or "", obj.updated_at)
+        state.by_language = by_language
+        state.signature = signature
+        state.loaded = True
+        self.loads += 1
+
+    def _state(self, session, model) -> _TableState:
+        now = time.monotonic()
+        with self._lock:
+            state = self._tables.setdefault(model, _TableState())
+            if state.loaded and now - state.checked_at < self.check_interval:
+                return state
+            try:
+                signature = self._signature(session, model)
+                if not state.loaded or signature != state.signature:
+                    self._load(session, model, state, signature)
+                state.checked_at = now
+            except Exception as e:
+                # keep serving the last good copy if the check fails
+                logging.debug("Template cache refresh failed for %s: %s", model.__tablename__, e)
+            return state
+
+    def get(self, session, model, lang: str, fallback: str = "en") -> Optional[CachedTemplate]:
+        """Template for `lang`, else for `fallback`, else None."""
+        state = self._state(session, model)
+        lang = (lang or "").strip().lower()
+        obj = state.by_language.get(lang)
+        if obj is None and fallback and fallback != lang:
+            obj = state.by_language.get(fallback)
+        return obj
+
+    def languages(self, session, model) -> list[str]:
+        return sorted(self._state(session, model).by_language)
+
+    def invalidate(self, model=None) -> None:
+        with self._lock:
+            if model is None:
+                self._tables.clear()
+            else:
+                self._tables.pop(model, None)
+
+
+template_registry = TemplateRegistry(check_interval=_env_float("TEMPLATE_CACHE_CHECK_SECONDS", 5.0))
+
+
+def _touched_models(objects) -> set:
+    return {type(o) for o in objects if isinstance(o, TEMPLATE_MODELS)}
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_flush(session, flush_context):
+    touched = _touched_models(session.new) | _touched_models(session.dirty) | _touched_models(session.deleted)
+    if touched:
+        session.info.setdefault(_SESSION_FLAG, set()).update(touched)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_bulk(orm_execute_state):
+    if not (orm_execute_state.is_delete or orm_execute_state.is_update or orm_execute_state.is_insert):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ in TEMPLATE_MODELS:
+        orm_execute_state.session.info.setdefault(_SESSION_FLAG, set()).add(mapper.class_)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    for model in session.info.pop(_SESSION_FLAG, ()):
+        template_registry.invalidate(model)
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_on_rollback(session):
+    session.info.pop(_SESSION_FLAG, None)
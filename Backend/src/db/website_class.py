@@ -0,0 +1,102 @@
+# Website class of a lead as a SQL expression, for the generated column
+# `leads.website_class`:
+#   'N'  no website, or only a social / directory page (facebook.com, ...)
+#   'L'  a free builder site (wixsite.com, ...)
+#   'Y'  an own website
+# Mirrors classify_has_website() in pipelines/lead_auto_pipeline_de.py, which
+# takes SOCIAL_DOMAINS / LIGHT_SITE_DOMAINS from here. This module is plain
+# Python, so the pipeline scripts can load it without the package.
+# Domains are matched on the host part of the URL (a domain or any subdomain
+# of it), which is what the tldextract-based check does for ordinary URLs.
+# Existing databases keep the expression they were migrated with; a change
+# here needs a migration rebuilding the column (see
+# alembic/versions/20261019_website_class_host_only.py).
+
+SOCIAL_DOMAINS = (
+    "facebook.com", "instagram.com", "twitter.com", "x.com", "tiktok.com",
+    "google.com", "g.page", "linktr.ee", "linktree.com", "wa.me", "web.whatsapp.com",
+    "yelp.com", "tripadvisor.com", "booking.com",
+)
+LIGHT_SITE_DOMAINS = ("wixsite.com", "jimdosite.com", "google.site", "sites.google.com", "webnode.page")
+
+NO_WEBSITE = "N"
+
+
+def _position(needle: str, haystack: str, dialect: str) -> str:
+    if dialect == "sqlite":
+        return f"instr({haystack}, '{needle}')"
+    return f"position('{needle}' in {haystack})"
+
+
+def website_class_sql(column: str = "website", dialect: str = "sqlite") -> str:
+    # The host is the url without scheme, cut at the first '/', '?', '#' or
+    # ':' (port); '.' + host so that '%.<domain>' matches the domain itself
+    # and its subdomains, but not e.g. box.com for x.com, nor a domain that
+    # only appears in the path or query.
+    rest = f"replace(replace(lower(trim({column})), 'https://', ''), 'http://', '')"
+    cut = f"(replace(replace(replace({rest}, '?', '/'), '#', '/'), ':', '/') || '/')"
+    host = f"('.' || substr({cut}, 1, {_position('/', cut, dialect)} - 1))"
+
+    def any_of(domains):
+        return " OR ".join(f"{host} LIKE '%.{d}'" for d in domains)
+
+    return (
+        f"CASE WHEN {column} IS NULL OR trim({column}) = '' THEN 'N'"
+        f" WHEN {any_of(SOCIAL_DOMAINS)} THEN 'N'"
+        f" WHEN {any_of(LIGHT_SITE_DOMAINS)} THEN 'L'"
+        " ELSE 'Y' END"
+    )
+
+
+# SQLite form; other dialects get theirs from website_class_sql(dialect=...)
+WEBSITE_CLASS_SQL = website_class_sql()
+
+
+def _domain_pattern(domains) -> str:
+    return r"\.(?:" + "|".join(d.replace(".", r"\.") for d in domains) + r")$"
+
+
+_SOCIAL_PATTERN = _domain_pattern(SOCIAL_DOMAINS)
+_LIGHT_PATTERN = _domain_pattern(LIGHT_SITE_DOMAINS)
+
+
+def classify_series(values):
+    """website_class for a pandas Series of URLs, computed like WEBSITE_CLASS_SQL."""
+    s = values.astype("string").str.strip().str.lower()
+    # the filter pipeline has always treated the text "nan" (from Excel) as empty
+    empty = s.isna() | s.eq("") | s.eq("nan")
+    rest = s.str.replace("https://", "", regex=False).str.replace("http://", "", regex=False)
+    host = "." + rest.str.replace(r"(?s)[/?#:].*$", "", regex=True)
+    social = host.str.contains(_SOCIAL_PATTERN, regex=True, na=False)
+    light = host.str.contains(_LIGHT_PATTERN, regex=True, na=False)
+    classes = light.map({True: "L", False: "Y"}).astype(object)
+    classes[empty | social] = NO_WEBSITE
+    return classes
+
+
+class WebsiteClassRule:
+    """Leads whose website class is one of `classes`, defined once and compiled per source.
+
+    sql(bind) gives a WHERE clause for the leads table (the indexed
+    `website_class` column, or the same expression inline where the column is
+    missing); mask(series) gives the boolean mask for a DataFrame column.
+    """
+
+    def __init__(self, *classes: str):
+        self.classes = tuple(classes)
+
+    def sql(self, bind=None):
+        from .models.lead import Lead, WebsiteClassExpr
+        from .repositories.lead_repository import lead_columns
+        if bind is None or "website_class" in lead_columns(bind):
+            column = Lead.website_class
+        else:
+            column = WebsiteClassExpr()
+        return column.in_(self.classes) if len(self.classes) > 1 else column == self.classes[0]
+
+    def mask(self, values):
+        return classify_series(values).isin(self.classes)
+
+
+# Leads the offer pipeline writes to: no own website
+NEEDS_OFFER = WebsiteClassRule(NO_WEBSITE)
@@ -33,7 +33,7 @@ USE_OVERPASS = os.getenv("USE_OVERPASS", "false").lower() == "true"
 
 # Keep rest of file unchanged for brevity — this is a lightweight stub to support imports in serverless.
 
-def collect_places_for_keyword(keyword: str):
+def collect_places_for_keyword(keyword: str, progress=None):
     return []
 
 def dedupe(rows):
@@ -1,5 +1,19 @@
 # Back-end pipelines package
 
-# Re-export the two main pipeline functions/modules so other code can import from src.pipelines
-from .lead_filter_pipeline import *  # noqa: F401,F403
-from .lead_auto_pipeline_de import *  # noqa: F401,F403
+# Re-export the two main pipeline functions/modules so other code can import from src.pipelines.
+# The submodules pull in pandas, python-docx and requests, so they are only
+# imported when one of their names is first looked up here.
+import importlib
+
+_SUBMODULES = ("lead_filter_pipeline", "lead_auto_pipeline_de")
+
+
+def __getattr__(name: str):
+    if name in _SUBMODULES:
+        return importlib.import_module(f".{name}", __name__)
+    # lead_auto_pipeline_de wins on clashes, as with the former star imports
+    for sub in reversed(_SUBMODULES):
+        module = importlib.import_module(f".{sub}", __name__)
+        if not name.startswith("_") and hasattr(module, name):
+            return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -22,9 +22,19 @@ import pandas as pd
 import requests
 from urllib.parse import urlencode
 from dotenv import load_dotenv
+from contextlib import nullcontext
 from datetime import date, datetime
 from pathlib import Path
 
+# Metriken (GET /metrics der API); ohne Paket-Kontext einfach deaktiviert
+try:
+    from src.metrics import provider_call, stage_timer
+except Exception:
+    try:
+        from Backend.src.metrics import provider_call, stage_timer
+    except Exception:
+        provider_call = stage_timer = lambda *a, **kw: nullcontext()
+
 # Load env from repo root irrespective of CWD
 ROOT_DIR = Path(__file__).resolve().parents[1]
 load_dotenv(ROOT_DIR / ".env")
@@ -40,14 +50,21 @@ KEYWORDS = [s.strip() for s in os.getenv("KEYWORDS", "Bäckerei, Friseur, Klempn
 USE_PLACES = os.getenv("USE_PLACES", "true").lower() == "true"
 USE_OVERPASS = os.getenv("USE_OVERPASS", "false").lower() == "true"
 
-# Domains, die NICHT als „eigene Website“ zählen
-SOCIAL_DOMAINS = {
-    "facebook.com", "instagram.com", "twitter.com", "x.com", "tiktok.com",
-    "google.com", "g.page", "linktr.ee", "linktree.com", "wa.me", "web.whatsapp.com",
-    "yelp.com", "tripadvisor.com", "booking.com"
-}
-# Häufige Freebuilder-Domains, die ggf. als schwache Präsenz gewertet werden
-LIGHT_SITE_DOMAINS = {"wixsite.com", "jimdosite.com", "google.site", "sites.google.com", "webnode.page"}
+# Domains, die NICHT als „eigene Website“ zählen (SOCIAL_DOMAINS), und häufige
+# Freebuilder-Domains, die als schwache Präsenz gewertet werden (LIGHT_SITE_DOMAINS).
+# Definiert in src/db/website_class.py, das daraus auch leads.website_class berechnet.
+try:
+    from src.db.website_class import LIGHT_SITE_DOMAINS, SOCIAL_DOMAINS
+except Exception:
+    try:
+        from Backend.src.db.website_class import LIGHT_SITE_DOMAINS, SOCIAL_DOMAINS
+    except Exception:
+        # als Skript gestartet: Modul direkt aus der Datei laden (reines Python)
+        import importlib.util
+        _spec = importlib.util.spec_from_file_location("website_class", ROOT_DIR / "db" / "website_class.py")
+        _website_class = importlib.util.module_from_spec(_spec)
+        _spec.loader.exec_module(_website_class)
+        SOCIAL_DOMAINS, LIGHT_SITE_DOMAINS = _website_class.SOCIAL_DOMAINS, _website_class.LIGHT_SITE_DOMAINS
 
 HEADERS = {"User-Agent": "AutoLeadFinder/1.0 (contact: your-email@example.com)"}
 
@@ -87,9 +104,10 @@ def google_places_textsearch(query: str, next_page_token: str = None):
     params = {"query": query, "key": GOOGLE_API_KEY, "language": "de"}
     if next_page_token:
         params = {"pagetoken": next_page_token, "key": GOOGLE_API_KEY}
-    resp = requests.get(base, params=params, headers=HEADERS, timeout=30)
-    resp.raise_for_status()
-    return resp.json()
+    with provider_call("google", "textsearch"):
+        resp = requests.get(base, params=params, headers=HEADERS, timeout=30)
+        resp.raise_for_status()
+        return resp.json()
 
 def google_place_details(place_id: str):
     # Felder mit Website & Relevanz
@@ -99,9 +117,10 @@ def google_place_details(place_id: str):
         "website", "url", "user_ratings_total", "opening_hours/weekday_text"
     ]
     params = {"place_id": place_id, "fields": ",".join(fields), "key": GOOGLE_API_KEY, "language": "de"}
-    resp = requests.get(base, params=params, headers=HEADERS, timeout=30)
-    resp.raise_for_status()
-    return resp.json()
+    with provider_call("google", "details"):
+        resp = requests.get(base, params=params, headers=HEADERS, timeout=30)
+        resp.raise_for_status()
+        return resp.json()
 
 # === Overpass (optional) ===
 OVERPASS_URL = "https://overpass-api.de/api/interpreter"
@@ -138,9 +157,10 @@ def overpass_query_bbox(city: str, country_code: str, tags: list):
     );
     out center tags;
     """
-    r = requests.post(OVERPASS_URL, data={"data": overpass_q}, headers=HEADERS, timeout=60)
-    r.raise_for_status()
-    data = r.json().get("elements", [])
+    with provider_call("overpass", "interpreter"):
+        r = requests.post(OVERPASS_URL, data={"data": overpass_q}, headers=HEADERS, timeout=60)
+        r.raise_for_status()
+        data = r.json().get("elements", [])
     results = []
     for el in data:
         tags = el.get("tags", {})
@@ -172,6 +192,7 @@ def overpass_query_bbox(city: str, country_code: str, tags: list):
             "HatWebseite": classify_has_website(website),
             "GeprüftAm": str(date.today()),
             "Notizen": "Quelle: OSM/Overpass",
+            "QuelleID": f"osm:{el.get('type')}/{el.get('id')}" if el.get("id") else "",
             "Score": None,
             "Status": "Gefunden",
             "NächsteAktionDatum": "",
@@ -182,9 +203,10 @@ def overpass_query_bbox(city: str, country_code: str, tags: list):
 def nominatim_bbox(query: str):
     url = "https://nominatim.openstreetmap.org/search"
     params = {"q": query, "format": "json", "limit": 1}
-    r = requests.get(url, params=params, headers=HEADERS, timeout=30)
-    r.raise_for_status()
-    arr = r.json()
+    with provider_call("nominatim", "search"):
+        r = requests.get(url, params=params, headers=HEADERS, timeout=30)
+        r.raise_for_status()
+        arr = r.json()
     if not arr:
         return None
     bb = arr[0].get("boundingbox", [])
@@ -194,7 +216,12 @@ def nominatim_bbox(query: str):
     return None
 
 # === Pipeline ===
-def collect_places_for_keyword(keyword: str):
+def collect_places_for_keyword(keyword: str, progress=None):
+    """Sammelt Places-Treffer für ein Keyword.
+
+    `progress` ist ein optionaler Callback `progress(stage, **daten)`, der nach
+    jedem Place-Details-Call mit dem Stand N/M aufgerufen wird.
+    """
     out = []
     if not GOOGLE_API_KEY:
         print("WARN: GOOGLE_API_KEY fehlt – Places-Suche wird übersprungen.")
@@ -203,8 +230,11 @@ def collect_places_for_keyword(keyword: str):
     print(f"[Places] Suche: {q}")
     data = google_places_textsearch(q)
     pages = 0
+    seen_total = 0
     while True:
-        for item in data.get("results", []):
+        results = data.get("results", [])
+        seen_total += len(results)
+        for item in results:
             name = item.get("name")
             place_id = item.get("place_id")
             maps_url = f"https://maps.google.com/?cid={item.get('place_id','')}"  # Platzhalter
@@ -236,11 +266,15 @@ def collect_places_for_keyword(keyword: str):
                 "HatWebseite": has,
                 "GeprüftAm": str(date.today()),
                 "Notizen": f"Quelle: Google Places ({addr})",
+                # stabile ID der Quelle, Schlüssel für Upserts in der DB (nicht im Excel-Export)
+                "QuelleID": f"places:{place_id}" if place_id else "",
                 "Score": None,
                 "Status": "Gefunden",
                 "NächsteAktionDatum": "",
                 "Ansprechpartner": ""
             })
+            if progress is not None:
+                progress("details_fetched", keyword=keyword, done=len(out), total=seen_total)
         token = data.get("next_page_token")
         if token and pages < 2:  # bis zu ~60 Ergebnisse pro Keyword
             time.sleep(2)  # Places-Anforderung
@@ -292,9 +326,10 @@ def run_pipeline():
                 continue
             all_rows.extend(overpass_query_bbox(CITY, COUNTRY_CODE, tags))
     # Deduplizieren & Scoring
-    all_rows = dedupe(all_rows)
-    for r in all_rows:
-        r["Score"] = score_row(r)
+    with stage_timer("collect", "dedupe_score"):
+        all_rows = dedupe(all_rows)
+        for r in all_rows:
+            r["Score"] = score_row(r)
     # Export
     df = pd.DataFrame(all_rows, columns=[
         "Firmenname","Kategorie","Straße","Stadt","PLZ","Land",
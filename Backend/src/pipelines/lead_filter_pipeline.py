@@ -4,10 +4,13 @@ import logging
 import os
 import re
 import sys
+import threading
+import time
+from io import BytesIO
 from datetime import datetime
 from html import escape
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterator, List, Optional
 import pandas as pd
 from dotenv import load_dotenv
 try:
@@ -32,9 +35,48 @@ except Exception:
                 SessionLocal = None
                 Lead = None
 
+# --- Compiled placeholder renderer (falls back to the replace loop when run standalone) ---
+try:
+        from src.templating import compile_template
+except Exception:
+        try:
+                from Backend.src.templating import compile_template
+        except Exception:
+                compile_template = None
+
+# --- Website rule shared with the database (SQL predicate / pandas mask) ---
+try:
+        from src.db.website_class import NEEDS_OFFER
+except Exception:
+        try:
+                from Backend.src.db.website_class import NEEDS_OFFER
+        except Exception:
+                # standalone script: website_class.py is plain Python, load it from its
+                # file (next to this copy in Backend/src, or one level up from pipelines/)
+                import importlib.util
+                _here = Path(__file__).resolve().parent
+                _path = next(p for p in (_here / "db" / "website_class.py", _here.parent / "db" / "website_class.py")
+                             if p.is_file())
+                _spec = importlib.util.spec_from_file_location("website_class", _path)
+                _website_class = importlib.util.module_from_spec(_spec)
+                _spec.loader.exec_module(_website_class)
+                NEEDS_OFFER = _website_class.NEEDS_OFFER
+
+# --- Optional metrics (reported to the API's GET /metrics when available) ---
+try:
+        from src.metrics import stage_timer
+except Exception:
+        try:
+                from Backend.src.metrics import stage_timer
+        except Exception:
+                from contextlib import nullcontext
+
+                def stage_timer(pipeline: str, stage: str):
+                        return nullcontext()
+
 #!/usr/bin/env python3
 """
-Generate offer sheets for leads without a proper website (empty website field or containing a Facebook link).
+Generate offer sheets for leads without a proper website (empty website field or only a social media page).
 
 Inputs (default filenames expected in current working directory):
     - Lead-Auto-Ergebnis.xlsx              (Excel sheet with lead data)
@@ -47,12 +89,15 @@ Output:
 
 Filtering rule:
     Select rows where the (case-insensitive) column named one of ["Website", "website", "Webseite", "webseite", "URL", "Url"]
-    is either empty / NaN OR contains the substring "facebook" (e.g. facebook.com pages instead of a real site).
+    is either empty / NaN OR points to a social / directory page (facebook.com, instagram.com, ...) instead of a
+    real site; the domain rule lives in src/db/website_class.py (website class 'N').
 
 Placeholder logic:
     For every column in the Excel row, a placeholder {{COLUMN_NAME_NORMALIZED}} will be replaced.
     Normalization: uppercase, spaces -> underscores, umlauts handled, non-alnum removed.
     Example: Column "Company Name" -> placeholder {{COMPANY_NAME}}
+    Tokens are normalized the same way when they are rendered, so {{Company Name}},
+    [company name] or {COMPANY_NAME} all resolve to that column (see LeadPlaceholders).
     If the template contains placeholders not present in data, they are left untouched.
 
 Install dependencies (if not already):
@@ -133,58 +178,99 @@ def normalize_column_name(col: str) -> str:
         return col
 
 
-def build_placeholder_map(row: pd.Series) -> Dict[str, str]:
-        placeholders = {}
+_TOKEN_RE = re.compile(r"\{\{[^}]+\}\}|\{[^}]+\}|\[[^\]]+\]")
+
+
+def _token_name(token: str) -> str:
+        if token.startswith("{{") and token.endswith("}}"):
+                return token[2:-2]
+        return token[1:-1]
+
+
+_normalized_names: Dict[str, str] = {}
+
+
+def _normalized_token_name(name: str) -> str:
+        # Token names repeat across leads, so normalize each distinct name once
+        key = _normalized_names.get(name)
+        if key is None:
+                key = normalize_column_name(name)
+                if len(_normalized_names) < 4096:
+                        _normalized_names[name] = key
+        return key
+
+
+class LeadPlaceholders:
+        """Placeholder values for one lead, resolved when a template token is encountered.
+
+        Lookup order for a token like {{Ihr Name}}, [IHR_NAME] or {ihr name}:
+          1. exact token overrides (HTML summary blocks),
+          2. aliases by exact name (BusinessName, Your Company, ...),
+          3. row fields by normalized name (normalize_column_name), so every
+             spelling of a column header matches,
+          4. computed defaults such as DATE.
+        """
+
+        def __init__(self):
+                self.fields: Dict[str, str] = {}  # normalized column name -> value
+                self.columns: Dict[str, str] = {}  # original column header -> value
+                self.aliases: Dict[str, str] = {}
+                self.defaults: Dict[str, str] = {}
+                self.tokens: Dict[str, str] = {}
+
+        def add_field(self, column: Any, value: str):
+                self.columns[str(column)] = value
+                self.fields[normalize_column_name(column)] = value
+
+        def add_alias(self, name: str, value: str):
+                self.aliases[name] = "" if value is None else value
+                if name.strip() != name:
+                        self.aliases[name.strip()] = self.aliases[name]
+
+        def with_tokens(self, tokens: Dict[str, str]) -> "LeadPlaceholders":
+                other = LeadPlaceholders()
+                other.fields, other.columns = self.fields, self.columns
+                other.aliases, other.defaults = self.aliases, self.defaults
+                other.tokens = {**self.tokens, **tokens}
+                return other
+
+        def __call__(self, token: str, name: Optional[str] = None) -> Optional[str]:
+                value = self.tokens.get(token)
+                if value is not None:
+                        return value
+                if name is None:
+                        name = _token_name(token)
+                value = self.aliases.get(name)
+                if value is not None:
+                        return value
+                key = _normalized_token_name(name)
+                value = self.fields.get(key)
+                if value is not None:
+                        return value
+                return self.defaults.get(key)
+
+        def get(self, token: str, default=None):
+                value = self(token)
+                return default if value is None else value
+
+        def as_dict(self) -> Dict[str, str]:
+                """Flat name -> value table for metadata.json (row data first, then aliases)."""
+                out = dict(self.columns)
+                for name, value in list(self.aliases.items()) + list(self.defaults.items()):
+                        out.setdefault(name, value)
+                return out
+
+
+def build_placeholder_map(row: pd.Series) -> LeadPlaceholders:
+        placeholders = LeadPlaceholders()
         for col, val in row.items():
-                key = normalize_column_name(col)  # NORMALIZED_KEY (e.g. IHR_NAME)
-                value = "" if pd.isna(val) else str(val)
-
-                # Prepare a set of candidate placeholder strings to match common template styles
-                variants = set()
-
-                # Normalized forms (underscore-style)
-                variants.update({f"{{{{{key}}}}}", f"{{{key}}}", f"[{key}]"})
-
-                # Human-friendly forms based on original column header
-                col_str = str(col).strip()
-                col_nod = unidecode(col_str)
-
-                # Add several casing variants for the original header and the diacritics-free version
-                for base in {col_str, col_nod}:
-                        variants.update({
-                                f"[{base}]",
-                                f"[{base.lower()}]",
-                                f"[{base.upper()}]",
-                                f"[{base.title()}]",
-                                f"{{{base}}}",
-                                f"{{{{{base}}}}}",
-                        })
-
-                # Also allow space vs underscore variants (e.g. IHR_NAME <-> 'Ihr Name')
-                space_key = key.replace("_", " ")
-                for base in {key, space_key}:
-                        variants.update({
-                                f"[{base}]",
-                                f"{{{base}}}",
-                                f"{{{{{base}}}}}",
-                                f"[{base.lower()}]",
-                                f"[{base.upper()}]",
-                                f"[{base.title()}]",
-                        })
-
-                # Write all variants into the map
-                for v in variants:
-                        placeholders[v] = value
-
-        # Add some convenience/computed placeholders (date) in common styles
-        date_val = datetime.now().strftime("%d.%m.%Y")
-        for dkey in ["{{DATE}}", "{DATE}", "[DATE]", "{{Date}}", "{Date}", "[Date]"]:
-                if dkey not in placeholders:
-                        placeholders[dkey] = date_val
+                placeholders.add_field(col, "" if pd.isna(val) else str(val))
+        # Add some convenience/computed placeholders (date), used unless a column provides them
+        placeholders.defaults["DATE"] = datetime.now().strftime("%d.%m.%Y")
         return placeholders
 
 
-def replace_placeholders_in_doc(doc: Document, mapping: Dict[str, str]):
+def replace_placeholders_in_doc(doc: Document, mapping: LeadPlaceholders):
         # Replace in main document paragraphs
         for p in doc.paragraphs:
                 replace_in_run_collection(p.runs, mapping)
@@ -217,15 +303,14 @@ def replace_placeholders_in_doc(doc: Document, mapping: Dict[str, str]):
                                                 replace_in_run_collection(p.runs, mapping)
 
 
-def replace_in_run_collection(runs, mapping: Dict[str, str]):
+def replace_in_run_collection(runs, mapping: LeadPlaceholders):
         # Approach: join full text, replace, then rebuild runs minimally
         full_text = "".join(run.text for run in runs)
         original = full_text
-        for placeholder, value in mapping.items():
-                if placeholder in full_text:
-                        full_text = full_text.replace(placeholder, value)
-        # Remove any leftover placeholder patterns like {{...}}, {...}, or [...] to avoid leaking tokens
-        full_text = re.sub(r"\{\{[^}]+\}\}|\{[^}]+\}|\[[^\]]+\]", "", full_text)
+        if "{" not in full_text and "[" not in full_text:
+                return
+        # Leftover placeholder patterns like {{...}}, {...}, or [...] are removed to avoid leaking tokens
+        full_text = replace_placeholders_in_text(full_text, mapping)
 
         if full_text != original:
                 # Clear runs and set first run to new text
@@ -235,26 +320,94 @@ def replace_in_run_collection(runs, mapping: Dict[str, str]):
                                 r.text = ""
 
 
+# --- Template file cache ---
+# Templates are read once per process and re-read only when their mtime
+# changes. The mtime itself is checked at most every TEMPLATE_CACHE_CHECK_SECONDS,
+# so generating offers for a batch of leads does no template I/O per lead.
+try:
+        TEMPLATE_CACHE_CHECK_SECONDS = float(os.getenv("TEMPLATE_CACHE_CHECK_SECONDS", "5"))
+except ValueError:
+        TEMPLATE_CACHE_CHECK_SECONDS = 5.0
+
+# path -> [mtime or None when missing, last check (monotonic), content bytes or None]
+_template_files: Dict[str, list] = {}
+_template_files_lock = threading.Lock()
+
+
+def _mtime(path: Path) -> Optional[float]:
+        try:
+                return path.stat().st_mtime
+        except OSError:
+                return None
+
+
+def _template_bytes(template_path: Path) -> Optional[bytes]:
+        """Cached file content, or None when the file does not exist."""
+        key = str(template_path)
+        now = time.monotonic()
+        with _template_files_lock:
+                entry = _template_files.get(key)
+                if entry is not None and now - entry[1] < TEMPLATE_CACHE_CHECK_SECONDS:
+                        return entry[2]
+        mtime = _mtime(template_path)
+        if entry is not None and entry[0] == mtime:
+                data = entry[2]
+        elif mtime is None:
+                data = None
+        else:
+                try:
+                        data = template_path.read_bytes()
+                except OSError as e:
+                        logging.debug(f"Failed to read template {template_path}: {e}")
+                        data = None
+        with _template_files_lock:
+                _template_files[key] = [mtime, now, data]
+        return data
+
+
+def template_exists(template_path: Path) -> bool:
+        return _template_bytes(template_path) is not None
+
+
+def clear_template_cache():
+        with _template_files_lock:
+                _template_files.clear()
+
+
 # --- New helpers for text/markdown templates ---
 def load_text_template(template_path: Path) -> str:
+        data = _template_bytes(template_path)
+        if data is None:
+                logging.debug(f"Failed to read text template {template_path}: not found")
+                return ""
         try:
-                return template_path.read_text(encoding="utf-8")
+                return data.decode("utf-8")
         except Exception as e:
                 logging.debug(f"Failed to read text template {template_path}: {e}")
                 return ""
 
 
-def replace_placeholders_in_text(text: str, mapping: Dict[str, str]) -> str:
-        # Simple replace loop - mapping contains many common variants
-        for placeholder, value in mapping.items():
-                if placeholder in text:
-                        text = text.replace(placeholder, value)
-        # Remove any leftover placeholder patterns
-        text = re.sub(r"\{\{[^}]+\}\}|\{[^}]+\}|\[[^\]]+\]", "", text)
-        return text
+def _clean_value(value: str) -> str:
+        # substituted values lose token-like text too, as when the whole output was cleaned
+        if "{" in value or "[" in value:
+                return _TOKEN_RE.sub("", value)
+        return value
+
+
+def replace_placeholders_in_text(text: str, mapping) -> str:
+        """Fill {{Name}} / {Name} / [Name] tokens from `mapping` (LeadPlaceholders or token dict); drop unknown tokens."""
+        if compile_template is not None:
+                # One pass over the template (compiled once per distinct text)
+                return compile_template(text).render(mapping)
+        resolve = mapping if callable(mapping) else (lambda token, name: mapping.get(token))
+
+        def _sub(m):
+                value = resolve(m.group(0), _token_name(m.group(0)))
+                return _clean_value(str(value)) if value else ""
+        return _TOKEN_RE.sub(_sub, text)
 
 
-def generate_text_templates_for_offer(row: pd.Series, mapping: Dict[str, str], target_dir: Path,
+def generate_text_templates_for_offer(row: pd.Series, mapping: LeadPlaceholders, target_dir: Path,
                                       email_template: Path, phone_template: Path, overwrite: bool = False):
         # Use templates root for resolving templates
         templates_root = TEMPLATES_ROOT
@@ -264,7 +417,7 @@ def generate_text_templates_for_offer(row: pd.Series, mapping: Dict[str, str], t
         phone_tpl = phone_template if phone_template.is_absolute() else (templates_root / phone_template)
 
         for tpl_path, out_name in ((email_tpl, "cold_email.md"), (phone_tpl, "cold_phone_call.md")):
-                if not tpl_path.exists():
+                if not template_exists(tpl_path):
                         logging.debug(f"Text template not found: {tpl_path} - skipping {out_name}")
                         continue
                 out_file = target_dir / out_name
@@ -289,8 +442,24 @@ def load_excel(excel_path: Path) -> pd.DataFrame:
         return df
 
 
-def load_from_db() -> pd.DataFrame:
-        """Load leads from Postgres and normalize to the expected DataFrame shape."""
+# DataFrame column -> Lead attribute, in output order
+DB_COLUMNS = {
+        "Company": "company_name",
+        "Website": "website",
+        "Email": "email",
+        "Phone": "phone",
+        "City": "city",
+        "Industry": "industry",
+        "Ansprechpartner": "contact",
+}
+# Rows per DataFrame chunk when reading leads from the database
+try:
+        DB_CHUNK_SIZE = max(1, int(os.getenv("OFFER_DB_CHUNK_SIZE", "1000")))
+except ValueError:
+        DB_CHUNK_SIZE = 1000
+
+
+def _db_handles():
         # Try both import roots for local and Docker
         try:
                 from src.db.engine import SessionLocal as _SessionLocal
@@ -301,30 +470,72 @@ def load_from_db() -> pd.DataFrame:
                         from Backend.src.db.models.lead import Lead as _Lead
                 except Exception as e:
                         raise RuntimeError("DB not available. Set PYTHONPATH correctly and install SQLAlchemy.") from e
+        return _SessionLocal, _Lead
+
+
+def _db_select(_Lead, columns, needs_offer: bool, bind):
+        from sqlalchemy import select
+        stmt = select(*columns)
+        if needs_offer:
+                stmt = stmt.where(NEEDS_OFFER.sql(bind))
+        return stmt
+
+
+def iter_from_db(chunk_size: Optional[int] = None, needs_offer: bool = False) -> Iterator[pd.DataFrame]:
+        """Yield leads as DataFrames of at most `chunk_size` rows (default OFFER_DB_CHUNK_SIZE).
+
+        Only the needed columns are selected and leads are paged by id
+        (`id > last ORDER BY id LIMIT n`), each page in its own short session,
+        so memory is bounded by one chunk and no cursor or transaction stays
+        open while the caller works on a chunk. With `needs_offer` the offer
+        filter runs in SQL (see filter_rows) and only matching rows are read.
+        """
+        _SessionLocal, _Lead = _db_handles()
+        size = max(1, int(chunk_size or DB_CHUNK_SIZE))
+        names = list(DB_COLUMNS)
+        columns = [getattr(_Lead, attr) for attr in DB_COLUMNS.values()]
+        last_id = None
+        while True:
+                with stage_timer("offers", "load_db"):
+                        with _SessionLocal() as session:
+                                stmt = _db_select(_Lead, [_Lead.id, *columns], needs_offer, session.get_bind())
+                                if last_id is not None:
+                                        stmt = stmt.where(_Lead.id > last_id)
+                                rows = session.execute(stmt.order_by(_Lead.id).limit(size)).all()
+                        if not rows:
+                                return
+                        last_id = rows[-1][0]
+                        chunk = pd.DataFrame.from_records([row[1:] for row in rows], columns=names)
+                yield chunk
+                if len(rows) < size:
+                        return
+
+
+def count_from_db(needs_offer: bool = False) -> int:
+        from sqlalchemy import func
+        _SessionLocal, _Lead = _db_handles()
         with _SessionLocal() as session:
-                rows = session.query(_Lead).all()
-                data = [
-                        {
-                                "Company": r.company_name,
-                                "Website": r.website,
-                                "Email": r.email,
-                                "Phone": r.phone,
-                                "City": getattr(r, "city", None),
-                                "Industry": getattr(r, "industry", None),
-                                "Ansprechpartner": getattr(r, "contact", None),
-                        }
-                        for r in rows
-                ]
-        return pd.DataFrame(data)
+                stmt = _db_select(_Lead, [func.count(_Lead.id)], needs_offer, session.get_bind())
+                return int(session.execute(stmt).scalar() or 0)
+
+
+def load_from_db(needs_offer: bool = False) -> pd.DataFrame:
+        """All (or, with `needs_offer`, all matching) leads as one DataFrame; see iter_from_db."""
+        chunks = list(iter_from_db(needs_offer=needs_offer))
+        if not chunks:
+                return pd.DataFrame(columns=list(DB_COLUMNS))
+        return pd.concat(chunks, ignore_index=True)
 
 
 def filter_rows(df: pd.DataFrame, website_col: str) -> pd.DataFrame:
-        col = df[website_col]
-        # Standardize to string where possible
-        col_str = col.astype(str).str.strip().replace({"nan": ""})
-        mask_empty = col_str.eq("") | col.isna()
-        mask_fb = col_str.str.contains("facebook", case=False, na=False)
-        filtered = df[mask_empty | mask_fb].copy()
+        with stage_timer("offers", "filter"):
+                return _filter_rows(df, website_col)
+
+
+def _filter_rows(df: pd.DataFrame, website_col: str) -> pd.DataFrame:
+        # no website or only a social media page; same rule as load_from_db(needs_offer=True)
+        mask = NEEDS_OFFER.mask(df[website_col])
+        filtered = df[mask].copy()
         logging.info(f"Filtered {len(filtered)}/{len(df)} rows needing website offer.")
         return filtered
 
@@ -359,7 +570,7 @@ def _ensure_http(url: str) -> str:
         return u
 
 
-def generate_lead_html(row: pd.Series, company_name: str, target_dir: Path, mapping: Dict[str, str], overwrite: bool = False) -> Path:
+def generate_lead_html(row: pd.Series, company_name: str, target_dir: Path, mapping: LeadPlaceholders, overwrite: bool = False) -> Path:
         """Render lead HTML summary from an external template (templates/html/lead_summary_template.html)."""
         phone = _row_value_by_keys(row, [
                 "PHONE", "TELEFON", "TEL", "MOBILE", "HANDY", "PHONE_NUMBER"
@@ -461,8 +672,7 @@ def generate_lead_html(row: pd.Series, company_name: str, target_dir: Path, mapp
                 return target_dir / "lead_summary.html"
 
         # Extend mapping with blocks and common keys
-        mapping_local = dict(mapping)
-        mapping_local.update({
+        mapping_local = mapping.with_tokens({
                 "{{BusinessName}}": comp_e,
                 "{BusinessName}": comp_e,
                 "{{COMPANY_NAME}}": comp_e,
@@ -497,17 +707,7 @@ def generate_lead_html(row: pd.Series, company_name: str, target_dir: Path, mapp
         return out_path
 
 
-def _register_placeholder_variants(mapping: Dict[str, str], key: str, value: str):
-        if value is None:
-                value = ""
-        # Register the exact key in common placeholder styles
-        for k in {key, key.strip()}:
-                mapping[f"{{{{{k}}}}}"] = value
-                mapping[f"{{{k}}}"] = value
-                mapping[f"[{k}]"] = value
-
-
-def enrich_placeholders_with_env_and_aliases(mapping: Dict[str, str], row: pd.Series, company_name: str):
+def enrich_placeholders_with_env_and_aliases(mapping: LeadPlaceholders, row: pd.Series, company_name: str):
         # Row-derived fields (prefer data from the sheet)
         city = _row_value_by_keys(row, ["CITY", "STADT", "ORT"]) or os.getenv("CITY", "")
         website = _row_value_by_keys(row, ["WEBSITE", "WEBSEITE", "URL"]) or os.getenv("YOUR_WEBSITE", "")
@@ -572,7 +772,35 @@ def enrich_placeholders_with_env_and_aliases(mapping: Dict[str, str], row: pd.Se
         }
 
         for k, v in alias_values.items():
-                _register_placeholder_variants(mapping, k, v)
+                mapping.add_alias(k, v)
+
+
+_DOCX_DOWNLOAD_TARGET = Path("/tmp/Angebot-Webseitenservice.docx")
+_downloaded_templates: Dict[str, bool] = {}
+
+
+def _resolve_docx_template(template_path: Path) -> Path:
+        # Missing local template and DOCX_TEMPLATE_URL set: download it once per process
+        if template_exists(template_path):
+                return template_path
+        tpl_url = os.getenv("DOCX_TEMPLATE_URL", "").strip()
+        if not tpl_url:
+                return template_path
+        if template_exists(_DOCX_DOWNLOAD_TARGET) and _downloaded_templates.get(tpl_url):
+                return _DOCX_DOWNLOAD_TARGET
+        try:
+                resp = requests.get(tpl_url, timeout=20)
+                if resp.status_code == 200:
+                        _DOCX_DOWNLOAD_TARGET.write_bytes(resp.content)
+                        _downloaded_templates[tpl_url] = True
+                        logging.info(f"Downloaded DOCX template from {tpl_url} -> {_DOCX_DOWNLOAD_TARGET}")
+                        with _template_files_lock:
+                                _template_files.pop(str(_DOCX_DOWNLOAD_TARGET), None)
+                        return _DOCX_DOWNLOAD_TARGET
+                logging.warning(f"Failed to download DOCX template (status {resp.status_code}) from {tpl_url}")
+        except Exception as e:
+                logging.warning(f"Error downloading DOCX template from {tpl_url}: {e}")
+        return template_path
 
 
 def generate_offer(
@@ -596,34 +824,19 @@ def generate_offer(
         enrich_placeholders_with_env_and_aliases(placeholders, row, company_name)
 
         # Resolve template path: if missing locally and DOCX_TEMPLATE_URL is provided, download to /tmp
-        resolved_template = template_path
-        try:
-                if not resolved_template.exists():
-                        tpl_url = os.getenv("DOCX_TEMPLATE_URL", "").strip()
-                        if tpl_url:
-                                try:
-                                        tmp_target = Path("/tmp/Angebot-Webseitenservice.docx")
-                                        resp = requests.get(tpl_url, timeout=20)
-                                        if resp.status_code == 200:
-                                                tmp_target.write_bytes(resp.content)
-                                                resolved_template = tmp_target
-                                                logging.info(f"Downloaded DOCX template from {tpl_url} -> {tmp_target}")
-                                        else:
-                                                logging.warning(f"Failed to download DOCX template (status {resp.status_code}) from {tpl_url}")
-                                except Exception as e:
-                                        logging.warning(f"Error downloading DOCX template from {tpl_url}: {e}")
-        except Exception:
-                pass
+        resolved_template = _resolve_docx_template(template_path)
 
         # Generate or skip DOCX based on overwrite flag
         if output_doc.exists() and not overwrite:
                 logging.info(f"Skipping existing offer DOCX for {company_name} ({output_doc})")
         else:
                 try:
-                        if resolved_template.exists():
-                                doc = Document(str(resolved_template))
-                                replace_placeholders_in_doc(doc, placeholders)
-                                doc.save(str(output_doc))
+                        template_data = _template_bytes(resolved_template)
+                        if template_data is not None:
+                                with stage_timer("offers", "docx"):
+                                        doc = Document(BytesIO(template_data))
+                                        replace_placeholders_in_doc(doc, placeholders)
+                                        doc.save(str(output_doc))
                                 logging.debug(f"Saved offer: {output_doc}")
                         else:
                                 logging.debug(f"DOCX template not found at {template_path}; skipping DOCX generation for {company_name}")
@@ -639,7 +852,7 @@ def generate_offer(
                                                 "company": company_name,
                                                 "company_slug": company_slug,
                                                 "generated_at": datetime.utcnow().isoformat() + "Z",
-                                                "placeholders": placeholders
+                                                "placeholders": placeholders.as_dict()
                                         },
                                         f,
                                         ensure_ascii=False,
@@ -659,27 +872,29 @@ def generate_offer(
                 # Fallback to English templates if localized ones are missing
                 en_email = templates_dir / "en" / "cold_email_template.md"
                 en_phone = templates_dir / "en" / "cold_phone_call_template.md"
-                if not email_tpl.exists():
+                if not template_exists(email_tpl):
                         logging.debug(f"Email template for lang '{lang}' not found at {email_tpl}; falling back to {en_email}")
                         email_tpl = en_email
-                if not phone_tpl.exists():
+                if not template_exists(phone_tpl):
                         logging.debug(f"Phone template for lang '{lang}' not found at {phone_tpl}; falling back to {en_phone}")
                         phone_tpl = en_phone
 
-                generate_text_templates_for_offer(
-                        row=row,
-                        mapping=placeholders,
-                        target_dir=target_dir,
-                        email_template=email_tpl,
-                        phone_template=phone_tpl,
-                        overwrite=overwrite
-                )
+                with stage_timer("offers", "markdown"):
+                        generate_text_templates_for_offer(
+                                row=row,
+                                mapping=placeholders,
+                                target_dir=target_dir,
+                                email_template=email_tpl,
+                                phone_template=phone_tpl,
+                                overwrite=overwrite
+                        )
         except Exception as e:
                 logging.error(f"Failed generating text templates for {company_name}: {e}")
 
         # Generate a Tailwind-styled HTML summary with dark mode support via external template
         try:
-                generate_lead_html(row=row, company_name=company_name, target_dir=target_dir, mapping=placeholders, overwrite=overwrite)
+                with stage_timer("offers", "html"):
+                        generate_lead_html(row=row, company_name=company_name, target_dir=target_dir, mapping=placeholders, overwrite=overwrite)
         except Exception as e:
                 logging.error(f"Failed generating HTML summary for {company_name}: {e}")
 
@@ -729,13 +944,15 @@ def main():
 
         if args.use_db:
                 try:
-                        df = load_from_db()
+                        # filtered in SQL and read chunk by chunk, never the whole table
+                        total = count_from_db(needs_offer=True)
                 except Exception as e:
                         logging.error(f"Failed loading from DB: {e}")
                         sys.exit(1)
-                if df.empty:
-                        logging.info("No rows found in database; nothing to do.")
+                if not total:
+                        logging.info("No leads in the database need a website offer; nothing to do.")
                         return
+                frames = iter_from_db(needs_offer=True)
         else:
                 if not excel_path.is_file():
                         logging.error(f"Excel file not found: {excel_path}")
@@ -745,30 +962,31 @@ def main():
                         logging.info("No rows found in Excel file; nothing to do.")
                         return
 
-        # Determine columns
-        try:
-                website_col = find_website_column(df)
-        except Exception as e:
-                logging.error(f"Could not determine website column: {e}")
-                sys.exit(1)
-
-        company_col = guess_company_column(df)
+                # Determine columns
+                try:
+                        website_col = find_website_column(df)
+                except Exception as e:
+                        logging.error(f"Could not determine website column: {e}")
+                        sys.exit(1)
 
-        filtered = filter_rows(df, website_col)
-        if filtered.empty:
-                logging.info("No leads matched the filter (empty website or facebook). Nothing to generate.")
-                return
+                filtered = filter_rows(df, website_col)
+                if filtered.empty:
+                        logging.info("No leads matched the filter (no website or only a social media page). Nothing to generate.")
+                        return
+                total = len(filtered)
+                frames = [filtered]
 
         ensure_dir(output_root)
 
-        total = len(filtered)
         logging.info(f"Generating offers for {total} leads...")
 
-        for idx, row in filtered.iterrows():
-                try:
-                        generate_offer(row=row, template_path=template_path, company_col=company_col, output_root=output_root, overwrite=args.overwrite)
-                except Exception as e:
-                        logging.error(f"Failed processing row {idx}: {e}")
+        for frame in frames:
+                company_col = guess_company_column(frame)
+                for idx, row in frame.iterrows():
+                        try:
+                                generate_offer(row=row, template_path=template_path, company_col=company_col, output_root=output_root, overwrite=args.overwrite)
+                        except Exception as e:
+                                logging.error(f"Failed processing row {idx}: {e}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,86 @@
+"""Single-pass placeholder rendering for the text, HTML and DOCX templates.
+
+A template is split once into literal text and placeholder tokens
+(``{{Name}}``, ``{Name}`` or ``[Name]``). Rendering walks that list and looks
+every token up exactly once, so the cost is linear in the template size no
+matter how many placeholder variants the mapping holds.
+
+Rules (unchanged from the former replace loops):
+  - a token found in the mapping is replaced by its value,
+  - any other token is removed,
+  - substituted values are cleaned of token-like text the same way, as the
+    old final regex ran over the whole rendered text.
+Unlike the loops, a token is matched as a whole, so ``{{KEY}}`` can no longer
+be half-replaced through its ``{KEY}`` variant depending on dict order.
+"""
+import re
+from functools import lru_cache
+from typing import Callable, Mapping, Optional, Union
+
+TOKEN_RE = re.compile(r"\{\{[^}]+\}\}|\{[^}]+\}|\[[^\]]+\]")
+
+# a mapping of exact token -> value, or a callable (token, name) -> value or None
+Resolver = Union[Mapping[str, str], Callable[[str, str], Optional[str]]]
+
+
+def token_name(token: str) -> str:
+    """`{{Name}}` / `{Name}` / `[Name]` -> `Name`."""
+    if token.startswith("{{") and token.endswith("}}"):
+        return token[2:-2]
+    return token[1:-1]
+
+
+def _clean_value(value: str) -> str:
+    if "{" in value or "[" in value:
+        return TOKEN_RE.sub("", value)
+    return value
+
+
+class CompiledTemplate:
+    __slots__ = ("literals", "tokens")
+
+    def __init__(self, source: str):
+        literals = []
+        tokens = []
+        pos = 0
+        for m in TOKEN_RE.finditer(source):
+            literals.append(source[pos:m.start()])
+            tokens.append((m.group(0), token_name(m.group(0))))
+            pos = m.end()
+        literals.append(source[pos:])
+        self.literals = tuple(literals)
+        self.tokens = tuple(tokens)
+
+    @property
+    def has_tokens(self) -> bool:
+        return bool(self.tokens)
+
+    def render(self, resolver: Resolver) -> str:
+        if not self.tokens:
+            return self.literals[0]
+        if callable(resolver):
+            resolve = resolver
+        else:
+            get = resolver.get
+
+            def resolve(token, name):
+                return get(token)
+        parts = [self.literals[0]]
+        for (token, name), literal in zip(self.tokens, self.literals[1:]):
+            value = resolve(token, name)
+            if value:
+                parts.append(_clean_value(str(value)))
+            parts.append(literal)
+        return "".join(parts)
+
+
+@lru_cache(maxsize=512)
+def compile_template(source: str) -> CompiledTemplate:
+    """Compiled form of `source`, cached by content so every template version compiles once."""
+    return CompiledTemplate(source)
+
+
+def render(source: str, resolver: Resolver) -> str:
+    if not source:
+        return ""
+    return compile_template(source).render(resolver)
@@ -30,3 +30,17 @@ def setup_db():
 def client():
     with TestClient(app) as c:
         yield c
+
+@pytest.fixture
+def postgres_engine():
+    """Empty schema on the Postgres server in TEST_POSTGRES_URL; skipped without one."""
+    url = os.getenv("TEST_POSTGRES_URL")
+    if not url:
+        pytest.skip("TEST_POSTGRES_URL not set")
+    from sqlalchemy import create_engine
+    pg = create_engine(url)
+    Base.metadata.drop_all(bind=pg)
+    Base.metadata.create_all(bind=pg)
+    yield pg
+    Base.metadata.drop_all(bind=pg)
+    pg.dispose()